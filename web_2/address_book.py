@@ -1,11 +1,26 @@
 from collections import UserDict
-from datetime import datetime, timedelta
+from datetime import datetime
 # from prompt_toolkit import prompt
 # from prompt_toolkit.completion import WordCompleter
+import heapq
 import json
+import os
 import re
-
-is_finished = False
+import threading
+from contextlib import contextmanager
+import compact_snapshot
+import instrumentation
+from command_log import CommandLog, Journal
+from compact_snapshot import CompactSnapshot, SnapshotFormatError
+from shards import MANIFEST, make_manifest, read_manifest, read_shards, read_snapshot_rows, shard_file, shard_of
+from rwlock import ReadWriteLock
+from storage import SNAPSHOT_WRITER, AutosaveScheduler, atomic_write_stream
+from regex_search import compile_pattern, required_literals
+from reminders import BirthdayCalendar, days_to_birthday, to_icalendar
+from trigram_index import TrigramIndex
+
+# state of the current session (jason.py menu, client of server.py), kept per thread
+session = threading.local()
 
 class TerribleException(Exception):
     pass
@@ -26,104 +41,667 @@ def command_phone_operations_check_decorator(func):
         try:
             func(*args, **kwargs)
 
-        except TypeError:
+        except TypeError as error:
+            instrumentation.note_error(error)
             print('Argument type is not acceptable!')
             return
-        except ValueError:
+        except ValueError as error:
+            instrumentation.note_error(error)
             print(f'Too many arguments for {func.__name__}! Probably you are using too many spaces.')
             return
-        except IndexError:
+        except IndexError as error:
+            instrumentation.note_error(error)
             print(f'Not enough arguments for {func.__name__}!')
             return
-        except TerribleException:
+        except TerribleException as error:
+            instrumentation.note_error(error)
             print('''Something REALLY unknown had happened during your command reading! Please stay  
             calm and run out of the room!''')
             return
-        except KeyError:
+        except KeyError as error:
+            instrumentation.note_error(error)
             print('Such command does not exist!')
             return
-        except ExcessiveArguments:
+        except ExcessiveArguments as error:
+            instrumentation.note_error(error)
             print(f'Too many arguments for {func.__name__}! Probably you are using too many spaces.')
             return
-        except WrongArgumentFormat:
+        except WrongArgumentFormat as error:
+            instrumentation.note_error(error)
             return
 
     return inner
 
 
 # Classes
+class RecordTable(dict):
+    """The records of the book by name. The records of an attached compact snapshot stay in the mapped file
+    (the value is their number in it) and are built on their first access, a start decodes only the names.
+    values() and items() build all the rest."""
+
+    def __init__(self, build):
+        super().__init__()
+        # build(name, row) -> Record
+        self.build = build
+        self.snapshot = None
+        self.unbuilt = False
+        # readers can build records at the same time
+        self.lock = threading.Lock()
+
+    def attach(self, snapshot):
+        self.snapshot = snapshot
+        self.unbuilt = True
+        for i in range(len(snapshot)):
+            dict.__setitem__(self, snapshot.name(i), i)
+
+    def detach(self):
+        """Decodes the rows that are still in the snapshot and closes it, the file can be replaced then."""
+        with self.lock:
+            if self.snapshot is None:
+                return
+            for key, value in dict.items(self):
+                if type(value) is int:
+                    dict.__setitem__(self, key, self.snapshot[value])
+            self.snapshot.close()
+            self.snapshot = None
+
+    def row(self, key):
+        """Snapshot row of a record that is not built yet."""
+        value = dict.__getitem__(self, key)
+        return self.snapshot[value] if type(value) is int else value
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) is int or type(value) is tuple:
+            with self.lock:
+                value = dict.__getitem__(self, key)
+                if type(value) is int or type(value) is tuple:
+                    value = self.build(key, self.row(key))
+                    dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def build_all(self):
+        if not self.unbuilt:
+            return
+        with self.lock:
+            build, snapshot = self.build, self.snapshot
+            for key, value in dict.items(self):
+                if type(value) is int:
+                    dict.__setitem__(self, key, build(key, snapshot[value]))
+                elif type(value) is tuple:
+                    dict.__setitem__(self, key, build(key, value))
+            self.unbuilt = False
+        self.detach()
+
+    def built(self):
+        """The records that are built already, the rest stays as it is."""
+        return [value for value in dict.values(self) if type(value) is not int and type(value) is not tuple]
+
+    def values(self):
+        self.build_all()
+        return dict.values(self)
+
+    def items(self):
+        self.build_all()
+        return dict.items(self)
+
+
 class AddressBook(UserDict):
     N_LIMIT = 2
+    FUZZY_TOP_K = 5
+    SAVE_FILE = 'save.json'
+    AUTOSAVE_FILE = 'save.autosave.json'
+    # 'json' or 'compact' (binary snapshot in save.abk, JSON stays available through the export command)
+    SNAPSHOT_FORMAT = os.environ.get('ADDRESS_BOOK_FORMAT', 'json')
+    COMPACT_FILE = 'save.abk'
+    COMPACT_AUTOSAVE_FILE = 'save.autosave.abk'
+    # the changes since the last save, replayed over the snapshot on start (see command_log)
+    JOURNAL_FILE = 'save.journal.jsonl'
+    # > 0 splits the book into that many files in SHARD_DIR by a hash of the name, 0 keeps one save file
+    SHARDS = int(os.environ.get('ADDRESS_BOOK_SHARDS', '0'))
+    SHARD_DIR = 'save_shards'
+    LOAD_WORKERS = None  # processes that read the shards on start, None = one per CPU
+    AUTOSAVE_INTERVAL = 30  # seconds
+    AUTOSAVE_EVERY = 10  # changes
 
     def __init__(self):
 
         super().__init__()
+        self.data = RecordTable(self.build_record)
         self.count = 0
         self.call_List = list(self.data.keys())
+        # the fuzzy search indexes are built on the first fuzzy search, not on every start
+        self.name_index = TrigramIndex()
+        self.address_index = TrigramIndex()
+        self.fuzzy_index_ready = False
+        self.fuzzy_index_lock = threading.Lock()
+        # trigrams of all the fields of every record, built on the first regex search
+        self.text_index = None
+        # birthdays of the next year sorted by date, built on the first reminder and again on the next day
+        self.calendar = None
+        # keys by email domain, operator code and birthday month, built on the first segment query
+        self.segments = None
+
+        # Dirty tracking: serialized keeps the ready-to-dump row of every record, only the records from
+        # dirty are serialized again on save. unsaved_shards are the files that differ from the book.
+        # A book without shards is a book with the only shard in save_file.
+        self.serialized = {}
+        self.dirty = set()
+        self.unsaved_shards = set()
+        # Many readers (find, show, bday in) or one writer. Use reading() / writing() around any access from
+        # a second thread, the commands of run_command take the right one on their own.
+        self.lock = ReadWriteLock()
+        self.autosave = AutosaveScheduler(self.autosave_records, self.AUTOSAVE_INTERVAL, self.AUTOSAVE_EVERY)
+        # undo / redo of the commands, pending_change collects the rows from before the running command
+        self.log = CommandLog()
+        self.pending_change = None
+
+        self.compact = self.SNAPSHOT_FORMAT == 'compact'
+        self.extension = '.abk' if self.compact else '.json'
+        self.save_file = self.COMPACT_FILE if self.compact else self.SAVE_FILE
+        self.autosave_file = self.COMPACT_AUTOSAVE_FILE if self.compact else self.AUTOSAVE_FILE
+        self.sharded = self.SHARDS > 0
+        self.shard_count = max(self.SHARDS, 1)
+        # names of every shard in the order of the file, a book without shards uses self.data for that
+        self.members = [{} for _ in range(self.SHARDS)]
+
+        # a save from the previous session could still be on its way to the disk
+        SNAPSHOT_WRITER.flush()
+
+        if self.sharded:
+            self.load_shards()
+        elif os.path.exists(self.autosave_file) and self.load_records(self.autosave_file):
+            print('Unsaved changes from the previous session were recovered!')
+            self.unsaved_shards.add(0)
+        elif self.compact and not os.path.exists(self.save_file) and os.path.exists(self.SAVE_FILE):
+            # first start with the compact format, the JSON book is converted on the next save
+            self.load_records(self.SAVE_FILE)
+        else:
+            self.load_records(self.save_file)
+
+        self.journal = Journal(self.JOURNAL_FILE)
+        self.replay_journal()
+
+    def load_records(self, filename):
 
         try:
+            if self.compact and filename.endswith('.abk'):
+                self.attach_snapshot(CompactSnapshot(filename))
+                return True
+            rows = read_snapshot_rows(filename)
 
-            with open('save.json') as reader:
+        except FileNotFoundError:
+            if filename == self.SAVE_FILE:
+                with open(filename, 'w'):
+                    pass
+            return True
 
-                try:
-                    file_data = json.load(reader)
+        except (json.decoder.JSONDecodeError, SnapshotFormatError):
+            self.set_aside_damaged(filename)
+            return False
 
-                    for item in file_data:
-                        name = Name(item['name'])
-                        random_var = item['Phone number']
-                        row_email = Email(item['email'])
-                        row_address = Address(item['address'])
-                        record = Record(name,
-                                        random_var[0], row_email, row_address)
-                        iter = 1
+        self.add_rows(rows, filename.endswith('.abk'))
+        return True
 
-                        while iter < len(random_var):
-                            record.add_phone(
-                                random_var[iter])
-                            iter += 1
+    def load_shards(self):
+        manifest = read_manifest(self.SHARD_DIR)
 
-                        if item['Date of birth'] == '':
-                            record.birthday = ''
+        if manifest is None:
+            single_file = self.save_file if os.path.exists(self.save_file) else self.SAVE_FILE
+            if os.path.exists(single_file):
+                self.load_records(single_file)
+                print(f'The book will be split into {self.shard_count} shards on the next save.')
+                self.dirty.update(self.data)
+            return
 
-                        else:
-                            record.set_birthday(item['Date of birth'])
+        extension = '.abk' if manifest['format'] == 'compact' else '.json'
+        filenames = []
+        recovered = set()
+
+        for index in range(manifest['shards']):
+            autosave_file = shard_file(self.SHARD_DIR, index, extension, autosave=True)
+            if os.path.exists(autosave_file):
+                recovered.add(index)
+                filenames.append(autosave_file)
+            else:
+                filenames.append(shard_file(self.SHARD_DIR, index, extension))
+
+        for filename, (rows, error) in zip(filenames, read_shards(filenames, self.LOAD_WORKERS)):
+            if error is None:
+                self.add_rows(rows, extension == '.abk')
+            else:
+                self.set_aside_damaged(filename)
+
+        if recovered:
+            print('Unsaved changes from the previous session were recovered!')
+
+        if manifest['shards'] != self.shard_count or extension != self.extension:
+            print(f'The book will be saved again as {self.shard_count} {self.SNAPSHOT_FORMAT} shards.')
+            self.dirty.update(self.data)
+        else:
+            self.unsaved_shards.update(recovered)
 
-                        self.data[item['name']] = record
+    @staticmethod
+    def set_aside_damaged(filename):
+        print(f'{filename} is damaged! It was moved to {filename}.damaged, starting without its records.')
+        os.replace(filename, f'{filename}.damaged')
+
+    def attach_snapshot(self, snapshot):
+        # the records are built by build_record when they are accessed, the indexes are built on first use
+        self.data.attach(snapshot)
+        if self.sharded:
+            for name in self.data:
+                self.members[self.shard_of(name)][name] = None
+
+    def build_record(self, name, row):
+        record = self.record_from_compact_row(row)
+        record.book = self
+        self.serialized[name] = row
+        return record
+
+    def add_rows(self, rows, compact_rows):
+
+        for row in rows:
+            record = self.record_from_compact_row(row) if compact_rows else self.record_from_item(row)
+            name = record.name.value
+            record.book = self
+            self.data[name] = record
+            self.reindex_record(record)
+            if self.sharded:
+                self.members[self.shard_of(name)][name] = None
+
+            # a row of the other format is converted on the next save
+            if compact_rows == self.compact:
+                self.serialized[name] = row
+            else:
+                self.dirty.add(name)
 
-                except json.decoder.JSONDecodeError:
-                    file_data = []
-        
-        except FileNotFoundError:
-            with open('save.json', 'w'):
-                pass
+    @staticmethod
+    def record_from_item(item):
+        name = Name(item['name'])
+        random_var = item['Phone number']
+        row_email = Email(item['email'])
+        row_address = Address(item['address'])
+        record = Record(name,
+                        random_var[0], row_email, row_address)
+        iter = 1
+
+        while iter < len(random_var):
+            record.add_phone(
+                random_var[iter])
+            iter += 1
+
+        if item['Date of birth'] == '':
+            record.birthday = ''
+
+        else:
+            record.set_birthday(item['Date of birth'])
+
+        return record
+
+    @classmethod
+    def record_from_row(cls, item):
+        # the same record as record_from_item, without the messages of set_birthday
+        birthday = item['Date of birth']
+        birthday = datetime.strptime(birthday, '%d %B %Y').date() if birthday else None
+        return cls.record_from_compact_row((item['name'], item['Phone number'], birthday, item['email'],
+                                            item['address']))
+
+    @staticmethod
+    def record_from_compact_row(row):
+        name, phones, birthday, email, address = row
+        record = Record(Name(name), phones[0] if phones else '', Email(email), Address(address))
+        # the phones were validated before they got to the snapshot
+        record.phones = phones
+        record.birthday = Birthday(birthday) if birthday else ''
+        return record
+
+    def shard_of(self, contact_name):
+        return shard_of(contact_name, self.shard_count) if self.sharded else 0
+
+    def reading(self):
+        return self.lock.read()
+
+    def writing(self):
+        return self.lock.write()
+
+    def records(self):
+        # A consistent copy of the book for iterating without holding the lock. The phone lists of the
+        # records are replaced on change, never edited in place, so they stay as they were too.
+        with self.reading():
+            return list(self.data.values())
 
-                
     def add_record(self, record, *_):
-        self.data.update({record.name.value: record})
+        with self.writing():
+            self.before_change(record.name.value)
+            record.book = self
+            self.data[record.name.value] = record
+            self.reindex_record(record)
+            self.mark_dirty(record.name.value)
 
     def delete_record(self, contact_name):
-        if str(contact_name) in self.data:
-            del self.data[str(contact_name)]
-            return None
+        with self.writing():
+            if str(contact_name) in self.data:
+                self.before_change(str(contact_name))
+                del self.data[str(contact_name)]
+                self.name_index.remove(str(contact_name))
+                self.address_index.remove(str(contact_name))
+                self.mark_dirty(str(contact_name))
+                return None
+
+    # Undo / redo and the journal: run_command wraps every change in begin_change / end_change, the records
+    # call before_change before they are modified
+    def begin_change(self, command):
+        self.pending_change = (command, {})
+
+    def before_change(self, contact_name):
+        if self.pending_change is not None and contact_name not in self.pending_change[1]:
+            self.pending_change[1][contact_name] = self.row_of(contact_name)
+
+    def end_change(self):
+        command, before = self.pending_change
+        self.pending_change = None
+
+        after = {contact_name: self.row_of(contact_name) for contact_name in before}
+        changed = [contact_name for contact_name in before if before[contact_name] != after[contact_name]]
+        if not changed:
+            return
+
+        self.log.push(command, {name: before[name] for name in changed}, {name: after[name] for name in changed})
+        self.journal.append(command, {name: after[name] for name in changed})
+
+    def row_of(self, contact_name):
+        record = self.data.get(contact_name)
+        return None if record is None else self.serialize_record(record)
+
+    def apply_rows(self, rows):
+        for contact_name, row in rows.items():
+            if row is None:
+                self.data.pop(contact_name, None)
+                self.name_index.remove(contact_name)
+                self.address_index.remove(contact_name)
+            else:
+                record = self.record_from_row(row)
+                record.book = self
+                self.data[contact_name] = record
+                self.reindex_record(record)
+            self.mark_dirty(contact_name)
+
+    def undo(self):
+        """Puts back the records as they were before the last command, returns the command or None."""
+        with self.writing():
+            entry = self.log.undo()
+            if entry is None:
+                return None
+            self.apply_rows(entry['before'])
+            self.journal.append(f'undo {entry["command"]}', entry['before'])
+            return entry['command']
+
+    def redo(self):
+        with self.writing():
+            entry = self.log.redo()
+            if entry is None:
+                return None
+            self.apply_rows(entry['after'])
+            self.journal.append(entry['command'], entry['after'])
+            return entry['command']
+
+    def replay_journal(self):
+        count = 0
+        for _, rows in self.journal.replay():
+            self.apply_rows(rows)
+            count += 1
+        if count:
+            print(f'{count} unsaved changes from the previous session were recovered!')
+
+    def mark_dirty(self, contact_name):
+        self.dirty.add(contact_name)
+        self.autosave.note_change()
+
+        if self.text_index is not None:
+            record = self.data.get(contact_name)
+            if record is None:
+                self.text_index.remove(contact_name)
+            else:
+                self.text_index.add(contact_name, ' '.join(self.record_fields(record)))
+
+        if self.calendar is not None:
+            self.calendar.update(contact_name, birth_date(self.data.get(contact_name)))
+
+        if self.segments is not None:
+            record = self.data.get(contact_name)
+            if record is None:
+                self.segments.remove(contact_name)
+            else:
+                self.segments.add(contact_name, record)
+
+    def segment_index(self):
+        with self.fuzzy_index_lock:
+            if self.segments is None:
+                # the filters and the analytics are imported on first use, they are not needed to start
+                from contact_filters import SegmentIndex
+
+                self.segments = SegmentIndex()
+                for key, record in self.data.items():
+                    self.segments.add(key, record)
+        return self.segments
+
+    def filter_records(self, filters):
+        """Records that match all the filters of contact_filters, sorted by name."""
+        import contact_filters
+
+        return [self.data[key] for key in contact_filters.select(self, filters)]
+
+    def birthday_calendar(self):
+        # several readers can get here at once, only one of them builds the calendar
+        with self.fuzzy_index_lock:
+            if self.calendar is None:
+                self.calendar = BirthdayCalendar()
+            if self.calendar.is_stale():
+                self.calendar.rebuild((key, birth_date(record)) for key, record in self.data.items()
+                                      if birth_date(record) is not None)
+        return self.calendar
+
+    def upcoming_birthdays(self, days):
+        """(date, record) of the birthdays in the next days days, today is 0."""
+        return [(day, self.data[key]) for day, key in self.birthday_calendar().upcoming(days)]
+
+    @staticmethod
+    def record_fields(record):
+        return [record.name.value, *(str(phone) for phone in record.phones), str(record.birthday or ''),
+                str(record.email or ''), str(record.address or '')]
+
+    def regex_find(self, pattern):
+        matches = compile_pattern(pattern).search
+
+        with self.fuzzy_index_lock:
+            if self.text_index is None:
+                self.text_index = TrigramIndex()
+                for key, record in self.data.items():
+                    self.text_index.add(key, ' '.join(self.record_fields(record)))
+
+        # every literal the pattern needs narrows the records down before the regex runs
+        candidates = None
+        for literal in required_literals(pattern):
+            keys = self.text_index.containing(literal)
+            if keys is not None:
+                candidates = keys if candidates is None else candidates & keys
+
+        # sorted by name with the index or without it
+        keys = sorted(self.data if candidates is None else candidates)
+        records = (self.data[key] for key in keys)
+        return [record for record in records if any(matches(field) for field in self.record_fields(record))]
+
+    # Keeps the fuzzy search indexes in sync, must be called after the name or address of a record changes
+    def reindex_record(self, record):
+        if not self.fuzzy_index_ready:
+            return
+
+        key = record.name.value
+        self.name_index.add(key, key)
+        self.address_index.add(key, str(record.address) if record.address else '')
+
+    def build_fuzzy_index(self):
+        # several readers can get here at once, only one of them builds the indexes
+        with self.fuzzy_index_lock:
+            if not self.fuzzy_index_ready:
+                self.fuzzy_index_ready = True
+                for record in self.data.values():
+                    self.reindex_record(record)
+
+    def address_trigrams(self):
+        self.build_fuzzy_index()
+        return self.address_index
+
+    def fuzzy_find(self, query, top_k=None):
+        if top_k is None:
+            top_k = self.FUZZY_TOP_K
+
+        self.build_fuzzy_index()
+
+        best = {}
+        for index in (self.name_index, self.address_index):
+            for similarity, key in index.search(query, top_k):
+                if similarity > best.get(key, 0):
+                    best[key] = similarity
+
+        return heapq.nlargest(top_k, ((similarity, key) for key, similarity in best.items()))
+
+    @staticmethod
+    def serialize_record(record):
+        write_dict = {}
+        write_dict["name"] = record.name.value
+        write_dict["Phone number"] = [str(ph) for ph in record.phones]
+        write_dict["Date of birth"] = birth_date(record).strftime(
+            "%d %B %Y") if birth_date(record) else ''
+        write_dict["email"] = str(
+            record.email) if record.email else ''
+        write_dict["address"] = str(
+            record.address) if record.address else ''
+        return write_dict
+
+    @staticmethod
+    def compact_row(record):
+        return (record.name.value,
+                [str(ph) for ph in record.phones],
+                record.birthday.value if record.birthday else None,
+                str(record.email) if record.email else '',
+                str(record.address) if record.address else '')
+
+    def snapshot_shards(self):
+        # Only the dirty records are serialized again, the rows of the others are reused as they are.
+        # Returns the shards that have changed since the previous snapshot.
+        serialize = self.compact_row if self.compact else self.serialize_record
+        changed = set()
+
+        for contact_name in self.dirty:
+            index = self.shard_of(contact_name)
+            record = self.data.get(contact_name)
+            if record is None:
+                self.serialized.pop(contact_name, None)
+            else:
+                self.serialized[contact_name] = serialize(record)
+
+            if self.sharded and record is None:
+                self.members[index].pop(contact_name, None)
+            elif self.sharded:
+                self.members[index][contact_name] = None
+            changed.add(index)
+
+        self.dirty.clear()
+        self.unsaved_shards |= changed
+        return changed
+
+    def shard_rows(self, index):
+        # The rows are replaced and never changed, so the returned list is a safe copy for the writer
+        names = self.members[index] if self.sharded else self.data
+        serialized = self.serialized
+        # the records that were never accessed are written as they were read
+        return [serialized[contact_name] if contact_name in serialized else self.data.row(contact_name)
+                for contact_name in names]
+
+    def shard_file(self, index, autosave=False):
+        if not self.sharded:
+            return self.autosave_file if autosave else self.save_file
+        return shard_file(self.SHARD_DIR, index, self.extension, autosave)
 
     def close_record_data(self):
 
-        file_data = []
-        
-        for record in self.data.values():
-            write_dict = {}
-            write_dict["name"] = record.name.value
-            write_dict["Phone number"] = [str(ph) for ph in record.phones]
-            write_dict["Date of birth"] = record.birthday.value.strftime(
-                "%d %B %Y") if record.birthday else ''
-            write_dict["email"] = str(
-                record.email) if record.email else ''
-            write_dict["address"] = str(
-                record.address) if record.address else ''
-            file_data.append(write_dict)
-
-        with open('save.json', 'w') as writer:
-            json.dump(file_data, writer, indent=4)
+        with self.writing():
+            self.snapshot_shards()
+
+            if self.unsaved_shards:
+                # the save file can be the mapped snapshot, it is let go before it is replaced
+                self.data.detach()
+                # only the changed shards are written, in the background while the user goes on
+                for index in sorted(self.unsaved_shards):
+                    self.submit_rows(self.shard_file(index), self.shard_rows(index))
+
+                if self.sharded:
+                    manifest = make_manifest(self.shard_count, self.SNAPSHOT_FORMAT,
+                                             [len(names) for names in self.members])
+                    SNAPSHOT_WRITER.submit(os.path.join(self.SHARD_DIR, MANIFEST), manifest, indent=4)
+
+                self.unsaved_shards.clear()
+
+            self.discard_autosave()
+
+    def autosave_records(self):
+
+        with self.writing():
+            if self.autosave.stopped:
+                return
+
+            # the journal has every change already, the autosave takes it to the disk
+            self.journal.sync()
+            if not self.journal.needs_checkpoint() or not self.dirty:
+                return
+
+            # a long journal is slow to replay, the changed shards go to the autosave files instead
+            for index in self.snapshot_shards():
+                self.submit_rows(self.shard_file(index, autosave=True), self.shard_rows(index))
+            self.journal.rotate()
+
+        SNAPSHOT_WRITER.flush()
+        self.journal.drop_rotated()
+
+    def submit_rows(self, filename, rows):
+
+        if self.sharded:
+            os.makedirs(self.SHARD_DIR, exist_ok=True)
+
+        if self.compact:
+            SNAPSHOT_WRITER.submit(filename, rows, write=compact_snapshot.dump)
+        else:
+            SNAPSHOT_WRITER.submit(filename, rows, indent=4)
+
+    def export_records(self, filename):
+        file_data = [self.serialize_record(record) for record in self.records()]
+        SNAPSHOT_WRITER.submit(filename, file_data, indent=4)
+        return len(file_data)
+
+    def discard_autosave(self):
+
+        with self.writing():
+            self.autosave.stop()
+            SNAPSHOT_WRITER.flush()
+            self.journal.discard()
+            # the recovered autosave file can be the mapped snapshot
+            self.data.detach()
+
+            for index in range(self.shard_count):
+                if os.path.exists(self.shard_file(index, autosave=True)):
+                    os.remove(self.shard_file(index, autosave=True))
 
     def iterator(self, n):
         counter = 0
@@ -167,6 +745,7 @@ class Record:
             self.address = address_value
 
         self.birthday = ''
+        self.book = None  # set by AddressBook, gets notified about the changes
 
     def __repr__(self):
         return f"{self.name}; {self.phones}; {self.birthday if self.birthday else ''}; {self.email if self.email else ''}; {self.address if self.address else ''}"
@@ -175,7 +754,9 @@ class Record:
         new_phone = Phone('')
         new_phone.value = phone
         if new_phone.value not in [ph for ph in self.phones]:
-            self.phones.append(new_phone)
+            with self._writing():
+                self.phones = self.phones + [new_phone]
+                self._mark_dirty()
             print(
                 f'{new_phone} record was successfully added for {self.name.value}')
         else:
@@ -200,7 +781,9 @@ class Record:
 
         for index, record in enumerate(self.phones, 0):
             if record == Phone.convert_phone_number(phone):
-                self.phones.pop(index)
+                with self._writing():
+                    self.phones = self.phones[:index] + self.phones[index + 1:]
+                    self._mark_dirty()
                 print(f'{phone} was successfully deleted for {self.name.value}')
                 return
 
@@ -214,17 +797,43 @@ class Record:
 
         days_left = self.birthday._days_to_birthday()
         print(
-            f'{self.name.value}\'s birthday will be roughly in {days_left} days! ({self.birthday.value.strftime("%d %B %Y")})')
+            f'{self.name.value}\'s birthday will be in {days_left} days! ({self.birthday.value.strftime("%d %B %Y")})')
 
     def set_birthday(self, date_val):
-        self.birthday = Birthday('')
-        self.birthday.value = date_val
+        birthday = Birthday('')
+        birthday.value = date_val
+        with self._writing():
+            self.birthday = birthday
+            self._mark_dirty()
         print(f'{self.birthday} BDay record was added for {self.name.value}!')
 
     def set_email(self, email_val):
-        self.email.value = email_val
+        email = Email('')
+        email.value = email_val
+        with self._writing():
+            self.email = email
+            self._mark_dirty()
         print(f'{self.email} email record was added for {self.name.value}!')
 
+    def set_address(self, address_val):
+        with self._writing():
+            self.address = Address(address_val)
+            self._mark_dirty()
+
+    @contextmanager
+    def _writing(self):
+        if self.book is None:
+            yield
+            return
+        # the row before the change is taken under the lock, no other writer can change it in between
+        with self.book.writing():
+            self.book.before_change(self.name.value)
+            yield
+
+    def _mark_dirty(self):
+        if self.book is not None:
+            self.book.mark_dirty(self.name.value)
+
 
 """Class Field виступає головним класом від якого наслідуються інші класи, такі як: Birthday, Name, Phone, Email, 
 Address. Використовується для приведення типів данних."""
@@ -252,18 +861,8 @@ class Birthday(Field):
         self.__value = value  # from 10 January 2020
 
     def _days_to_birthday(self):
-
-        datenow = datetime.now().date()
-        future_bday_date = datetime(
-            year=datenow.year, month=self.value.month, day=self.value.day).date()
-
-        if future_bday_date < datenow:
-            future_bday_date = datetime(
-                year=datenow.year + 1, month=self.value.month, day=self.value.day).date()
-
-        delta = future_bday_date - datenow
-        pure_days = delta.days % 365
-        return pure_days
+        # 29 February is celebrated on 28 February in the other years
+        return days_to_birthday(self.value)
 
     @property
     def value(self):
@@ -396,6 +995,13 @@ class Address(Field):
         self.__value = new_value
 
 
+# Date of birth of the record, None when it is not set (or was set in a wrong format)
+def birth_date(record):
+    if record is None or not record.birthday or isinstance(record.birthday.value, str):
+        return None
+    return record.birthday.value
+
+
 # Deconstructor that allows using commands with any number or keywords and with any number or passed parameters
 def deconstruct_command(input_line: str) -> list:
     line_list = input_line.split(' ')
@@ -433,33 +1039,11 @@ def deconstruct_command(input_line: str) -> list:
     return new_line_list
 
 
-# save
-def save(adr_book):
-    data = []
-
-    for record in adr_book.data.values():
-        record_data = {
-            'Name': record.name.value,
-            'Phones': [phone.value for phone in record.phones],
-            'Email': record.email.value,
-            'Address': record.address.value,
-            'Birthday': record.birthday.value
-        }
-        data.append(record_data)
-
-    try:
-        with open('save.json', 'w') as json_file:
-            json.dump(data, json_file, indent=4)
-        print('The data is saved in JSON format.')
-
-    except FileNotFoundError:
-        print('Data could not be saved. Check the path to the file.')
-
-
 #Universal command performer/handler
 @command_phone_operations_check_decorator
 def perform_command(command: str, adr_book, *args, **kwargs) -> None:
-    command_list[command](adr_book, *args, **kwargs)
+    with instrumentation.measure(command if command in command_list else '<unknown>'):
+        command_list[command](adr_book, *args, **kwargs)
 
 
 #curry functions
@@ -560,10 +1144,10 @@ def delete_record(adr_book, line_list):
         print("No such phone record!")
 
 
-def close_without_saving(*_):
+def close_without_saving(adr_book, *_):
+    adr_book.discard_autosave()
     print('Will NOT save! BB!')
-    global is_finished
-    is_finished = True
+    session.is_finished = True
 
 
 @command_phone_operations_check_decorator
@@ -599,7 +1183,7 @@ def find(adr_book, line_list):
 
         for phone in record.phones:
 
-            if phone.find(str_to_find) != -1:
+            if str(phone).find(str_to_find) != -1:
                 is_empty = False
                 print(
                     f'Name: {record.name} | Phones: {phones_string} | Birthday: {record.birthday} | Email: {record.email} | Address: {record.address}')
@@ -609,12 +1193,163 @@ def find(adr_book, line_list):
         print('Nothing!')
 
 
+@command_phone_operations_check_decorator
+def regex_find(adr_book, line_list):
+    # the pattern can have spaces, the line was split on them
+    pattern = ' '.join(line_list[1:])
+    if not pattern:
+        raise IndexError
+
+    try:
+        records = adr_book.regex_find(pattern)
+    except re.error as error:
+        print(f'Invalid regex: {error}')
+        raise WrongArgumentFormat
+
+    print(f'Looking for /{pattern}/. Found...')
+    for record in records:
+        phones_string = ', '.join([str(ph) for ph in record.phones])
+        print(
+            f'Name: {record.name} | Phones: {phones_string} | Birthday: {record.birthday} | Email: {record.email} | Address: {record.address}')
+
+    if not records:
+        print('Nothing!')
+
+
+@command_phone_operations_check_decorator
+def filter_records(adr_book, line_list):
+    import contact_filters
+
+    # the filters can have quoted values with spaces, the line was split on them
+    query = ' '.join(line_list[1:])
+    if not query:
+        raise IndexError
+
+    try:
+        records = adr_book.filter_records(contact_filters.parse(query))
+    except contact_filters.FilterSyntaxError as error:
+        print(f'{error}! Filters: phone:<prefix> domain:<domain> address:<text> month:<month> '
+              f'bday:<today/week/month/days> no-email')
+        raise WrongArgumentFormat
+
+    print(f'Looking for {query}. Found {len(records)}...')
+    for record in records:
+        phones_string = ', '.join([str(ph) for ph in record.phones])
+        print(
+            f'Name: {record.name} | Phones: {phones_string} | Birthday: {record.birthday} | Email: {record.email} | Address: {record.address}')
+
+    if not records:
+        print('Nothing!')
+
+
+@command_phone_operations_check_decorator
+def fuzzy_find(adr_book, line_list):
+    if len(line_list) > 3:
+        raise ExcessiveArguments
+
+    str_to_find = line_list[1]
+    top_k = int(line_list[2]) if len(line_list) == 3 else adr_book.FUZZY_TOP_K
+
+    if top_k <= 0:
+        print('Number of results should be a positive number!')
+        raise WrongArgumentFormat
+
+    print(f'Looking for something like {str_to_find}. Found...')
+    results = adr_book.fuzzy_find(str_to_find, top_k)
+
+    for similarity, key in results:
+        record = adr_book.data[key]
+        phones_string = ', '.join([str(ph) for ph in record.phones])
+        print(
+            f'[{similarity:.0%}] Name: {record.name} | Phones: {phones_string} | Birthday: {record.birthday} | Email: {record.email} | Address: {record.address}')
+
+    if not results:
+        print('Nothing!')
+
+
 def finish_session(adr_book, *_) -> None:
 
     adr_book.close_record_data()
     print('Good bye!')
-    global is_finished
-    is_finished = True
+    session.is_finished = True
+
+
+@command_phone_operations_check_decorator
+def export_records(adr_book, line_list):
+    if len(line_list) > 2:
+        raise ExcessiveArguments
+
+    filename = line_list[1] if len(line_list) == 2 else 'export.json'
+    count = adr_book.export_records(filename)
+    print(f'{count} records were exported to {filename}!')
+
+
+def show_stats(adr_book, line_list, *_):
+    option = line_list[1].casefold() if len(line_list) > 1 else ''
+
+    if option == 'on':
+        instrumentation.enable()
+        print('Command statistics are on!')
+    elif option == 'profile':
+        instrumentation.enable(profile=True)
+        print('Command statistics and profiling are on!')
+    elif option == 'off':
+        instrumentation.disable()
+        print('Command statistics are off!')
+    elif instrumentation.INSTRUMENTATION is None:
+        print('Command statistics are off! Turn them on with "stats on" or "stats profile".')
+    elif option == 'dump':
+        filename = line_list[2] if len(line_list) > 2 else 'session.prof'
+        print(instrumentation.INSTRUMENTATION.dump_profile(filename))
+    else:
+        print(instrumentation.INSTRUMENTATION.report())
+
+
+def show_memory(adr_book, line_list, *_):
+    # the report walks every record, the module is only needed when somebody asks for it
+    import memory_report
+
+    option = line_list[1].casefold() if len(line_list) > 1 else ''
+
+    if option == 'trace':
+        memory_report.start_tracing()
+        print('tracemalloc is on, the allocations from now on go to the report!')
+    elif option:
+        print('Use "memory" for the report or "memory trace" to start tracemalloc!')
+    else:
+        print(memory_report.address_book_report(adr_book))
+
+
+@command_phone_operations_check_decorator
+def show_analytics(adr_book, line_list, *_):
+    import contact_stats
+
+    if len(line_list) > 3:
+        raise ExcessiveArguments
+
+    sections = contact_stats.SECTIONS
+    top = contact_stats.TOP
+
+    for option in line_list[1:]:
+        if option.isdigit():
+            top = int(option)
+        elif option.casefold() in contact_stats.SECTIONS:
+            sections = (option.casefold(),)
+        else:
+            print(f'Use "analytics [{" / ".join(contact_stats.SECTIONS)}] [number of top values]"!')
+            raise WrongArgumentFormat
+
+    print(contact_stats.report(adr_book.segment_index(), sections, top))
+
+
+def undo(adr_book, line_list, *_):
+    command = adr_book.undo()
+    print(f'Undone: {command}' if command else 'Nothing to undo!')
+
+
+def redo(adr_book, line_list, *_):
+    command = adr_book.redo()
+    print(f'Redone: {command}' if command else 'Nothing to redo!')
 
 
 def hello(*_) -> None:
@@ -660,30 +1395,61 @@ def show_bday_in_days(adr_book, line_list, *_) -> None:
         print('Timeframe could not be a negative number!')
         raise WrongArgumentFormat
 
-    datetime_timedelta = timedelta(days=int(days_timeframe))
-    is_empty = True
-
     print(f'You wanted to see Bdays in {days_timeframe} days! Here we go: ')
+    print_birthdays(adr_book.upcoming_birthdays(days_timeframe),
+                    'Sorry! Seems like nobody have BDays in the set timeframe!')
 
-    for record in adr_book.data.values():
 
-        if type(record.birthday) == str:
-            continue
+def print_birthdays(birthdays, empty_message):
+    today = datetime.now().date()
 
-        record_timedelta = timedelta(days=record.birthday._days_to_birthday())
+    for day, record in birthdays:
+        recorded_phones = ', '.join([str(ph) for ph in record.phones])
+        age = day.year - record.birthday.value.year
 
-        if record_timedelta <= datetime_timedelta:
+        print('=' * 10)
+        print(f'{record.name} will have a BDay in {(day - today).days}! ({day.strftime("%d %B %Y")}, turns {age})')
+        print(f'His data: phones - {recorded_phones}, email - {record.email}, address - {record.address}')
 
-            recorded_phones = ', '.join([str(ph) for ph in record.phones])
+    if not birthdays:
+        print(empty_message)
 
-            print('=' * 10)
-            print(f'{record.name} will have a BDay in {record_timedelta.days}! ({record.birthday})')
-            print(f'His data: phones - {recorded_phones}, email - {record.email}, address - {record.address}')
 
-            is_empty = False
+@command_phone_operations_check_decorator
+def show_bday_today(adr_book, line_list, *_):
+    if len(line_list) > 1:
+        raise ExcessiveArguments
 
-    if is_empty:
-        print('Sorry! Seems like nobody have BDays in the set timeframe!')
+    print_birthdays(adr_book.upcoming_birthdays(0), 'Nobody has a BDay today!')
+
+
+@command_phone_operations_check_decorator
+def show_bday_week(adr_book, line_list, *_):
+    if len(line_list) > 1:
+        raise ExcessiveArguments
+
+    print_birthdays(adr_book.upcoming_birthdays(6), 'Nobody has a BDay this week!')
+
+
+@command_phone_operations_check_decorator
+def export_birthdays(adr_book, line_list, *_):
+    if len(line_list) > 3:
+        raise ExcessiveArguments
+
+    days = line_list[1] if len(line_list) > 1 else '365'
+
+    if not days.isdigit():
+        print('Timeframe should be a positive number!')
+        raise WrongArgumentFormat
+
+    days = int(days)
+    filename = line_list[2] if len(line_list) > 2 else 'birthdays.ics'
+    birthdays = adr_book.upcoming_birthdays(days)
+    ages = {record.name.value: day.year - record.birthday.value.year for day, record in birthdays}
+    calendar = to_icalendar([(day, record.name.value) for day, record in birthdays], ages)
+
+    atomic_write_stream(filename, lambda file: file.write(calendar.encode('utf-8')), mode='wb')
+    print(f'{len(birthdays)} BDays of the next {days} days were exported to {filename}!')
 
 
 @command_phone_operations_check_decorator
@@ -754,7 +1520,8 @@ def set_address(adr_book, line_list, *_):
         print(f'Cannot find name {record_name} in the list!')
         return
     address_val = input('Please set the address: ')
-    adr_book.data[record_name].address = address_val
+    adr_book.data[record_name].set_address(address_val)
+    adr_book.reindex_record(adr_book.data[record_name])
     print(f'Address {address_val} was set successfully for {record_name}!')
 
 
@@ -804,8 +1571,20 @@ command_list = {'not save': close_without_saving,
                 'show email': show_email,
                 'show address': show_address,
                 'find': find,
+                'fuzzy': fuzzy_find,
+                'regex': regex_find,
+                'filter': filter_records,
                 'help': help,
-                'bday in': show_bday_in_days}
+                'export': export_records,
+                'stats': show_stats,
+                'memory': show_memory,
+                'analytics': show_analytics,
+                'undo': undo,
+                'redo': redo,
+                'bday in': show_bday_in_days,
+                'bday today': show_bday_today,
+                'bday week': show_bday_week,
+                'bday export': export_birthdays}
 
 # command vocab with descriptions
 command_description = {'not save': 'Close adress book without saving',
@@ -826,8 +1605,27 @@ command_description = {'not save': 'Close adress book without saving',
                        'show email': 'Show an email for the existing record',
                        'show address': 'Show an address for the existing record',
                        'find': 'Find record that contains ...',
+                       'fuzzy': 'Find records with a name or address similar to ... (optionally: number of results)',
+                       'regex': 'Find records with a field that matches the regular expression ...',
+                       'filter': 'Find records that match all the filters (phone:067 domain:gmail.com address:Kyiv '
+                                 'month:May bday:week no-email)',
                        'help': 'Show full list of available commands',
-                       'bday in': 'Show records that have BDay in set timeframe of days'}
+                       'export': 'Export all the records to a JSON file (export.json by default)',
+                       'stats': 'Show command timings and errors (stats on / off / profile / dump <file>)',
+                       'memory': 'Show memory used by the records by field and type (memory trace: start tracemalloc)',
+                       'analytics': 'Show contacts by email domain, operator, birthday month and filled fields '
+                                    '(optionally: one of domains / operators / months / fields, number of top values)',
+                       'undo': 'Undo the last change of the records',
+                       'redo': 'Redo the last undone change',
+                       'bday in': 'Show records that have BDay in set timeframe of days',
+                       'bday today': 'Show records that have BDay today',
+                       'bday week': 'Show records that have BDay in the next 7 days',
+                       'bday export': 'Export BDays of the next ... days (365 by default) to an iCalendar file (birthdays.ics by default)'}
+
+# commands that only read the book and can run at the same time
+read_only_commands = {'hello', 'help', 'show all', 'show some', 'show bday', 'show email', 'show address',
+                      'find', 'fuzzy', 'regex', 'filter', 'bday in', 'bday today', 'bday week', 'bday export', 'export',
+                      'stats', 'memory', 'analytics'}
 
 # Створення автозавершення для команд
 # command_completer = WordCompleter(list(command_list.keys()), ignore_case=True)
@@ -835,11 +1633,39 @@ command_description = {'not save': 'Close adress book without saving',
 # def get_command_from_user():
 #     return prompt("Enter a command: ", completer=command_completer)
 
+# Runs one input line, returns True when the user has finished the session
+def run_command(adr_book, input_line) -> bool:
+    line_list = deconstruct_command(input_line)
+    current_command = line_list[0].casefold()
+
+    # readers run side by side, a change waits for all of them (and the autosave for the change)
+    # The lock is held through the input() prompts of a command on purpose. A handler checks the record and
+    # then changes it after the answer, and the undo rows of begin_change belong to the book, so another
+    # change in between would end up in this command's log entry. In the REPL only the autosave waits and
+    # the journal has the finished commands already; in the service mode input() never blocks, a missing
+    # answer raises NeedInput and the lock is released before the client is asked.
+    lock = adr_book.reading() if current_command in read_only_commands else adr_book.writing()
+    with lock:
+        if current_command in read_only_commands or current_command in ('undo', 'redo'):
+            perform_command(current_command, adr_book, line_list)
+        else:
+            # the records the command changes are logged for undo and go to the journal
+            adr_book.begin_change(input_line)
+            try:
+                perform_command(current_command, adr_book, line_list)
+            finally:
+                adr_book.end_change()
+
+    finished = getattr(session, 'is_finished', False)
+    session.is_finished = False
+    return finished
+
+
 # main
 def main():
 
-    global is_finished
     adr_book = AddressBook()
+    adr_book.autosave.start()
 
     print('*' * 10)
     hello()
@@ -858,13 +1684,9 @@ def main():
         print('*' * 10)
 
         input_line = input('Put your request here: ')
-        line_list = deconstruct_command(input_line)
-        current_command = line_list[0].casefold()
-        perform_command(current_command, adr_book, line_list)
 
         # checker to return to jason.py
-        if is_finished:
-            is_finished = False
+        if run_command(adr_book, input_line):
             break
 
 
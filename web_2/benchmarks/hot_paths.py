@@ -0,0 +1,253 @@
+"""Benchmarks of the hot paths of the address book, the notebook and the file sorter.
+
+Every benchmark runs on synthetic data in a temporary folder, once per size tier, and the best of
+--repeat runs counts. The results go to a JSON file, pass the file of another commit with --compare
+to see the difference:
+
+    python benchmarks/hot_paths.py --tiers small,medium --output before.json
+    python benchmarks/hot_paths.py --tiers small,medium --output after.json --compare before.json
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import address_book  # noqa: E402
+import file_parser  # noqa: E402
+import file_sort  # noqa: E402
+import note_book  # noqa: E402
+from storage import SNAPSHOT_WRITER  # noqa: E402
+
+TIERS = {
+    'small': {'contacts': 1_000, 'notes': 1_000, 'files': 200},
+    'medium': {'contacts': 10_000, 'notes': 10_000, 'files': 2_000},
+    'large': {'contacts': 100_000, 'notes': 100_000, 'files': 20_000},
+}
+
+WORDS = ('milk', 'cow', 'sea', 'marine', 'baby', 'sitter', 'plan', 'revenge', 'coffee', 'train', 'kyiv', 'lviv',
+         'report', 'meeting', 'budget', 'garden', 'python', 'music', 'travel', 'doctor')
+EXTENSIONS = ('jpeg', 'jpg', 'png', 'svg', 'mp3', 'mp4', 'zip', 'txt', 'pdf', '')
+
+
+# Data generators
+def make_contacts(count, rng):
+    start = date(1970, 1, 1)
+    contacts = []
+
+    for i in range(count):
+        phones = [f'+38050{rng.randrange(10 ** 7):07d}' for _ in range(rng.randint(1, 3))]
+        birthday = start + timedelta(days=rng.randrange(365 * 40)) if rng.random() < 0.7 else None
+        contacts.append({
+            'name': f'{rng.choice(WORDS).capitalize()}{i}',
+            'Phone number': phones,
+            'Date of birth': birthday.strftime('%d %B %Y') if birthday else '',
+            'email': f'user{i}@{rng.choice(("gmail.com", "ukr.net", "example.com.ua"))}' if rng.random() < 0.8 else '',
+            'address': f'{rng.choice(WORDS).capitalize()} street, {rng.randint(1, 200)}' if rng.random() < 0.6 else '',
+        })
+
+    return contacts
+
+
+def make_notes(count, rng):
+    return [{
+        'title': f'{rng.choice(WORDS).capitalize()} note {i}',
+        'content': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))),
+        'tags': rng.sample(WORDS, rng.randint(0, 4)),
+    } for i in range(count)]
+
+
+def make_tree(root: Path, count, rng):
+    folders = [root]
+    for i in range(max(1, count // 50)):
+        folder = rng.choice(folders) / f'folder_{i}'
+        folder.mkdir()
+        folders.append(folder)
+
+    for i in range(count):
+        extension = rng.choice(EXTENSIONS)
+        name = f'file_{i}' if rng.random() < 0.5 else f'файл_{i}'
+        (rng.choice(folders) / (f'{name}.{extension}' if extension else name)).write_bytes(b'x' * rng.randint(0, 512))
+
+
+# Helpers
+def best_of(repeat, run, setup=None):
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state) if setup else run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def answers(*values):
+    pending = list(values)
+    original = builtins.input
+    builtins.input = lambda prompt='': pending.pop(0)
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+
+def reset_parser():
+    file_parser.reset()
+
+
+# Benchmarks
+def bench_address_book(count, repeat, rng):
+    with open('save.json', 'w') as writer:
+        json.dump(make_contacts(count, rng), writer, indent=4)
+
+    results = {}
+
+    with quiet():
+        results['load'] = best_of(repeat, address_book.AddressBook)
+        book = address_book.AddressBook()
+
+        def save():
+            book.dirty.update(book.data)
+            book.close_record_data()
+            SNAPSHOT_WRITER.flush()
+
+        results['save'] = best_of(repeat, save)
+        results['find'] = best_of(repeat, lambda: address_book.run_command(book, 'find street'))
+        results['fuzzy'] = best_of(repeat, lambda: address_book.run_command(book, 'fuzzy Kyvi'))
+        results['bday_in'] = best_of(repeat, lambda: address_book.run_command(book, 'bday in 30'))
+
+    return results
+
+
+def bench_notebook(count, repeat, rng):
+    with open('notes.json', 'w') as writer:
+        json.dump(make_notes(count, rng), writer)
+
+    results = {}
+
+    with quiet():
+        results['load'] = best_of(repeat, lambda: note_book.Notebook('notes.json'))
+        notebook = note_book.Notebook('notes.json')
+        results['search_notes'] = best_of(repeat, lambda: notebook.search_notes('revenge'))
+        results['sort_notes_by_tags'] = best_of(repeat, lambda: notebook.sort_notes_by_tags('python'))
+
+        def sort_command():
+            with answers('coffee'):
+                note_book.run_command(notebook, 'sort')
+
+        results['sort_command'] = best_of(repeat, sort_command)
+
+        def save():
+            notebook.save_notes()
+            SNAPSHOT_WRITER.flush()
+
+        results['save'] = best_of(repeat, save)
+
+    return results
+
+
+def bench_file_sort(count, repeat, rng):
+    results = {'scan': [], 'sort': []}
+
+    for i in range(repeat):
+        root = Path(f'tree_{i}')
+        root.mkdir()
+        make_tree(root, count, rng)
+
+        reset_parser()
+        start = time.perf_counter()
+        file_parser.scan(root)
+        results['scan'].append(time.perf_counter() - start)
+
+        reset_parser()
+        with quiet(), answers(str(root), 'exit'):
+            start = time.perf_counter()
+            file_sort.main()
+            results['sort'].append(time.perf_counter() - start)
+
+    return {name: min(times) for name, times in results.items()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print(f'\n{"benchmark":<40}{"before s":>12}{"after s":>12}{"ratio":>8}')
+    for key, seconds in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        ratio = seconds / before if before else float('inf')
+        print(f'{key:<40}{before:>12.4f}{seconds:>12.4f}{ratio:>8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiers', default='small,medium', help=f'comma separated, from {", ".join(TIERS)}')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=2023)
+    parser.add_argument('--only', choices=('contacts', 'notes', 'files'))
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='JSON', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    results = {}
+    output = os.path.abspath(args.output)
+    workdir = os.getcwd()
+
+    for tier in args.tiers.split(','):
+        sizes = TIERS[tier]
+        benches = {'contacts': bench_address_book, 'notes': bench_notebook, 'files': bench_file_sort}
+
+        for kind, bench in benches.items():
+            if args.only and args.only != kind:
+                continue
+
+            with tempfile.TemporaryDirectory() as folder:
+                os.chdir(folder)
+                try:
+                    timings = bench(sizes[kind], args.repeat, random.Random(args.seed))
+                finally:
+                    os.chdir(workdir)
+
+            for name, seconds in timings.items():
+                key = f'{kind}.{name}[{sizes[kind]}]'
+                results[key] = seconds
+                print(f'{key:<40}{seconds:>12.4f} s')
+
+    with open(output, 'w') as writer:
+        json.dump({'commit': git_commit(), 'python': platform.python_version(), 'seed': args.seed,
+                   'repeat': args.repeat, 'results': results}, writer, indent=4)
+    print(f'Results were saved to {output}')
+
+    if args.compare:
+        with open(args.compare) as reader:
+            compare(results, json.load(reader)['results'])
+
+
+if __name__ == '__main__':
+    main()
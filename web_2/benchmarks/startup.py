@@ -0,0 +1,69 @@
+"""Startup benchmark for the jason.py launcher.
+
+Runs `python -X importtime` for the launcher and for every subprogram in a fresh interpreter and checks
+the results against the budgets below, so a slow import that sneaks into the startup path shows up.
+Exits with code 1 on a regression, it is meant to be run from CI or before building the image:
+
+    python benchmarks/startup.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> cumulative import time budget, microseconds
+BUDGETS = {
+    'jason': 5_000,
+    'address_book': 60_000,
+    'note_book': 30_000,
+    'file_sort': 30_000,
+}
+
+# heavy dependencies that must be imported on the first use only
+DEFERRED = {'prompt_toolkit', 'shutil', 'tempfile', 'concurrent', 'difflib'}
+
+
+def import_times(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative_us)
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='runs per module, the fastest one counts')
+    args = parser.parse_args()
+
+    failed = False
+
+    for module, budget in BUDGETS.items():
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[module])
+        cumulative = best[module]
+        leaked = sorted(DEFERRED & {name.split('.')[0] for name in best})
+
+        status = 'ok'
+        if cumulative > budget:
+            status = f'SLOW (budget {budget} us)'
+            failed = True
+        if leaked:
+            status = f'imports {", ".join(leaked)} at startup'
+            failed = True
+
+        print(f'{module:<15}{cumulative:>10} us  {status}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
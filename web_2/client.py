@@ -0,0 +1,73 @@
+"""Command line client for server.py, works like the address book and the notebook menus of jason.py."""
+import argparse
+import json
+import socket
+
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+
+class Client:
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix_path)
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.stream = self.sock.makefile('rwb')
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+    def request(self, book, command, answers=()):
+        self.stream.write(json.dumps({'book': book, 'command': command, 'input': list(answers)}).encode() + b'\n')
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError('The server has closed the connection!')
+        return json.loads(line)
+
+    def run(self, book, command):
+        # asks the user for the answers the server needs and sends the command again with them
+        answers = []
+
+        while True:
+            response = self.request(book, command, answers)
+
+            if 'need_input' in response:
+                answers.append(input(response['need_input']))
+                continue
+
+            if not response['ok']:
+                print(response['error'])
+                return False
+
+            print(response['output'], end='')
+            return response['finished']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('book', nargs='?', choices=('contacts', 'notes'), default='contacts')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='connect to a Unix socket instead of TCP')
+    args = parser.parse_args()
+
+    client = Client(args.host, args.port, args.unix)
+    prompt = 'Put your request here: ' if args.book == 'contacts' else 'Enter a command: '
+
+    try:
+        while True:
+            print('*' * 10)
+            if client.run(args.book, input(prompt)):
+                break
+    except (EOFError, KeyboardInterrupt):
+        print()
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
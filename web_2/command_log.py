@@ -0,0 +1,122 @@
+import json
+import os
+from collections import deque
+
+
+# Undo / redo of the address book commands and the journal of the changes since the last save.
+# A logged command keeps the rows of the records it touched as they were before and after it (None for a
+# record that did not exist): undo puts the rows from before back, redo the ones from after. The log keeps
+# at most MAX_ENTRIES commands and MAX_BYTES of rows, the oldest are forgotten first.
+# Every change (a command, an undo or a redo) is also appended to the journal as the rows after it. On start
+# the journal is replayed over the snapshot, a row replaces the record as it is, so replaying a change the
+# snapshot already has does no harm. Once the journal has grown over CHECKPOINT_BYTES the autosave moves it
+# aside and writes the changed shards, the old journal is deleted when they are on disk.
+
+class CommandLog:
+    MAX_ENTRIES = 100
+    MAX_BYTES = 1 << 20
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = self.MAX_ENTRIES if max_entries is None else max_entries
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        # every entry: {"command": ..., "before": {name: row}, "after": {name: row}, "size": ...}
+        self.undo_entries = deque()
+        self.redo_entries = []
+        self.size = 0
+
+    def push(self, command, before, after):
+        for entry in self.redo_entries:
+            self.size -= entry['size']
+        self.redo_entries.clear()
+
+        size = len(json.dumps([before, after], ensure_ascii=False))
+        self.undo_entries.append({'command': command, 'before': before, 'after': after, 'size': size})
+        self.size += size
+
+        while self.undo_entries and (len(self.undo_entries) > self.max_entries or self.size > self.max_bytes):
+            self.size -= self.undo_entries.popleft()['size']
+
+    def undo(self):
+        """The entry to undo, None when there is nothing left."""
+        if not self.undo_entries:
+            return None
+        entry = self.undo_entries.pop()
+        self.redo_entries.append(entry)
+        return entry
+
+    def redo(self):
+        if not self.redo_entries:
+            return None
+        entry = self.redo_entries.pop()
+        self.undo_entries.append(entry)
+        return entry
+
+
+class Journal:
+    CHECKPOINT_BYTES = 1 << 20
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.old_filename = filename + '.old'
+        self.file = None
+
+    def append(self, command, rows):
+        if self.file is None:
+            self.file = open(self.filename, 'a', encoding='utf-8')
+        self.file.write(json.dumps({'command': command, 'rows': rows}, ensure_ascii=False) + '\n')
+        # in the OS cache the line outlives a crash of the program, sync() takes it to the disk
+        self.file.flush()
+
+    def sync(self):
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def needs_checkpoint(self):
+        return self.file is not None and self.file.tell() > self.CHECKPOINT_BYTES
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def rotate(self):
+        """Moves the journal aside, the changes from now on go to a new one."""
+        self.close()
+        if not os.path.exists(self.filename):
+            return
+        if not os.path.exists(self.old_filename):
+            os.replace(self.filename, self.old_filename)
+            return
+
+        # the snapshot of the previous checkpoint did not get to the disk, the old journal is still needed
+        with open(self.filename, encoding='utf-8') as reader, open(self.old_filename, 'a', encoding='utf-8') as writer:
+            writer.write(reader.read())
+        os.remove(self.filename)
+
+    def drop_rotated(self):
+        try:
+            os.remove(self.old_filename)
+        except FileNotFoundError:
+            pass
+
+    def discard(self):
+        self.close()
+        self.drop_rotated()
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+    def replay(self):
+        """The changes of both journals in order, as (command, rows)."""
+        for filename in (self.old_filename, self.filename):
+            if not os.path.exists(filename):
+                continue
+            with open(filename, encoding='utf-8') as reader:
+                for line in reader:
+                    try:
+                        change = json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line was cut by a crash, the command did not get to the journal
+                        break
+                    yield change['command'], change['rows']
@@ -0,0 +1,154 @@
+import mmap
+import os
+import struct
+from datetime import date
+from storage import atomic_write_bytes
+
+
+# Compact binary snapshot of the address book (save.abk).
+#
+# header:  magic, version, number of records, number of phones, offsets of the phone and the record index
+# phones:  string table, every distinct phone number is stored once as <u32 length><utf-8>
+# records: <u32 length><payload>, payload = <u32 len>name <u32 birthday ordinal, 0 = no bday>
+#          <u32 len>email <u32 len>address <u32 count><u32 phone id>...
+# indexes: <u32 offset> of every phone and of every record, so any record can be decoded without
+#          touching the others
+#
+# A row is a tuple (name, phones, birthday, email, address), where birthday is a date or None.
+
+MAGIC = b'ABKS'
+VERSION = 1
+HEADER = struct.Struct('<4sHIIII')
+U32 = struct.Struct('<I')
+
+
+class SnapshotFormatError(Exception):
+    pass
+
+
+def _pack_str(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    return U32.pack(len(encoded)) + encoded
+
+
+def dumps(rows) -> bytes:
+    phone_ids = {}
+    records = []
+
+    for name, phones, birthday, email, address in rows:
+        ids = [phone_ids.setdefault(phone, len(phone_ids)) for phone in phones]
+        payload = b''.join((
+            _pack_str(name),
+            U32.pack(birthday.toordinal() if birthday else 0),
+            _pack_str(email),
+            _pack_str(address),
+            U32.pack(len(ids)),
+            struct.pack(f'<{len(ids)}I', *ids),
+        ))
+        records.append(U32.pack(len(payload)) + payload)
+
+    phones = [_pack_str(phone) for phone in phone_ids]
+
+    position = HEADER.size
+    phone_offsets = _offsets(phones, position)
+    position += sum(map(len, phones))
+    record_offsets = _offsets(records, position)
+    position += sum(map(len, records))
+
+    header = HEADER.pack(MAGIC, VERSION, len(records), len(phones), position, position + 4 * len(phones))
+    return b''.join((header, *phones, *records,
+                     struct.pack(f'<{len(phone_offsets)}I', *phone_offsets),
+                     struct.pack(f'<{len(record_offsets)}I', *record_offsets)))
+
+
+def _offsets(chunks, position):
+    offsets = []
+    for chunk in chunks:
+        offsets.append(position)
+        position += len(chunk)
+    return offsets
+
+
+def dump(filename, rows):
+    atomic_write_bytes(filename, dumps(rows))
+
+
+class CompactSnapshot:
+    """Read-only view of a snapshot file. The file is memory-mapped and a record is decoded only when it is
+    accessed, opening a snapshot reads nothing but the header."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise SnapshotFormatError(f'{filename} is too short to be an address book snapshot')
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, self.phone_count, self.phone_index_offset, self.index_offset = \
+            HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise SnapshotFormatError(f'{filename} is not an address book snapshot')
+        self.phones = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # a full scan reads the records one after another instead of going through the indexes
+        if not self.count:
+            return
+
+        position = HEADER.size
+        for phone_id in range(self.phone_count):
+            phone, position = self._read_str(position)
+            self.phones[phone_id] = phone
+
+        for _ in range(self.count):
+            length, = U32.unpack_from(self.buffer, position)
+            position += U32.size
+            yield self._decode(position)
+            position += length
+
+    def phone(self, phone_id):
+        # decoded phones are kept, most of the numbers are shared by a few records at most
+        phone = self.phones.get(phone_id)
+        if phone is None:
+            offset, = U32.unpack_from(self.buffer, self.phone_index_offset + phone_id * U32.size)
+            phone = self.phones[phone_id] = self._read_str(offset)[0]
+        return phone
+
+    def _read_str(self, position):
+        length, = U32.unpack_from(self.buffer, position)
+        position += U32.size
+        return self.buffer[position:position + length].decode('utf-8'), position + length
+
+    def name(self, i):
+        offset, = U32.unpack_from(self.buffer, self.index_offset + i * U32.size)
+        return self._read_str(offset + U32.size)[0]
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+
+        offset, = U32.unpack_from(self.buffer, self.index_offset + i * U32.size)
+        return self._decode(offset + U32.size)
+
+    def _decode(self, position):
+        name, position = self._read_str(position)
+        ordinal, = U32.unpack_from(self.buffer, position)
+        email, position = self._read_str(position + U32.size)
+        address, position = self._read_str(position)
+        phone_count, = U32.unpack_from(self.buffer, position)
+        ids = struct.unpack_from(f'<{phone_count}I', self.buffer, position + U32.size)
+
+        return (name, [self.phone(phone_id) for phone_id in ids],
+                date.fromordinal(ordinal) if ordinal else None, email, address)
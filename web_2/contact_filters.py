@@ -0,0 +1,309 @@
+import shlex
+from collections import Counter
+
+
+# Segment queries over the contacts: a query is a list of filters that all have to match,
+# e.g. "domain:gmail.com bday:week address:Kyiv".
+# SegmentIndex keeps the keys of the contacts by email domain, operator code and birthday month and the
+# keys without an email, it is updated on every change of a record. The sizes of its sets and the counts of
+# the filled fields are the aggregate statistics of the book (contact_stats). Every filter tells how many contacts it
+# can match at most, the cheapest filters give their keys first and the sets are intersected from the
+# smallest. Once few candidates are left the remaining filters are checked on the records themselves, so a
+# query is one pass over its candidates and never a pass per filter.
+
+# fewer candidates than that are checked directly, looking up one more index would cost more
+VERIFY_BELOW = 32
+NO_EMAIL = ''
+
+
+class FilterSyntaxError(Exception):
+    pass
+
+
+def email_domain(record):
+    email = str(record.email or '')
+    return email.rpartition('@')[2].casefold() if '@' in email else NO_EMAIL
+
+
+def operator_codes(record):
+    # phones are kept as +380XXYYYYYYY, XX with the leading 0 is the operator code (050, 067...)
+    return {str(phone)[3:6] for phone in record.phones if str(phone).startswith('+380')}
+
+
+def birth_month(record):
+    born = record.birthday.value if record.birthday else None
+    return None if born is None or isinstance(born, str) else born.month
+
+
+def filled_fields(record, month):
+    fields = ['phone'] if record.phones else []
+    if email_domain(record) != NO_EMAIL:
+        fields.append('email')
+    if str(record.address or '').strip():
+        fields.append('address')
+    if month is not None:
+        fields.append('birthday')
+    return tuple(fields)
+
+
+class SegmentIndex:
+
+    def __init__(self):
+        self.domains = {}
+        self.operators = {}
+        self.months = {}
+        # number of contacts with each field set
+        self.filled = Counter()
+        # what every key was indexed under, to take it out again
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, record):
+        self.remove(key)
+        domain, codes, month = email_domain(record), operator_codes(record), birth_month(record)
+        fields = filled_fields(record, month)
+        self.entries[key] = domain, codes, month, fields
+        self.filled.update(fields)
+
+        self.domains.setdefault(domain, set()).add(key)
+        for code in codes:
+            self.operators.setdefault(code, set()).add(key)
+        if month is not None:
+            self.months.setdefault(month, set()).add(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        domain, codes, month, fields = entry
+        self.filled.subtract(fields)
+
+        _discard(self.domains, domain, key)
+        for code in codes:
+            _discard(self.operators, code, key)
+        if month is not None:
+            _discard(self.months, month, key)
+
+
+def _discard(postings, value, key):
+    keys = postings[value]
+    keys.discard(key)
+    if not keys:
+        del postings[value]
+
+
+class ContactFilter:
+    # the keys from candidates() are exactly the matching ones, matches() does not need to check them again
+    exact = True
+
+    def estimate(self, book) -> int:
+        """Upper bound of the number of matching contacts."""
+        return len(book.data)
+
+    def candidates(self, book):
+        """Keys of the contacts that can match, None when there is no index for the filter."""
+        return None
+
+    def matches(self, record) -> bool:
+        raise NotImplementedError
+
+
+class IndexedFilter(ContactFilter):
+    postings = ''
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.value!r})'
+
+    def keys(self, book):
+        return getattr(book.segment_index(), self.postings).get(self.value, set())
+
+    def estimate(self, book):
+        return len(self.keys(book))
+
+    def candidates(self, book):
+        return self.keys(book)
+
+
+class EmailDomain(IndexedFilter):
+    postings = 'domains'
+
+    def __init__(self, domain):
+        super().__init__(domain.lstrip('@').casefold())
+
+    def matches(self, record):
+        return email_domain(record) == self.value
+
+
+class NoEmail(EmailDomain):
+
+    def __init__(self):
+        super().__init__(NO_EMAIL)
+
+
+class PhonePrefix(IndexedFilter):
+    postings = 'operators'
+
+    def __init__(self, prefix):
+        prefix = prefix.lstrip('+')
+        if not prefix.isdigit():
+            raise FilterSyntaxError(f'Phone prefix should be digits: {prefix}')
+        # the same forms as the phones: 380XX..., 80XX..., 0XX... or only the code without 0
+        if prefix.startswith('380') or '380'.startswith(prefix):
+            prefix = '+' + prefix
+        elif prefix.startswith('80'):
+            prefix = '+3' + prefix
+        elif prefix.startswith('0'):
+            prefix = '+38' + prefix
+        else:
+            prefix = '+380' + prefix
+        self.prefix = prefix
+        super().__init__(prefix[3:6])
+
+    def __repr__(self):
+        return f'PhonePrefix({self.prefix!r})'
+
+    def estimate(self, book):
+        return super().estimate(book) if len(self.prefix) >= 6 else len(book.data)
+
+    def candidates(self, book):
+        # a prefix shorter than the operator code does not pick one of them
+        return super().candidates(book) if len(self.prefix) >= 6 else None
+
+    @property
+    def exact(self):
+        return len(self.prefix) == 6
+
+    def matches(self, record):
+        return any(str(phone).startswith(self.prefix) for phone in record.phones)
+
+
+class BirthdayMonth(IndexedFilter):
+    postings = 'months'
+
+    def __init__(self, month):
+        # calendar pulls in locale, only the month filters need the names
+        import calendar
+
+        names = {name.casefold(): number for number, name in enumerate(calendar.month_name) if name}
+        names.update({name.casefold(): number for number, name in enumerate(calendar.month_abbr) if name})
+        number = int(month) if month.isdigit() else names.get(month.casefold())
+        if number is None or not 1 <= number <= 12:
+            raise FilterSyntaxError(f'Unknown month: {month}')
+        super().__init__(number)
+
+    def matches(self, record):
+        return birth_month(record) == self.value
+
+
+class BirthdayWithin(ContactFilter):
+
+    def __init__(self, days):
+        self.days = days
+
+    def __repr__(self):
+        return f'BirthdayWithin({self.days})'
+
+    def estimate(self, book):
+        return len(book.birthday_calendar().upcoming(self.days))
+
+    def candidates(self, book):
+        return {key for _, key in book.birthday_calendar().upcoming(self.days)}
+
+    def matches(self, record):
+        # the records come from the same book, its calendar knows their next birthdays
+        if record.book is None:
+            return False
+        birthdays = record.book.birthday_calendar()
+        day = birthdays.dates.get(record.name.value)
+        return day is not None and (day - birthdays.today).days <= self.days
+
+
+class AddressContains(ContactFilter):
+    # the trigrams only narrow the contacts down, the substring is checked on every candidate
+    exact = False
+
+    def __init__(self, text):
+        self.text = text.casefold()
+
+    def __repr__(self):
+        return f'AddressContains({self.text!r})'
+
+    def estimate(self, book):
+        bound = book.address_trigrams().rarest(self.text)
+        return len(book.data) if bound is None else bound
+
+    def candidates(self, book):
+        return book.address_trigrams().containing(self.text)
+
+    def matches(self, record):
+        return self.text in str(record.address or '').casefold()
+
+
+def select(book, filters):
+    """Keys of the contacts that match all the filters, sorted."""
+    if not filters:
+        return sorted(book.data)
+
+    filters = sorted(filters, key=lambda item: item.estimate(book))
+    keys = None
+    checked = []
+
+    for item in filters:
+        found = None
+        if keys is None or len(keys) >= VERIFY_BELOW:
+            found = item.candidates(book)
+        if found is None:
+            checked.append(item)
+            continue
+
+        keys = set(found) if keys is None else keys & found
+        if not item.exact:
+            checked.append(item)
+        if not keys:
+            return []
+
+    keys = book.data.keys() if keys is None else keys
+    return sorted(key for key in keys if all(item.matches(book.data[key]) for item in checked))
+
+
+FILTERS = {
+    'phone': PhonePrefix,
+    'operator': PhonePrefix,
+    'domain': EmailDomain,
+    'email': EmailDomain,
+    'address': AddressContains,
+    'month': BirthdayMonth,
+}
+WINDOWS = {'today': 0, 'week': 6, 'month': 30}
+
+
+def parse(query):
+    """Filters of a query like 'domain:gmail.com bday:week address:"Main street" no-email'."""
+    try:
+        words = shlex.split(query)
+    except ValueError as error:
+        raise FilterSyntaxError(str(error))
+
+    filters = []
+    for word in words:
+        name, _, value = word.partition(':')
+        name = name.casefold()
+
+        if name in ('no-email', 'noemail') and not value:
+            filters.append(NoEmail())
+        elif name == 'bday':
+            days = WINDOWS.get(value.casefold(), value)
+            if not str(days).isdigit():
+                raise FilterSyntaxError(f'Birthday window should be today, week, month or a number of days: {value}')
+            filters.append(BirthdayWithin(int(days)))
+        elif name in FILTERS and value:
+            filters.append(FILTERS[name](value))
+        else:
+            raise FilterSyntaxError(f'Unknown filter: {word}')
+
+    return filters
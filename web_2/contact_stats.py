@@ -0,0 +1,52 @@
+# Aggregate statistics of the address book: contacts by email domain, mobile operator, birthday month and
+# field completeness. The counts come from the SegmentIndex of the book, which is updated on every change,
+# so a report only reads the sizes of its sets and never walks the records.
+
+TOP = 10
+FIELDS = ('phone', 'email', 'address', 'birthday')
+MONTHS = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December')
+# operator codes of the +380 numbers
+OPERATORS = {
+    '050': 'Vodafone', '066': 'Vodafone', '075': 'Vodafone', '095': 'Vodafone', '099': 'Vodafone',
+    '067': 'Kyivstar', '068': 'Kyivstar', '077': 'Kyivstar', '096': 'Kyivstar', '097': 'Kyivstar',
+    '098': 'Kyivstar', '063': 'lifecell', '073': 'lifecell', '093': 'lifecell', '091': '3Mob', '094': 'Intertelecom',
+}
+SECTIONS = ('domains', 'operators', 'months', 'fields')
+
+
+def counts(postings, top=None):
+    """(value, number of contacts) pairs, the most common first."""
+    pairs = sorted(((value, len(keys)) for value, keys in postings.items()), key=lambda pair: (-pair[1], pair[0]))
+    return pairs[:top] if top else pairs
+
+
+def _share(count, total):
+    return f'{count:6} {count / total:6.1%}' if total else f'{count:6}'
+
+
+def report(index, sections=SECTIONS, top=TOP) -> str:
+    total = len(index)
+    lines = [f'Contacts: {total}']
+
+    if 'domains' in sections:
+        lines.append('By email domain:')
+        for domain, count in counts(index.domains, top):
+            lines.append(f'  {domain or "(no email)":30} {_share(count, total)}')
+
+    if 'operators' in sections:
+        lines.append('By operator (contacts with a phone of it):')
+        for code, count in counts(index.operators, top):
+            lines.append(f'  {code} {OPERATORS.get(code, "other"):26} {_share(count, total)}')
+
+    if 'months' in sections:
+        lines.append('By birthday month:')
+        for month in range(1, 13):
+            lines.append(f'  {MONTHS[month - 1]:30} {_share(len(index.months.get(month, ())), total)}')
+
+    if 'fields' in sections:
+        lines.append('Field completeness:')
+        for field in FIELDS:
+            lines.append(f'  {field:30} {_share(index.filled[field], total)}')
+
+    return '\n'.join(lines)
@@ -1,3 +1,4 @@
+import threading
 from pathlib import Path
 
 JPEG_IMAGES = []
@@ -22,29 +23,117 @@ REGISTER_EXTENSION = {
 FOLDERS = []
 EXTENSION = set()
 UNKNOWN = set()
+# the folders made by file_sort, they are not sorted again
+TARGET_FOLDERS = ('archives', 'ARCHIVES', 'video', 'audio', 'documents', 'images', 'MY_OTHER')
+
+# the scan of the last scan() call, the lists above are its files
+LAST_SCAN = []
 
 
 def get_extension(filename: str) -> str:
     return Path(filename).suffix[1:].upper()
 
 
-def scan(folder: Path) -> None:
-    for item in folder.iterdir():
-        if item.is_dir():
-            if item.name not in ('archives', 'video', 'audio', 'documents', 'images', 'MY_OTHER'):
-                FOLDERS.append(item)
-                scan(item)
-            continue
-
-        ext = get_extension(item.name)
-        fullname = folder / item.name
-        if not ext:
-            MY_OTHER.append(fullname)
-        else:
-            try:
-                container = REGISTER_EXTENSION[ext]
-                EXTENSION.add(ext)
-                container.append(fullname)
-            except KeyError:
-                UNKNOWN.add(ext)
-                MY_OTHER.append(fullname)
+class FolderScan:
+    """Files of one folder tree by extension. Several trees can be scanned and sorted at the same time, every
+    one has its own FolderScan.
+
+    Empty folders are removed as they get empty: the scan counts the entries of every folder it goes into and
+    removes the empty ones on its way back (post-order), entry_gone() takes one entry off when a file moves
+    out and removes the folder (and the parents that get empty with it) when it was the last one.
+    The scanned folder itself stays."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.files = {extension: [] for extension in REGISTER_EXTENSION}
+        self.other = []
+        self.folders = []
+        self.extensions = set()
+        self.unknown = set()
+        self.remaining = {}
+        # the files of one tree can be moved from several threads
+        self.lock = threading.Lock()
+        self._scan(root)
+
+    def _scan(self, folder: Path) -> bool:
+        # returns False when the folder was empty and is removed
+        entries = 0
+
+        for item in folder.iterdir():
+            entries += 1
+            if item.is_dir():
+                if item.name not in TARGET_FOLDERS:
+                    self.folders.append(item)
+                    if not self._scan(item):
+                        entries -= 1
+                continue
+
+            ext = get_extension(item.name)
+            fullname = folder / item.name
+            if not ext:
+                self.other.append(fullname)
+            elif ext in self.files:
+                self.extensions.add(ext)
+                self.files[ext].append(fullname)
+            else:
+                self.unknown.add(ext)
+                self.other.append(fullname)
+
+        if entries or folder == self.root:
+            self.remaining[folder] = entries
+            return True
+
+        return not _remove(folder)
+
+    def entry_gone(self, path: Path) -> None:
+        """Call after path has moved out of its folder (or was deleted)."""
+        with self.lock:
+            folder = path.parent
+
+            while folder in self.remaining and folder != self.root:
+                self.remaining[folder] -= 1
+                if self.remaining[folder]:
+                    return
+
+                del self.remaining[folder]
+                if not _remove(folder):
+                    return
+                folder = folder.parent
+
+
+def _remove(folder: Path) -> bool:
+    try:
+        folder.rmdir()
+    except OSError:
+        # something was put into it after the scan
+        print(f"Can't delete folder: {folder}")
+        return False
+    return True
+
+
+def reset() -> None:
+    for container in (*REGISTER_EXTENSION.values(), MY_OTHER, FOLDERS, LAST_SCAN):
+        container.clear()
+    EXTENSION.clear()
+    UNKNOWN.clear()
+
+
+def scan(folder: Path) -> FolderScan:
+    # one tree at a time: its files go to the lists of the module too
+    reset()
+    result = FolderScan(folder)
+    LAST_SCAN.append(result)
+
+    for extension, files in result.files.items():
+        REGISTER_EXTENSION[extension].extend(files)
+    MY_OTHER.extend(result.other)
+    FOLDERS.extend(result.folders)
+    EXTENSION.update(result.extensions)
+    UNKNOWN.update(result.unknown)
+    return result
+
+
+def entry_gone(path: Path) -> None:
+    """entry_gone() of the last scan()."""
+    if LAST_SCAN:
+        LAST_SCAN[0].entry_gone(path)
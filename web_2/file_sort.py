@@ -1,7 +1,9 @@
 from pathlib import Path
-import shutil
 import file_parser as parser
-import re
+import os
+from io_throttle import PER_THREAD_PRIORITY, Throttle, lower_priority, parse_rate
+import sys
+import threading
 
 CYRILLIC_SYMBOLS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяєіїґ'
 TRANSLATION = ("a", "b", "v", "g", "d", "e", "e", "j", "z", "i", "j", "k", "l", "m", "n", "o", "p", "r",
@@ -14,27 +16,88 @@ for c, l in zip(CYRILLIC_SYMBOLS, TRANSLATION):
     TRANS[ord(c.upper())] = l.upper()
 
 
+class NormalizeTable(dict):
+    """Table for str.translate that transliterates and replaces everything but letters, digits, '_' and '.'
+    with '_' in one pass. The characters that are not in TRANS are looked up once and remembered."""
+
+    def __missing__(self, code):
+        char = chr(code)
+        value = char if char.isalnum() or char in '_.' else '_'
+        self[code] = value
+        return value
+
+
+NORMALIZE = NormalizeTable(TRANS)
+
+
 def normalize(name: str) -> str:
-    normalized_name = name.translate(TRANS)
-    normalized_name = re.sub(r'\W^.', '_', normalized_name)
-    return normalized_name
+    return name.translate(NORMALIZE)
+
+
+class TargetNames:
+    """Names taken in every target folder. A folder is created and listed on its first file only, the names
+    of the files moved after that are checked against the set, with no stat per file. Two files with the
+    same normalized name get name, name_1, name_2..."""
+
+    def __init__(self):
+        self.folders = {}
+        self.lock = threading.Lock()
+
+    def claim(self, folder: Path, name: str) -> Path:
+        with self.lock:
+            names = self.folders.get(folder)
+            if names is None:
+                folder.mkdir(exist_ok=True, parents=True)
+                # casefolded, two names that differ in case only are the same file on Windows and macOS
+                names = self.folders[folder] = {entry.casefold() for entry in os.listdir(folder)}
+
+            stem, dot, suffix = name.rpartition('.') if '.' in name.lstrip('.') else (name, '', '')
+            candidate = name
+            number = 0
+            while candidate.casefold() in names:
+                number += 1
+                candidate = f'{stem}_{number}{dot}{suffix}'
+
+            names.add(candidate.casefold())
+            return folder / candidate
+
 
+# The handlers take their share of the limits of throttle before they touch the disk. A move is a rename
+# in the same folder tree, it costs one operation and no bytes.
+def handle_media(filename: Path, target_folder: Path, names: TargetNames = None, throttle: Throttle = None) -> None:
+    names = names or TargetNames()
+    if throttle:
+        throttle.spend(ops=1)
+    filename.replace(names.claim(target_folder, normalize(filename.name)))
 
-def handle_media(filename: Path, target_folder: Path) -> None:
-    target_folder.mkdir(exist_ok=True, parents=True)
-    filename.replace(target_folder / normalize(filename.name))
 
+def handle_other(filename: Path, target_folder: Path, names: TargetNames = None, throttle: Throttle = None) -> None:
+    names = names or TargetNames()
+    if throttle:
+        throttle.spend(ops=1)
+    filename.replace(names.claim(target_folder, normalize(filename.name)))
 
-def handle_other(filename: Path, target_folder: Path) -> None:
-    target_folder.mkdir(exist_ok=True, parents=True)
-    filename.replace(target_folder / normalize(filename.name))
 
+def archive_cost(filename: Path):
+    # the archive is read once and every member is written, the sizes are in the zip directory
+    import zipfile
 
-def handle_archive(filename: Path, target_folder: Path) -> None:
-    target_folder.mkdir(exist_ok=True, parents=True)
-    folder_for_file = target_folder / \
-        normalize(filename.name.replace(filename.suffix, ''))
+    try:
+        with zipfile.ZipFile(filename) as archive:
+            members = archive.infolist()
+    except (zipfile.BadZipFile, OSError):
+        return 1, 0
+    return 1 + len(members), filename.stat().st_size + sum(member.file_size for member in members)
+
+
+def handle_archive(filename: Path, target_folder: Path, names: TargetNames = None, throttle: Throttle = None) -> None:
+    names = names or TargetNames()
+    folder_for_file = names.claim(target_folder, normalize(filename.name.replace(filename.suffix, '')))
+    if throttle:
+        ops, size = archive_cost(filename)
+        throttle.spend(ops=ops, size=size)
     folder_for_file.mkdir(exist_ok=True, parents=True)
+    import shutil  # only the archives need it
     try:
         try:
             shutil.unpack_archive(filename, folder_for_file)
@@ -45,43 +108,168 @@ def handle_archive(filename: Path, target_folder: Path) -> None:
     filename.unlink()
 
 
-def handle_folder(folder: Path):
+# extension -> handler and the target folder in the sorted folder, the files without one go to MY_OTHER
+TARGETS = {
+    'JPEG': (handle_media, ('images', 'JPEG')),
+    'JPG': (handle_media, ('images', 'JPG')),
+    'PNG': (handle_media, ('images', 'PNG')),
+    'SVG': (handle_media, ('images', 'SVG')),
+    'MP3': (handle_media, ('audio',)),
+    'MP4': (handle_media, ('video',)),
+    'ZIP': (handle_archive, ('ARCHIVES',)),
+}
+OTHER_TARGET = ('MY_OTHER',)
+# limits for the sorts started from jason.py, the command line options override them
+BYTES_PER_SEC = os.environ.get('FILE_SORT_BYTES_PER_SEC', '')  # e.g. 20M
+OPS_PER_SEC = os.environ.get('FILE_SORT_OPS_PER_SEC', '')
+LOW_PRIORITY = os.environ.get('FILE_SORT_LOW_PRIORITY', '') == '1'
+# files moved by one task of the scheduler, a task per file would cost more than most moves
+BATCH = 64
+
+
+class DeviceScheduler:
+    """Runs the file operations of several folders at once. Every disk (st_dev) gets its own pool of
+    PER_DEVICE threads, so the folders on different disks are sorted in parallel and no disk has more than
+    PER_DEVICE operations in flight, however many folders are on it. With low_priority the threads of the
+    pools run with a lower CPU and I/O priority, the thread that started the sort keeps its own."""
+
+    PER_DEVICE = int(os.environ.get('FILE_SORT_IO_PER_DEVICE', '2'))
+
+    def __init__(self, per_device=None, low_priority=False):
+        # concurrent.futures pulls in a lot, the sorter imports it when it starts to sort only
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.executor = ThreadPoolExecutor
+        self.per_device = per_device or self.PER_DEVICE
+        self.initializer = lower_priority if low_priority else None
+        self.pools = {}
+
+    @staticmethod
+    def device_of(path: Path) -> int:
+        return os.stat(path).st_dev
+
+    def submit(self, device, function, *args):
+        pool = self.pools.get(device)
+        if pool is None:
+            pool = self.pools[device] = self.executor(self.per_device, thread_name_prefix=f'sort-dev-{device}',
+                                                      initializer=self.initializer)
+        return pool.submit(function, *args)
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+
+
+def sort_jobs(scan: parser.FolderScan):
+    """(handler, file, target folder) of every file of the scanned folder."""
+    for extension, files in scan.files.items():
+        handler, target = TARGETS[extension]
+        for file in files:
+            yield handler, file, scan.root.joinpath(*target)
+
+    for file in scan.other:
+        yield handle_media, file, scan.root.joinpath(*OTHER_TARGET)
+
+
+def run_batch(scan, batch, names, throttle=None) -> int:
+    # a thread of the pool does one operation at a time, the batch keeps the device within its limit
+    failed = 0
+    for handler, file, target_folder in batch:
+        try:
+            handler(file, target_folder, names, throttle)
+        except OSError as error:
+            print(f'Could not sort {file}: {error}')
+            failed += 1
+            continue
+        # the folder of the file goes as soon as it is empty
+        scan.entry_gone(file)
+    return failed
+
+
+def usable_roots(roots):
+    # every folder once, a folder inside another one is sorted with it
+    folders = []
+    for root in roots:
+        if not root.is_dir():
+            print(f'{root} is not a folder!')
+        elif root.resolve() not in folders:
+            folders.append(root.resolve())
+
+    return [folder for folder in folders if not any(other in folder.parents for other in folders)]
+
+
+def sort_roots(roots, per_device=None, throttle=None, low_priority=False) -> int:
+    """Sorts the folders at the same time, returns the number of files that could not be sorted. throttle
+    limits all of them together."""
+    from concurrent.futures import as_completed
+
+    roots = usable_roots(roots)
+    scheduler = DeviceScheduler(per_device, low_priority)
+    names = TargetNames()
+    batches = []
+
     try:
-        folder.rmdir()
-    except OSError:
-        print(f"Can't delete folder: {folder}")
+        devices = {root: scheduler.device_of(root) for root in roots}
+        scans = [scheduler.submit(devices[root], parser.FolderScan, root) for root in roots]
+
+        # the files of a folder are sorted as soon as its scan is done, the other scans go on meanwhile
+        for future in as_completed(scans):
+            try:
+                scan = future.result()
+            except OSError as error:
+                print(f'Could not scan {error.filename}: {error.strerror}')
+                continue
+            jobs = list(sort_jobs(scan))
+            for start in range(0, len(jobs), BATCH):
+                batches.append(scheduler.submit(devices[scan.root], run_batch, scan, jobs[start:start + BATCH], names,
+                                                throttle))
+
+        return sum(batch.result() for batch in batches)
+    finally:
+        scheduler.shutdown()
+
+
+def parse_arguments(argv):
+    # argparse is only needed to start the sorter, not to import it
+    import argparse
+
+    def rate(text):
+        # argparse names the function in its error message
+        return parse_rate(text)
+
+    arguments = argparse.ArgumentParser(description='Sorts the files of the folders by type.')
+    arguments.add_argument('folders', nargs='*', help='folders to sort at the same time, asked for when none')
+    arguments.add_argument('--bytes-per-sec', type=rate, default=parse_rate(BYTES_PER_SEC),
+                           help='limit of the bytes read and written per second, e.g. 20M')
+    arguments.add_argument('--ops-per-sec', type=rate, default=parse_rate(OPS_PER_SEC),
+                           help='limit of the file operations per second')
+    arguments.add_argument('--low-priority', action='store_true', default=LOW_PRIORITY,
+                           help='lower the CPU and I/O priority of the sorting threads (Linux)')
+    return arguments.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_arguments(argv or [])
+    throttle = Throttle(options.bytes_per_sec, options.ops_per_sec)
+    low_priority = options.low_priority and PER_THREAD_PRIORITY
+    if options.low_priority:
+        print('The sorting threads run with a lower CPU and I/O priority.' if low_priority else
+              'A lower priority for the sorting only is not supported here, sorting with the normal one.')
 
+    if options.folders:
+        sort_roots([Path(root) for root in options.folders], throttle=throttle, low_priority=low_priority)
+        return
 
-def main():
     while True:
         input_line = input(
-            'Please select your folder to sort. For exit, type "exit": ')
+            f'Please select your folder to sort (several folders: separate them with "{os.pathsep}"). '
+            f'For exit, type "exit": ')
         if input_line == "exit":
             break
-        folder = Path(input_line)
-        parser.scan(folder)
-        for file in parser.JPEG_IMAGES:
-            handle_media(file, folder / 'images' / 'JPEG')
-        for file in parser.JPG_IMAGES:
-            handle_media(file, folder / 'images' / 'JPG')
-        for file in parser.PNG_IMAGES:
-            handle_media(file, folder / 'images' / 'PNG')
-        for file in parser.SVG_IMAGES:
-            handle_media(file, folder / 'images' / 'SVG')
-        for file in parser.MP3_AUDIO:
-            handle_media(file, folder / 'audio')
-        for file in parser.MP4_VIDEO:
-            handle_media(file, folder / 'video')
-
-        for file in parser.MY_OTHER:
-            handle_media(file, folder / 'MY_OTHER')
-        for file in parser.ARCHIVES:
-            handle_archive(file, folder / 'ARCHIVES')
-
-        for folder in parser.FOLDERS[::-1]:
-            handle_folder(folder)
+        sort_roots([Path(folder) for folder in input_line.split(os.pathsep) if folder], throttle=throttle,
+                   low_priority=low_priority)
         print('The folder has been succesfully sorted')
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,165 @@
+import atexit
+import bisect
+import io
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+# Opt-in timing of the commands. Off by default, turned on with the JASON_STATS environment variable
+# (JASON_STATS=1 for the statistics, JASON_STATS=profile to run cProfile too) or the 'stats on' command.
+# The profile of a JASON_STATS=profile session is saved to JASON_PROFILE_FILE (session.prof) on exit.
+# JASON_TRACEMALLOC=<frames> starts tracemalloc before anything is loaded, for the 'memory' report.
+
+# the command that shows the statistics should not show up in them
+IGNORED_COMMANDS = {'stats'}
+
+# upper bounds of the latency histogram buckets, milliseconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, math.inf)
+
+
+class CommandStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * len(BUCKETS)
+        self.errors = Counter()
+
+    def add(self, elapsed_ms):
+        self.calls += 1
+        self.total += elapsed_ms
+        self.max = max(self.max, elapsed_ms)
+        self.histogram[bisect.bisect_left(BUCKETS, elapsed_ms)] += 1
+
+    def percentile(self, share):
+        # upper bound of the bucket the percentile falls into
+        rank = math.ceil(self.calls * share)
+        seen = 0
+        for bound, count in zip(BUCKETS, self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Instrumentation:
+
+    def __init__(self, profile=False):
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profiler = None
+
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    @contextmanager
+    def measure(self, command):
+        outer = getattr(self.local, 'command', None)
+        if outer is not None:
+            # a command that runs another one is measured as a whole
+            yield
+            return
+
+        self.local.command = command
+        profiling = self.profiler is not None and threading.current_thread() is threading.main_thread()
+        if profiling:
+            self.profiler.enable()
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if profiling:
+                self.profiler.disable()
+            self.local.command = None
+            with self.lock:
+                self.stats.setdefault(command, CommandStats()).add(elapsed_ms)
+
+    def note_error(self, error):
+        # the only errors outside of a measured command are the unknown commands
+        command = getattr(self.local, 'command', None) or '<unknown>'
+        with self.lock:
+            self.stats.setdefault(command, CommandStats()).errors[type(error).__name__] += 1
+
+    def report(self) -> str:
+        lines = [f'{"command":<16}{"calls":>7}{"errors":>8}{"mean ms":>10}{"p50 ms":>9}{"p95 ms":>9}{"max ms":>9}']
+
+        with self.lock:
+            for command, stats in sorted(self.stats.items(), key=lambda item: -item[1].total):
+                mean = stats.total / stats.calls if stats.calls else 0
+                lines.append(f'{command:<16}{stats.calls:>7}{sum(stats.errors.values()):>8}{mean:>10.2f}'
+                             f'{stats.percentile(0.5):>9.2f}{stats.percentile(0.95):>9.2f}{stats.max:>9.2f}')
+                for error, count in stats.errors.most_common():
+                    lines.append(f'    {error}: {count}')
+
+        return '\n'.join(lines)
+
+    def dump_profile(self, filename, limit=15) -> str:
+        if self.profiler is None:
+            return 'Profiling is off! Turn it on with "stats profile" or JASON_STATS=profile.'
+
+        import pstats
+
+        self.profiler.dump_stats(filename)
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+
+
+INSTRUMENTATION = None
+
+
+def enable(profile=False):
+    global INSTRUMENTATION
+    INSTRUMENTATION = Instrumentation(profile)
+    return INSTRUMENTATION
+
+
+def disable():
+    global INSTRUMENTATION
+    INSTRUMENTATION = None
+
+
+@contextmanager
+def measure(command):
+    instrumentation = INSTRUMENTATION
+    if instrumentation is None or command in IGNORED_COMMANDS:
+        yield
+        return
+
+    with instrumentation.measure(command):
+        yield
+
+
+def note_error(error):
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.note_error(error)
+
+
+def _report_session():
+    # the session started with JASON_STATS ends with the report on stderr and the profile in session.prof
+    if INSTRUMENTATION is None:
+        return
+    print(INSTRUMENTATION.report(), file=sys.stderr)
+    if INSTRUMENTATION.profiler is not None:
+        INSTRUMENTATION.profiler.dump_stats(os.environ.get('JASON_PROFILE_FILE', 'session.prof'))
+
+
+if os.environ.get('JASON_STATS'):
+    enable(profile=os.environ['JASON_STATS'] == 'profile')
+    atexit.register(_report_session)
+
+
+if os.environ.get('JASON_TRACEMALLOC'):
+    import tracemalloc
+    frames = os.environ['JASON_TRACEMALLOC']
+    tracemalloc.start(int(frames) if frames.isdigit() and int(frames) > 0 else 1)
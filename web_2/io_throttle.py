@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+
+
+# Limits for the disk work of file_sort, so a big sort can run next to other services.
+# Throttle holds two token buckets, bytes per second and operations per second, shared by all the threads of
+# the sort. A bucket holds one second of its rate. A take that is bigger than the tokens left puts the bucket
+# into debt and sleeps until it is paid off, the next take waits for the debt too, so the rate holds on
+# average even for the files bigger than the bucket.
+# lower_priority() makes a sorting thread nice for the CPU and puts it into the idle I/O class, the disk is
+# used only when nobody else needs it. Only Linux sets both per thread, elsewhere they would stay on the whole
+# process, with the address book and the notebook of jason.py, until it ends, so nothing is done there.
+
+NICE_INCREMENT = 10
+PER_THREAD_PRIORITY = sys.platform.startswith('linux')
+# ioprio_set(2) is not in the os module, it is called by its number
+IOPRIO_SET = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+class TokenBucket:
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - amount
+            self.updated = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class Throttle:
+
+    def __init__(self, bytes_per_sec=None, ops_per_sec=None):
+        self.bytes = TokenBucket(bytes_per_sec) if bytes_per_sec else None
+        self.ops = TokenBucket(ops_per_sec) if ops_per_sec else None
+
+    def __bool__(self):
+        return self.bytes is not None or self.ops is not None
+
+    def spend(self, ops=0, size=0):
+        """Blocks until the operations and bytes fit into the limits."""
+        if ops and self.ops is not None:
+            self.ops.take(ops)
+        if size and self.bytes is not None:
+            self.bytes.take(size)
+
+
+def parse_rate(text):
+    """'10M' -> 10485760.0, None or '' -> None."""
+    if not text:
+        return None
+    text = text.strip().upper().removesuffix('/S').removesuffix('B')
+    unit = text[-1:] if text[-1:] in UNITS else ''
+    try:
+        rate = float(text[:len(text) - len(unit)]) * UNITS[unit]
+    except ValueError:
+        raise ValueError(f'Not a rate: {text}, use a number with K, M or G, e.g. 20M')
+    if rate <= 0:
+        raise ValueError('A rate must be above zero')
+    return rate
+
+
+def lower_priority() -> list:
+    """Lowers the CPU and I/O priority of the calling thread, returns what was done. Meant as the initializer
+    of the worker threads, the priority goes with the thread when its pool is shut down."""
+    if not PER_THREAD_PRIORITY:
+        return []
+
+    # on Linux a thread id is a process id for setpriority and ioprio_set, the other threads are left as they are
+    thread = threading.get_native_id()
+    done = []
+
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread, os.getpriority(os.PRIO_PROCESS, thread) + NICE_INCREMENT)
+        done.append(f'nice +{NICE_INCREMENT}')
+    except OSError:
+        pass
+
+    number = IOPRIO_SET.get(os.uname().machine.lower())
+    if number is not None:
+        # ctypes is only needed here
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syscall(number, IOPRIO_WHO_PROCESS, thread, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0:
+            done.append('idle I/O class')
+
+    return done
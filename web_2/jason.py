@@ -1,5 +1,4 @@
-import address_book, note_book, file_sort
-
+# The subprograms are imported on the first use, so the launcher starts without loading all of them
 def main():
 
     while True:
@@ -12,10 +11,13 @@ def main():
             print('Use only specified numbers!')
 
         if  choice == 1:
+            import address_book
             address_book.main()
         elif choice == 2:
+            import note_book
             note_book.main()
         elif choice == 3:
+            import file_sort
             file_sort.main()
         elif choice == 4:
             exit()
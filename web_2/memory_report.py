@@ -0,0 +1,150 @@
+import sys
+import tracemalloc
+from collections import Counter
+
+
+# Memory report of the loaded address book or notebook: sys.getsizeof summed over the object graph of
+# every record (by field and by type) plus the top allocation sites from tracemalloc, when it is tracing.
+# Start tracing before the data is loaded (JASON_TRACEMALLOC=1) to see the cost of loading too.
+
+class SizeCounter:
+
+    def __init__(self, skip=()):
+        # objects counted once only, shared strings and numbers go to the first field that holds them
+        self.seen = {id(obj) for obj in skip}
+        self.by_type = Counter()
+        self.count_by_type = Counter()
+
+    def size(self, obj) -> int:
+        total = 0
+        stack = [obj]
+
+        while stack:
+            obj = stack.pop()
+            if id(obj) in self.seen:
+                continue
+            self.seen.add(id(obj))
+
+            size = sys.getsizeof(obj)
+            total += size
+            self.by_type[type(obj).__name__] += size
+            self.count_by_type[type(obj).__name__] += 1
+
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+
+            if hasattr(obj, '__dict__') and not isinstance(obj, type):
+                stack.append(vars(obj))
+
+        return total
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+def _table(title, sizes, items, counts=None):
+    lines = [title]
+    total = sum(sizes.values()) or 1
+    for name, size in sizes.most_common():
+        count = f'{counts[name]:>10}' if counts is not None else ''
+        per_item = f'{size / items:>10.0f} B/item' if items else ''
+        lines.append(f'    {name:<22}{count}{_format_size(size):>12}{size / total:>7.0%}{per_item}')
+    return lines
+
+
+def _record_fields(records, counter, skip_attrs):
+    by_field = Counter()
+
+    for record in records:
+        by_field[type(record).__name__] += sys.getsizeof(record) + sys.getsizeof(vars(record))
+        counter.seen.update((id(record), id(vars(record))))
+        for attr, value in vars(record).items():
+            if attr not in skip_attrs:
+                by_field[attr] += counter.size(value)
+
+    return by_field
+
+
+def address_book_report(adr_book) -> str:
+    # the snapshot goes first, the walk below allocates a lot on its own
+    traced = tracemalloc_lines()
+    counter = SizeCounter(skip=(adr_book,))
+    # only the records built so far, building the rest of an attached snapshot would change what is measured
+    records = adr_book.data.built()
+    by_field = _record_fields(records, counter, skip_attrs={'book'})
+    record_types = Counter(counter.by_type)
+    record_counts = Counter(counter.count_by_type)
+
+    structures = Counter()
+    structures['data dict'] = sys.getsizeof(adr_book.data)
+    structures['unbuilt rows'] = sum(counter.size(value) for value in dict.values(adr_book.data)
+                                     if type(value) is tuple)
+    structures['saved rows cache'] = counter.size(adr_book.serialized)
+    structures['fuzzy indexes'] = counter.size(adr_book.name_index) + counter.size(adr_book.address_index)
+    structures['dirty set'] = counter.size(adr_book.dirty)
+    if adr_book.sharded:
+        structures['shard members'] = counter.size(adr_book.members)
+
+    total = sum(by_field.values()) + sum(structures.values())
+    lines = [f'Address book: {len(adr_book.data)} records, {len(records)} built, {_format_size(total)}']
+    snapshot = adr_book.data.snapshot
+    if snapshot is not None:
+        # the mapped file is in the page cache, not on the heap, so it is not in the total
+        lines.append(f'Compact snapshot: {_format_size(len(snapshot.buffer))} mapped, '
+                     f'{len(adr_book.data) - len(records)} records not built yet')
+    lines += _table('By field:', by_field, len(records))
+    lines += _table('By type (records only):', record_types, len(records), record_counts)
+    lines += _table('Book structures:', structures, len(records))
+    return '\n'.join(lines + traced)
+
+
+def notebook_report(notebook) -> str:
+    traced = tracemalloc_lines()
+    counter = SizeCounter(skip=(notebook,))
+    notes = list(notebook.notes)
+    by_field = _record_fields(notes, counter, skip_attrs=())
+    note_types = Counter(counter.by_type)
+    note_counts = Counter(counter.count_by_type)
+
+    structures = Counter()
+    structures['notes list'] = sys.getsizeof(notebook.notes)
+    for attr, value in vars(notebook).items():
+        if attr != 'notes':
+            structures[attr] = counter.size(value)
+
+    total = sum(by_field.values()) + sum(structures.values())
+    lines = [f'Notebook: {len(notes)} notes, {_format_size(total)}']
+    lines += _table('By field:', by_field, len(notes))
+    lines += _table('By type (notes only):', note_types, len(notes), note_counts)
+    lines += _table('Notebook structures:', structures, len(notes))
+    return '\n'.join(lines + traced)
+
+
+def tracemalloc_lines(limit=10):
+    if not tracemalloc.is_tracing():
+        return ['tracemalloc is off, start it with "memory trace" or JASON_TRACEMALLOC=1 to see allocation sites.']
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f'Traced by tracemalloc: {_format_size(current)} now, {_format_size(peak)} at peak. Top lines:']
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ))
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f'    {frame.filename}:{frame.lineno}  {_format_size(stat.size)} in {stat.count} blocks')
+    return lines
+
+
+def start_tracing(frames=1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
@@ -0,0 +1,100 @@
+import zlib
+
+from note_ranking import tokenize
+
+
+# MinHash signatures and LSH buckets for the similar and near-duplicate notes.
+# A note is a set of shingles (pairs of neighbouring words, plus its tags). Its signature is computed with
+# one permutation hashing: every shingle hash goes to one of SIGNATURE_SIZE bins by its low bits and the
+# bin keeps the smallest of the rest, empty bins borrow the value of the next full one (densification).
+# The share of equal bins of two signatures estimates the Jaccard similarity of the shingle sets.
+# The signature is cut into BANDS bands, notes with an equal band share a bucket, so the candidates for
+# a note are the notes of its BANDS buckets and nothing else is compared.
+
+SIGNATURE_SIZE = 64
+BANDS = 32
+ROWS = SIGNATURE_SIZE // BANDS
+BIN_BITS = 6
+EMPTY = 1 << 32
+
+
+def shingles(text, tags=()):
+    words = tokenize(text)
+    pairs = {f'{first} {second}' for first, second in zip(words, words[1:])} if len(words) > 1 else set(words)
+    return pairs | {f'#{tag.casefold()}' for tag in tags}
+
+
+def signature(shingle_set):
+    """One permutation MinHash of the shingles, None for an empty set."""
+    if not shingle_set:
+        return None
+
+    bins = [EMPTY] * SIGNATURE_SIZE
+    for shingle in shingle_set:
+        # crc32 does not depend on the hash seed of the process, the signatures are the same in every run
+        value = (zlib.crc32(shingle.encode('utf-8')) * 0x9E3779B1) & 0xFFFFFFFF
+        number = value & (SIGNATURE_SIZE - 1)
+        value >>= BIN_BITS
+        if value < bins[number]:
+            bins[number] = value
+
+    for number in range(SIGNATURE_SIZE):
+        distance = 1
+        while bins[number] == EMPTY:
+            borrowed = bins[(number + distance) % SIGNATURE_SIZE]
+            if borrowed < EMPTY:
+                # the distance keeps the borrowed values of two notes equal only when their full bins match
+                bins[number] = EMPTY + borrowed * SIGNATURE_SIZE + distance
+            distance += 1
+
+    return tuple(bins)
+
+
+def similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_SIZE
+
+
+class MinHashLSH:
+
+    def __init__(self):
+        self.signatures = {}
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def bands(self, sig):
+        return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def add(self, key, sig):
+        self.remove(key)
+        if sig is None:
+            return
+        self.signatures[key] = sig
+        for band in self.bands(sig):
+            self.buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key):
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        for band in self.bands(sig):
+            keys = self.buckets[band]
+            keys.discard(key)
+            if not keys:
+                del self.buckets[band]
+
+    def query(self, sig, min_similarity=0.3, exclude=None):
+        """(similarity, key) pairs of the keys that share a bucket with sig, most similar first."""
+        if sig is None:
+            return []
+
+        candidates = set()
+        for band in self.bands(sig):
+            candidates.update(self.buckets.get(band, ()))
+        candidates.discard(exclude)
+
+        found = [(similarity(sig, self.signatures[key]), key) for key in candidates]
+        found = [item for item in found if item[0] >= min_similarity]
+        found.sort(key=lambda item: item[0], reverse=True)
+        return found
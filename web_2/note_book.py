@@ -1,8 +1,14 @@
 import json
 import os
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
+import re
 from abc import ABC, abstractmethod
+import instrumentation
+import note_query
+from note_ranking import BM25Index, tokenize
+from minhash import MinHashLSH, shingles, signature
+from note_storage import NoteLog, preview_of
+from regex_search import compile_pattern, required_literals
+from storage import SNAPSHOT_WRITER, atomic_write_json
 
 
 class Note:  # Клас Note представляє окрему нотатку з такими атрибутами:
@@ -10,10 +16,63 @@ class Note:  # Клас Note представляє окрему нотатку
     # content: Рядок, що містить вміст нотатки.
     # tags: Список рядків, які представляють теги, пов'язані з нотаткою.
 
-    def __init__(self, title, content, tags=[]):
+    # body: посилання на стиснений вміст у файлі поруч (BodyRef), тоді в пам'яті лише title, tags і preview.
+
+    def __init__(self, title, content, tags=[], body=None, preview=None):
         self.title = title
-        self.content = content
+        self.text = content
         self.tags = tags if tags is not None else []
+        self.body = body
+        self.stored_preview = preview
+        # нормалізовані поля (заголовок і теги у casefold, слова полів для фраз), скидаються при зміні
+        self.cache = {}
+
+    @property
+    def content(self):  # Вміст, що зберігається поза пам'яттю, читається з файлу при кожному зверненні.
+        return self.body.read() if self.body is not None else self.text
+
+    @content.setter
+    def content(self, value):
+        self.text = value
+        self.body = None
+        self.invalidate()
+
+    @property
+    def preview(self):  # Початок вмісту для списку нотаток.
+        return self.stored_preview if self.body is not None else preview_of(self.text)
+
+    @property
+    def folded_title(self):
+        if "title" not in self.cache:
+            self.cache["title"] = self.title.casefold()
+        return self.cache["title"]
+
+    @property
+    def folded_tags(self):
+        if "tags" not in self.cache:
+            self.cache["tags"] = frozenset(tag.casefold() for tag in self.tags)
+        return self.cache["tags"]
+
+    def words(self, field):  # Слова поля через пробіл, для вмісту поза пам'яттю не кешуються.
+        key = f"words {field}"
+        if key in self.cache:
+            return self.cache[key]
+        text = " ".join(self.tags) if field == "tags" else getattr(self, field)
+        words = " ".join(tokenize(text))
+        if field != "content" or self.body is None:
+            self.cache[key] = words
+        return words
+
+    def invalidate(self):  # Скидає нормалізовані поля після зміни вмісту чи тегів.
+        self.cache = {}
+
+    def store_body(self, body):  # Переносить вміст у файл (body) або назад у пам'ять (body=None).
+        if body is not None:
+            self.stored_preview = self.preview
+            self.body = body
+            self.text = None
+        elif self.body is not None:
+            self.content = self.content
 
     def __str__(self):
         return f"Title: {self.title}\nContent: {self.content}\nTags: {', '.join(self.tags)}"
@@ -37,13 +96,46 @@ class Notebook(
     # notes: Список об'єктів Note.
     # filename: Назва файлу, який використовується для зберігання нотаток у форматі JSON.
 
+    # скільки найкращих нотаток показує команда sort
+    RANK_TOP_K = 10
+    # схожість (оцінка Жаккара за MinHash) для команди similar і для попередження про майже дублікат
+    SIMILAR_MIN = 0.3
+    SIMILAR_TOP_K = 5
+    DUPLICATE_MIN = 0.8
+    # скільки процесів перевіряють нотатки в scan, None - за кількістю процесорів
+    SCAN_WORKERS = None
+    # json - весь файл переписується при збереженні, jsonl - у notes.jsonl дописуються лише зміни
+    STORAGE_FORMAT = os.environ.get("NOTEBOOK_FORMAT", "json")
+    # zlib або lzma - у форматі jsonl вміст нотаток стискається у окремий файл і не тримається в пам'яті
+    BODY_CODEC = os.environ.get("NOTEBOOK_BODIES") or None
+
     def __init__(self, filename="notes.json"):
         self.notes = []
         self.filename = filename
-
-        if not os.path.exists(self.filename):
-            with open(self.filename, "w") as file:
-                json.dump([], file)
+        # індекс BM25 будується при першому ранжуванні, далі оновлюється разом з нотатками
+        self.ranking = None
+        # кошики LSH з підписами MinHash, будуються при першому пошуку схожих нотаток
+        self.similarity = None
+        # зміни з останнього збереження для формату jsonl: змінені нотатки за заголовком і видалені заголовки
+        self.dirty = {}
+        self.deleted = []
+        self.log = None
+        # історія змін вмісту нотаток, читається з notes.history.json при першому зверненні
+        self.history = None
+
+        SNAPSHOT_WRITER.flush(self.filename)
+
+        if self.STORAGE_FORMAT == "jsonl":
+            self.log = NoteLog(os.path.splitext(filename)[0] + ".jsonl", self.BODY_CODEC)
+
+        if self.log is not None and not self.log.exists():
+            # перший запуск з форматом jsonl: нотатки з notes.json переносяться один раз
+            if os.path.exists(self.filename):
+                self.load_json()
+                print(f"Notes were converted to {self.log.filename}.")
+            self.log.rewrite(self.notes, Note.store_body)
+        elif not os.path.exists(self.filename) and self.log is None:
+            atomic_write_json(self.filename, [])
         else:
             self.load_notes()
 
@@ -54,34 +146,83 @@ class Notebook(
             raise InvalidFormatError("Invalid format. Tags <= 15")
 
         # Перевірка на однакові назви
-        title = note.title.casefold()
+        title = note.folded_title
         for existing_note in self.notes:
-            if existing_note.title.casefold() == title:
+            if existing_note.folded_title == title:
                 print("Note with the same title already exists.")
                 return
 
+        duplicates = self.similar_notes(note, self.DUPLICATE_MIN)
+        if duplicates:
+            titles = ", ".join(f"{other.title} ({score:.0%})" for score, other in duplicates)
+            print(f"Warning: the note is nearly the same as {titles}.")
+
         self.notes.append(note)
+        self.note_changed(note)
         print("Note added!")
 
     def search_notes(
-        self, keyword
-    ):  # Шукає нотатки, які містять вказане ключове слово в їхніх заголовках, вмісті або тегах.
-        """Пошук нотаток за ключовим словом."""
-        keyword = keyword.lower()
-        matching_notes = []
-        for note in self.notes:
-            if (
-                keyword in note.title.lower()
-                or keyword in note.content.lower()
-                or keyword in note.tags
-            ):
-                matching_notes.append(note)
-        return matching_notes
+        self, query
+    ):  # Шукає нотатки за запитом: слова, "фрази", tag:, title:, префікси foo*, AND / OR / NOT і дужки.
+        """Пошук нотаток за запитом, нотатки повертаються в порядку блокнота."""
+        index = self.search_index()
+        found = note_query.search(index, query, Note.words)
+        return sorted(found, key=index.order.get)
+
+    def scan_notes(
+        self, pattern, regex=False
+    ):  # Перевіряє кожну нотатку на підрядок чи регулярний вираз, великі блокноти - паралельно у кількох процесах.
+        # історія і повний перегляд потрібні рідко, їхні модулі імпортуються при першому використанні
+        import note_scan
+
+        numbers = note_scan.scan(self.notes, pattern, regex, self.SCAN_WORKERS)
+        return [self.notes[number] for number in numbers]
+
+    def regex_notes(self, pattern):  # Нотатки з полем, де є збіг з регулярним виразом, у порядку блокнота.
+        matches = compile_pattern(pattern).search
+        candidates = self.literal_candidates(required_literals(pattern))
+
+        if candidates is None:
+            # у виразі немає обов'язкового тексту для пошуку в індексі, перевіряються всі нотатки
+            return self.scan_notes(pattern, regex=True)
+
+        found = [
+            note for note in candidates
+            if matches(note.title) or matches(note.content) or any(matches(tag) for tag in note.tags)
+        ]
+        return sorted(found, key=self.search_index().order.get)
+
+    def literal_candidates(self, literals):  # Нотатки, у словах яких є всі обов'язкові частини виразу.
+        index = self.search_index()
+        pieces = []
+        for literal in literals:
+            for match in re.finditer(r"\w+", literal):
+                # слово всередині літералу - ціле слово нотатки, на краю - його початок, кінець або частина
+                starts, ends = match.start() > 0, match.end() < len(literal)
+                pieces.append((match.group(), starts, ends))
+        if not pieces:
+            return None
+
+        candidates = None
+        for piece, starts, ends in sorted(pieces, key=lambda item: -len(item[0])):
+            if starts and ends:
+                terms = [piece] if piece in index.postings else []
+            elif starts:
+                terms = index.with_prefix(piece)
+            else:
+                terms = [term for term in index.with_substring(piece) if not ends or term.endswith(piece)]
+            found = set()
+            for term in terms:
+                found.update(index.postings[term])
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                break
+        return candidates
 
     def find_note(self, title):  # Знаходить нотатку за її заголовком.
         title = title.casefold()
         for note in self.notes:
-            if note.title.casefold() == title:
+            if note.folded_title == title:
                 return note
         return None
 
@@ -103,14 +244,23 @@ class Notebook(
         except InvalidFormatError as error:
             print(error)
         else:
-            note.content = new_content
+            self.set_content(note, new_content)
             return True
 
     def delete_note(self, title):  #  Видаляє нотатку за заголовком.
         title = title.casefold()
         for note in self.notes.copy():
-            if note.title.casefold() == title.casefold():
+            if note.folded_title == title:
                 self.notes.remove(note)
+                if self.ranking is not None:
+                    self.ranking.remove(note)
+                if self.similarity is not None:
+                    self.similarity.remove(note)
+                self.dirty.pop(note.folded_title, None)
+                self.deleted.append(note.title)
+                # історія не читається з диска лише заради видалення, якщо її там немає
+                if self.has_history():
+                    self.revisions().drop(note.title)
                 return True
         return False
 
@@ -119,34 +269,139 @@ class Notebook(
     ):  # Сортує нотатки за тегами,розміщуючи нотатки з вказаними тегами спереду.
         tag = tag.casefold()
         filtered_notes = [
-            note for note in self.notes if tag in [t.casefold() for t in note.tags]
+            note for note in self.notes if tag in note.folded_tags
         ]
-        sorted_notes = sorted(filtered_notes, key=lambda x: x.title.lower())
+        sorted_notes = sorted(filtered_notes, key=lambda x: x.folded_title)
         return sorted_notes
 
+    def set_content(self, note, content):  # Змінює вміст нотатки, попередній залишається в історії.
+        self.revisions().record(note.title, note.content, content)
+        note.content = content
+        self.note_changed(note)
+
+    def history_filename(self):
+        return os.path.splitext(self.filename)[0] + ".history.json"
+
+    def has_history(self):  # Чи є історія змін: уже завантажена або збережена у файлі.
+        if self.history is not None:
+            return True
+        filename = self.history_filename()
+        SNAPSHOT_WRITER.flush(filename)
+        return os.path.exists(filename)
+
+    def revisions(self):  # Історія змін нотаток, завантажується при першому зверненні.
+        if self.history is None:
+            from note_history import HistoryStore
+
+            filename = self.history_filename()
+            SNAPSHOT_WRITER.flush(filename)
+            self.history = HistoryStore(filename)
+        return self.history
+
+    def restore_note(self, title, number):  # Повертає вміст нотатки до ревізії number, це теж нова ревізія.
+        note = self.find_note(title)
+        history = self.revisions().get(title)
+        if note is None or history is None:
+            return None
+        self.set_content(note, history.text(number))
+        return note
+
+    def note_changed(self, note):  # Запам'ятовує зміну нотатки для збереження і оновлює її в індексі.
+        note.invalidate()
+        self.dirty[note.folded_title] = note
+        self.reindex_note(note)
+
+    def reindex_note(self, note):  # Оновлює нотатку в індексі після зміни заголовка, вмісту чи тегів.
+        if self.ranking is not None:
+            self.ranking.add(note, title=note.title, content=note.content, tags=list(note.tags))
+        if self.similarity is not None:
+            self.similarity.add(note, self.note_signature(note))
+
+    @staticmethod
+    def note_signature(note):
+        return signature(shingles(f"{note.title} {note.content}", note.tags))
+
+    def similar_notes(self, note, min_similarity=None, top_k=None):  # Пари (схожість, нотатка) без порівняння з усіма.
+        if self.similarity is None:
+            self.similarity = MinHashLSH()
+            for other in self.notes:
+                self.similarity.add(other, self.note_signature(other))
+
+        found = self.similarity.query(
+            self.note_signature(note), min_similarity or self.SIMILAR_MIN, exclude=note
+        )
+        return found[:top_k] if top_k else found
+
+    def search_index(self):  # Індекс нотаток для ранжування і пошуку, будується при першому зверненні.
+        if self.ranking is None:
+            self.ranking = BM25Index()
+            for note in self.notes:
+                self.reindex_note(note)
+        return self.ranking
+
+    def rank_notes(self, query, top_k=None):  # Повертає до top_k пар (оцінка BM25, нотатка), найкращі першими.
+        if top_k is None:
+            top_k = self.RANK_TOP_K
+        return self.search_index().search(query, top_k)
+
     def list_notes(self):  # Перелічує всі нотатки у блокноті.
         if not self.notes:
             print("No notes available.")
         else:
             for i, note in enumerate(self.notes, start=1):
                 print(f"{i}. Title: {note.title}")
-                print(f"   Content: {note.content}")
+                print(f"   Content: {note.preview if note.body is not None else note.content}")
                 print(f"   Tags: {', '.join(note.tags)}")
 
-    def save_notes(self):  # Зберігає нотатки у JSON-файлі.
+    def save_notes(self):  # Зберігає нотатки у JSON-файлі у фоновому потоці (атомарно, через тимчасовий файл).
+        if self.history is not None and self.history.changed:
+            SNAPSHOT_WRITER.submit(self.history.filename, self.history.snapshot(), ensure_ascii=False)
+
+        if self.log is not None:
+            self.save_log()
+            return
+
         data = [
-            {"title": note.title, "content": note.content, "tags": note.tags}
+            {"title": note.title, "content": note.content, "tags": list(note.tags)}
             for note in self.notes
         ]
-        with open(self.filename, "w") as file:
-            json.dump(data, file)
-
-    def load_notes(self):  # Завантажує нотатки з JSON-файлу.
+        SNAPSHOT_WRITER.submit(self.filename, data)
+
+    def save_log(self):  # Дописує зміни в notes.jsonl, файл переписується, коли застарілих рядків забагато.
+        changed = list(self.dirty.values())
+        if self.log.should_compact(len(self.notes), len(self.deleted) + len(changed)):
+            self.log.rewrite(self.notes, Note.store_body)
+        elif self.deleted or changed:
+            self.log.append(self.deleted, changed, Note.store_body)
+        self.dirty = {}
+        self.deleted = []
+
+    def load_notes(self):  # Завантажує нотатки з файлу.
+        self.history = None
+        if self.log is None:
+            self.load_json()
+            return
+
+        self.notes = [
+            Note(record["title"], record.get("content"), record["tags"], record.get("body"), record.get("preview"))
+            for record in self.log.load()
+        ]
+        self.dirty = {}
+        self.deleted = []
+        self.ranking = None
+        self.similarity = None
+        if self.log.should_compact(len(self.notes)):
+            self.log.rewrite(self.notes, Note.store_body)
+
+    def load_json(self):  # Завантажує нотатки з JSON-файлу.
+        SNAPSHOT_WRITER.flush(self.filename)
         with open(self.filename, "r") as file:
             data = json.load(file)
             self.notes = [
                 Note(note["title"], note["content"], note["tags"]) for note in data
             ]
+        self.ranking = None
+        self.similarity = None
 
 
 # Команди, які підтримує бот.
@@ -158,171 +413,295 @@ commands = [
     "sort",
     "list",
     "search",
+    "scan",
+    "similar",
+    "history",
+    "restore",
     "load",
     "save",
+    "memory",
     "exit",
 ]
 
-# Створення автозавершення для команд.
-command_completer = WordCompleter(commands, ignore_case=True)
+# Автозавершення для команд створюється при першому запиті команди, prompt_toolkit довго імпортується.
+command_completer = None
 
 
 def get_command_from_user():
+    global command_completer
+    from prompt_toolkit import prompt
+
+    if command_completer is None:
+        from prompt_toolkit.completion import WordCompleter
+        command_completer = WordCompleter(commands, ignore_case=True)
+
     return prompt("Enter a command: ", completer=command_completer)
 
 
-def main():
-    filename = "notes.json"
-    notebook = Notebook(filename)
-    notebook.load_notes()
+# Обробники команд. Кожен отримує блокнот, True у відповідь означає завершення роботи.
+def handle_add(notebook):
+    # Додати нотатку.
+    try:
+        title = input("Enter Title: ")
+        if len(title) < 5:
+            raise InvalidFormatError(
+                "Invalid format. Title length should be >= 5."
+            )
+    except InvalidFormatError as error:
+        print(error)
+    else:
+        try:
+            content = input("Enter content: ")
+            if len(content) < 10:
+                raise InvalidFormatError(
+                    "Invalid format. Content length should be >= 10."
+                )
+        except InvalidFormatError as error:
+            print(error)
+        else:
+            tags = input("Enter Tags (comma-separated or space-separated): ")
+            tags = [tag.strip() for tag in tags.replace(",", " ").split()]
+            note = Note(title, content, tags)
+            notebook.add_note(note)
 
-    while True:
-        print("\nNotebook Menu:")  # Підтримувані команди.
-        print("add = Add Note(Додати нот)")
-        print("edit = Edit Note(Редагувати вміст)")
-        print("delete = Delete Note(Видалити)")
-        print("tag = Add Tag(Додати тег)")
-        print("sort = Sort Notes(Сортування)")
-        print("list = List Notes(Вивести список)")
-        print("search = Search Notes(Пошук)")
-        print("load = Load Notes(Завантаження)")
-        print("save = Save Notes(Зберігання)")
-        print("exit = Exit (and save)")
-        print("=" * 10)
 
-        user_input = get_command_from_user()
+def handle_edit(notebook):
+    # Редагувати нотатку.
+    title = input("Enter the title of the note to edit: ")
 
-        if user_input.casefold() == "add":
-            # Додати нотатку.
-            try:
-                title = input("Enter Title: ")
-                if len(title) < 5:
-                    raise InvalidFormatError(
-                        "Invalid format. Title length should be >= 5."
-                    )
-            except InvalidFormatError as error:
-                print(error)
-            else:
-                try:
-                    content = input("Enter content: ")
-                    if len(content) < 10:
-                        raise InvalidFormatError(
-                            "Invalid format. Content length should be >= 10."
-                        )
-                except InvalidFormatError as error:
-                    print(error)
-                else:
-                    tags = input("Enter Tags (comma-separated or space-separated): ")
-                    tags = [tag.strip() for tag in tags.replace(",", " ").split()]
-                    note = Note(title, content, tags)
-                    notebook.add_note(note)
-
-        elif user_input.casefold() == "edit":
-            # Редагувати нотатку.
-            title = input("Enter the title of the note to edit: ")
-
-            if notebook.edit_note(title):
-                print("Note edited!")
-
-        elif user_input.casefold() == "delete":
-            # Видалити нотатку.
-            title = input("Enter the title of the note to delete: ").strip()
-            if notebook.delete_note(title.casefold()):
-                print("Note deleted!")
-            else:
-                print("Note not found!")
+    if notebook.edit_note(title):
+        print("Note edited!")
 
-        elif user_input.casefold() == "tag":
-            # Додати тег до нотатки.
-            title = input("Enter the title of the note to add a tag: ")
-            note = notebook.find_note(title)
 
-            if note is None:
-                print("Note not found!")
+def handle_delete(notebook):
+    # Видалити нотатку.
+    title = input("Enter the title of the note to delete: ").strip()
+    if notebook.delete_note(title.casefold()):
+        print("Note deleted!")
+    else:
+        print("Note not found!")
 
-            else:
-                new_tags_input = input(
-                    "Enter the new tags (comma-separated or space-separated): "
-                )
-                new_tags = [
-                    tag.strip() for tag in new_tags_input.replace(",", " ").split()
-                ]
 
-                if not new_tags:
-                    print("Invalid format. Tags can't be empty.")
+def handle_tag(notebook):
+    # Додати тег до нотатки.
+    title = input("Enter the title of the note to add a tag: ")
+    note = notebook.find_note(title)
 
-                elif all(len(tag) < 20 for tag in new_tags):
-                    if any(tag.casefold() in note.tags for tag in new_tags):
-                        print("Some tags already exist for this note.")
-                    else:
-                        note.tags.extend(new_tags)
-                        print("Tags added!")
+    if note is None:
+        print("Note not found!")
 
-                else:
-                    print("Invalid format. Tags <= 20.")
+    else:
+        new_tags_input = input(
+            "Enter the new tags (comma-separated or space-separated): "
+        )
+        new_tags = [
+            tag.strip() for tag in new_tags_input.replace(",", " ").split()
+        ]
 
-        elif user_input.casefold() == "sort":
-            # Cортування нотаток.
-            keyword = input("Enter a keyword to sort notes by: ")
+        if not new_tags:
+            print("Invalid format. Tags can't be empty.")
 
-            notes_with_priority = []
+        elif all(len(tag) < 20 for tag in new_tags):
+            if any(tag.casefold() in note.folded_tags for tag in new_tags):
+                print("Some tags already exist for this note.")
+            else:
+                note.tags.extend(new_tags)
+                notebook.note_changed(note)
+                print("Tags added!")
 
-            for note in notebook.notes:
-                priority = 0
+        else:
+            print("Invalid format. Tags <= 20.")
 
-                if any(keyword in tag.lower() for tag in note.tags):
-                    priority += 3
 
-                if keyword in note.title.lower():
-                    priority += 2
+def handle_sort(notebook):
+    # Cортування нотаток за релевантністю (BM25), показуються лише ті, що містять слова запиту.
+    keyword = input("Enter a keyword to sort notes by: ")
+    ranked_notes = notebook.rank_notes(keyword)
 
-                if keyword in note.content.lower():
-                    priority += 1
+    if not ranked_notes:
+        print("No notes found.")
 
-                notes_with_priority.append((note, priority))
-            sorted_notes = sorted(notes_with_priority, key=lambda x: x[1], reverse=True)
+    for score, note in ranked_notes:
+        print(f"[{score:.2f}] {note}")
 
-            for note, _ in sorted_notes:
-                print(note)
 
-        elif user_input.casefold() == "list":
-            # Вивести список нотаток.
-            notebook.list_notes()
+def handle_list(notebook):
+    # Вивести список нотаток.
+    notebook.list_notes()
 
-        elif user_input.casefold() == "search":
-            # Пошук нотаток за ключовим словом.
-            keyword = input("Enter the keyword to search notes by: ")
-            matching_notes = notebook.search_notes(keyword)
-            if matching_notes:
-                print("Found notes:")
-                for note in matching_notes:
-                    print(note)
-            else:
-                print("No notes found.")
-
-        elif user_input.casefold() == "reset":
-            # Завантажити нотатки з файлу
-            # new_filename = input("Enter the filename for loading notes (e.g., notes.json): ")
-            new_filename = "notes.json"
-            notebook = Notebook(new_filename)
-            notebook.load_notes()
-            print("Notes loaded from the file as it was before the start.")
-
-        elif user_input.casefold() == "save":
-            # Зберегти нотатки у файл.
-            notebook.save_notes()
-            print("Notes saved to the file.")
-
-        elif user_input.casefold() == "exit":
-            # Вийти з програми.
-
-            notebook.save_notes()
-            print("Notes saved to the file.")
-            print("Bye...")
-            break
 
+def handle_search(notebook):
+    # Пошук нотаток за ключовим словом.
+    query = input('Enter the query to search notes by (words, "phrase", tag:, title:, foo*, AND / OR / NOT): ')
+    try:
+        matching_notes = notebook.search_notes(query)
+    except note_query.QuerySyntaxError as error:
+        print(error)
+        return
+    if matching_notes:
+        print("Found notes:")
+        for note in matching_notes:
+            print(note)
+    else:
+        print("No notes found.")
+
+
+def handle_scan(notebook):
+    # Перевірити всі нотатки на підрядок або на /регулярний вираз/ (його обов'язкові слова шукаються в індексі).
+    pattern = input("Enter the text or /regex/ to scan notes for: ")
+    regex = len(pattern) > 1 and pattern.startswith("/") and pattern.endswith("/")
+
+    try:
+        if regex:
+            matching_notes = notebook.regex_notes(pattern[1:-1])
         else:
-            print("I do not understand the command!")
+            matching_notes = notebook.scan_notes(pattern)
+    except re.error as error:
+        print(f"Invalid regex: {error}")
+        return
+
+    if matching_notes:
+        print("Found notes:")
+        for note in matching_notes:
+            print(note)
+    else:
+        print("No notes found.")
+
+
+def handle_similar(notebook):
+    # Показати нотатки, схожі на вказану.
+    title = input("Enter the title of the note to find similar notes for: ")
+    note = notebook.find_note(title)
+
+    if note is None:
+        print("Note not found!")
+        return
+
+    similar = notebook.similar_notes(note, top_k=notebook.SIMILAR_TOP_K)
+    if not similar:
+        print("No similar notes found.")
+    for score, other in similar:
+        print(f"[{score:.0%}] {other}")
+
+
+def handle_history(notebook):
+    # Показати ревізії вмісту нотатки.
+    title = input("Enter the title of the note to show the history of: ")
+    history = notebook.revisions().get(title)
+
+    if history is None:
+        print("The note has no history.")
+        return
+
+    for number, revision in enumerate(history.revisions):
+        text = history.text(number)
+        kind = "full" if "text" in revision else "delta"
+        print(f"{number}. {revision['time']} ({kind}, {len(text)} chars): {text[:60]}")
+
+
+def handle_restore(notebook):
+    # Повернути вміст нотатки до однієї з ревізій.
+    title = input("Enter the title of the note to restore: ")
+    number = input("Enter the revision number: ")
+
+    try:
+        note = notebook.restore_note(title, int(number))
+    except (ValueError, IndexError):
+        print("No such revision.")
+        return
+
+    if note is None:
+        print("The note has no history.")
+    else:
+        print(f"Note restored to revision {number}!")
+
+
+def handle_load(notebook):
+    # Завантажити нотатки з файлу такими, як вони були збережені востаннє.
+    notebook.load_notes()
+    print("Notes loaded from the file as it was before the start.")
+
+
+def handle_save(notebook):
+    # Зберегти нотатки у файл.
+    notebook.save_notes()
+    print("Notes saved to the file.")
+
+
+def handle_memory(notebook):
+    # Показати, скільки пам'яті займають нотатки (за полями і типами).
+    import memory_report
+
+    print(memory_report.notebook_report(notebook))
+
+
+def handle_exit(notebook):
+    # Вийти з програми.
+    notebook.save_notes()
+    print("Notes saved to the file.")
+    print("Bye...")
+    return True
+
+
+command_handlers = {
+    "add": handle_add,
+    "edit": handle_edit,
+    "delete": handle_delete,
+    "tag": handle_tag,
+    "sort": handle_sort,
+    "list": handle_list,
+    "search": handle_search,
+    "scan": handle_scan,
+    "similar": handle_similar,
+    "history": handle_history,
+    "restore": handle_restore,
+    "load": handle_load,
+    "reset": handle_load,
+    "save": handle_save,
+    "memory": handle_memory,
+    "exit": handle_exit,
+}
+
+
+def run_command(notebook, user_input):  # Виконує команду, повертає True, якщо треба завершити роботу.
+    command = user_input.strip().casefold()
+    handler = command_handlers.get(command)
+
+    if handler is None:
+        print("I do not understand the command!")
+        return False
+
+    with instrumentation.measure(f"notes {command}"):
+        return bool(handler(notebook))
+
+
+def main():
+    filename = "notes.json"
+    notebook = Notebook(filename)
+
+    while True:
+        print("\nNotebook Menu:")  # Підтримувані команди.
+        print("add = Add Note(Додати нот)")
+        print("edit = Edit Note(Редагувати вміст)")
+        print("delete = Delete Note(Видалити)")
+        print("tag = Add Tag(Додати тег)")
+        print("sort = Sort Notes(Сортування)")
+        print("list = List Notes(Вивести список)")
+        print("search = Search Notes(Пошук)")
+        print("scan = Scan Notes for text or /regex/(Перевірити всі нотатки)")
+        print("similar = Similar Notes(Схожі нотатки)")
+        print("history = Note History(Історія змін)")
+        print("restore = Restore Revision(Відновити ревізію)")
+        print("load = Load Notes(Завантаження)")
+        print("save = Save Notes(Зберігання)")
+        print("memory = Memory Report(Використання пам'яті)")
+        print("exit = Exit (and save)")
+        print("=" * 10)
+
+        user_input = get_command_from_user()
+
+        if run_command(notebook, user_input):
+            break
 
 
 if __name__ == "__main__":
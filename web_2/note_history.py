@@ -0,0 +1,140 @@
+import difflib
+import json
+import os
+import re
+from datetime import datetime
+
+
+# Revision history of the notes, kept in notes.history.json next to the notes.
+# A revision is either a keyframe (the full text) or a delta against the revision before it. A delta is a
+# list of operations on the previous text: a positive number copies that many characters, a negative one
+# skips them and a string is inserted, e.g. [12, -5, "new", 30]. The deltas are computed by difflib on words,
+# so an edit costs about its own size. A keyframe is written again once the deltas after the last one add up
+# to the size of the text or there are MAX_CHAIN of them, so a revision is rebuilt from at most MAX_CHAIN
+# deltas and the keyframes take no more space than the deltas before them.
+
+WORDS = re.compile(r'\s+|[^\s]+')
+
+
+def make_delta(old: str, new: str) -> list:
+    # an edit usually touches the middle of a note, the same start and end are copied without diffing
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+
+    old_words = WORDS.findall(old[start:len(old) - end])
+    new_words = WORDS.findall(new[start:len(new) - end])
+    matcher = difflib.SequenceMatcher(None, old_words, new_words)
+    delta = [start] if start else []
+
+    def put(operation):
+        # neighbours of the same kind are merged: two copies add up, two inserts join
+        if delta and type(delta[-1]) is type(operation) and (isinstance(operation, str) or
+                                                               (delta[-1] > 0) == (operation > 0)):
+            delta[-1] += operation
+        else:
+            delta.append(operation)
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        size = sum(map(len, old_words[i1:i2]))
+        if tag == 'equal':
+            put(size)
+            continue
+        if size:
+            put(-size)
+        if j2 > j1:
+            put(''.join(new_words[j1:j2]))
+
+    # the copy at the end is implied
+    if delta and not isinstance(delta[-1], str) and delta[-1] > 0:
+        delta.pop()
+    return delta
+
+
+def apply_delta(old: str, delta: list) -> str:
+    parts = []
+    position = 0
+    for operation in delta:
+        if isinstance(operation, str):
+            parts.append(operation)
+        elif operation > 0:
+            parts.append(old[position:position + operation])
+            position += operation
+        else:
+            position -= operation
+    parts.append(old[position:])
+    return ''.join(parts)
+
+
+class History:
+    MAX_CHAIN = 100
+
+    def __init__(self, revisions=None):
+        # every revision: {"time": ..., "text": ...} for a keyframe or {"time": ..., "delta": [...]}
+        self.revisions = revisions if revisions is not None else []
+
+    def __len__(self):
+        return len(self.revisions)
+
+    def last_keyframe(self, number):
+        while 'text' not in self.revisions[number]:
+            number -= 1
+        return number
+
+    def text(self, number) -> str:
+        """Text of the revision number, rebuilt from the keyframe before it."""
+        if not 0 <= number < len(self.revisions):
+            raise IndexError(number)
+        keyframe = self.last_keyframe(number)
+        text = self.revisions[keyframe]['text']
+        for revision in self.revisions[keyframe + 1:number + 1]:
+            text = apply_delta(text, revision['delta'])
+        return text
+
+    def record(self, old, new):
+        """Adds the revision new, old is the current text (the first revision if there is no history yet)."""
+        now = datetime.now().isoformat(timespec='seconds')
+        if not self.revisions:
+            self.revisions.append({'time': now, 'text': old})
+
+        delta = make_delta(old, new)
+        keyframe = self.last_keyframe(len(self.revisions) - 1)
+        chain = self.revisions[keyframe + 1:]
+        chain_size = sum(len(json.dumps(revision['delta'], ensure_ascii=False)) for revision in chain)
+
+        if len(chain) + 1 >= self.MAX_CHAIN or chain_size + len(json.dumps(delta, ensure_ascii=False)) >= len(new):
+            self.revisions.append({'time': now, 'text': new})
+        else:
+            self.revisions.append({'time': now, 'delta': delta})
+
+
+class HistoryStore:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.histories = {}
+        self.changed = False
+
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as reader:
+                self.histories = {title: History(revisions) for title, revisions in json.load(reader).items()}
+
+    def get(self, title):
+        return self.histories.get(title.casefold())
+
+    def record(self, title, old, new):
+        self.histories.setdefault(title.casefold(), History()).record(old, new)
+        self.changed = True
+
+    def drop(self, title):
+        if self.histories.pop(title.casefold(), None) is not None:
+            self.changed = True
+
+    def snapshot(self):
+        # a copy for the background writer, the lists of revisions only grow at the end
+        self.changed = False
+        return {title: list(history.revisions) for title, history in self.histories.items()}
@@ -0,0 +1,252 @@
+import re
+
+from note_ranking import tokenize
+
+
+# Query language of the notebook search, evaluated over the postings of the BM25 index of the notes:
+#
+#     milk cow               both words (AND is implied)
+#     milk OR cow            either word
+#     milk AND NOT cow       NOT excludes, AND / OR / NOT are written in capitals
+#     "sea cow"              the words next to each other
+#     tag:python title:plan  a word of the tags or of the title (content: works too)
+#     rev*                   any word starting with rev
+#     (milk OR cow) plan     parentheses group
+#
+# A query is parsed into a tree of nodes. AND evaluates its cheapest child first (the shortest posting
+# list) and only checks the keys found so far against the other children, so a query costs about as much
+# as its most selective term. A phrase is looked up as the AND of its words and verified on the text.
+
+FIELDS = {'tag': 'tags', 'tags': 'tags', 'title': 'title', 'content': 'content'}
+LEXEM = re.compile(r'\(|\)|(?:\w+:)?"[^"]*"?|[^\s()"]+')
+
+
+class QuerySyntaxError(Exception):
+    pass
+
+
+class Term:
+
+    def __init__(self, token, field=None):
+        self.token = token
+        self.field = field
+
+    def postings(self, index):
+        return index.postings.get(self.token, {})
+
+    def cost(self, index):
+        return len(self.postings(index))
+
+    def has(self, index, key, postings=None):
+        counts = (postings if postings is not None else self.postings(index)).get(key)
+        if counts is None:
+            return False
+        return self.field is None or counts[index.field_number(self.field)] > 0
+
+    def keys(self, index, words_of):
+        postings = self.postings(index)
+        if self.field is None:
+            return set(postings)
+        return {key for key in postings if self.has(index, key, postings)}
+
+    def filter(self, index, words_of, candidates):
+        postings = self.postings(index)
+        return {key for key in candidates if self.has(index, key, postings)}
+
+
+class Prefix:
+
+    def __init__(self, prefix, field=None):
+        self.prefix = prefix
+        self.field = field
+
+    def children(self, index):
+        return [Term(token, self.field) for token in index.with_prefix(self.prefix)]
+
+    def cost(self, index):
+        return sum(term.cost(index) for term in self.children(index))
+
+    def keys(self, index, words_of):
+        keys = set()
+        for term in self.children(index):
+            keys |= term.keys(index, words_of)
+        return keys
+
+    def filter(self, index, words_of, candidates):
+        terms = self.children(index)
+        if sum(term.cost(index) for term in terms) < len(candidates) * len(terms):
+            return candidates & self.keys(index, words_of)
+        return {key for key in candidates if any(term.has(index, key) for term in terms)}
+
+
+class Phrase:
+
+    def __init__(self, tokens, field=None):
+        self.tokens = tokens
+        self.field = field
+        self.words = And([Term(token, field) for token in tokens])
+
+    def cost(self, index):
+        return self.words.cost(index)
+
+    def verify(self, key, words_of):
+        phrase = f' {" ".join(self.tokens)} '
+        fields = [self.field] if self.field else ('title', 'content', 'tags')
+        return any(phrase in f' {words_of(key, field)} ' for field in fields)
+
+    def keys(self, index, words_of):
+        return {key for key in self.words.keys(index, words_of) if self.verify(key, words_of)}
+
+    def filter(self, index, words_of, candidates):
+        return {key for key in self.words.filter(index, words_of, candidates) if self.verify(key, words_of)}
+
+
+class Not:
+
+    def __init__(self, child):
+        self.child = child
+
+    def cost(self, index):
+        # everything but a few keys, the last thing to evaluate on its own
+        return len(index) - self.child.cost(index)
+
+    def keys(self, index, words_of):
+        return set(index.lengths) - self.child.keys(index, words_of)
+
+    def filter(self, index, words_of, candidates):
+        return candidates - self.child.filter(index, words_of, candidates)
+
+
+class And:
+
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, index):
+        return min(child.cost(index) for child in self.children)
+
+    def keys(self, index, words_of):
+        children = sorted(self.children, key=lambda child: child.cost(index))
+        keys = children[0].keys(index, words_of)
+        return self.narrow(index, words_of, keys, children[1:])
+
+    def filter(self, index, words_of, candidates):
+        children = sorted(self.children, key=lambda child: child.cost(index))
+        return self.narrow(index, words_of, candidates, children)
+
+    @staticmethod
+    def narrow(index, words_of, keys, children):
+        for child in children:
+            if not keys:
+                break
+            keys = child.filter(index, words_of, keys)
+        return keys
+
+
+class Or:
+
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, index):
+        return sum(child.cost(index) for child in self.children)
+
+    def keys(self, index, words_of):
+        keys = set()
+        for child in self.children:
+            keys |= child.keys(index, words_of)
+        return keys
+
+    def filter(self, index, words_of, candidates):
+        keys = set()
+        for child in self.children:
+            keys |= child.filter(index, words_of, candidates - keys)
+        return keys
+
+
+class Parser:
+
+    def __init__(self, query):
+        self.lexems = LEXEM.findall(query)
+        self.position = 0
+
+    def peek(self):
+        return self.lexems[self.position] if self.position < len(self.lexems) else None
+
+    def take(self):
+        lexem = self.peek()
+        self.position += 1
+        return lexem
+
+    def parse(self):
+        if not self.lexems:
+            raise QuerySyntaxError('The query is empty!')
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f'Unexpected "{self.peek()}"!')
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        lexem = self.take()
+
+        if lexem is None or lexem in ('AND', 'OR', ')'):
+            raise QuerySyntaxError(f'A word is missing before "{lexem or "the end"}"!')
+
+        if lexem == '(':
+            node = self.parse_or()
+            if self.take() != ')':
+                raise QuerySyntaxError('A closing parenthesis is missing!')
+            return node
+
+        field = None
+        name, colon, value = lexem.partition(':')
+        if colon and name.casefold() in FIELDS and value:
+            field, lexem = FIELDS[name.casefold()], value
+
+        if lexem.startswith('"'):
+            tokens = tokenize(lexem.strip('"'))
+            if not tokens:
+                raise QuerySyntaxError('The phrase is empty!')
+            return Phrase(tokens, field) if len(tokens) > 1 else Term(tokens[0], field)
+
+        prefix = lexem.endswith('*')
+        tokens = tokenize(lexem)
+        if not tokens:
+            raise QuerySyntaxError(f'"{lexem}" has no words to look for!')
+
+        if prefix:
+            words = [Term(token, field) for token in tokens[:-1]] + [Prefix(tokens[-1], field)]
+            return words[0] if len(words) == 1 else And(words)
+        # milk-fed is looked for as the phrase "milk fed"
+        return Term(tokens[0], field) if len(tokens) == 1 else Phrase(tokens, field)
+
+
+def parse(query):
+    return Parser(query).parse()
+
+
+def search(index, query, words_of):
+    """Keys of the documents that match the query, words_of(key, field) gives the tokens of a field joined
+    by spaces, the phrases are checked on it."""
+    return parse(query).keys(index, words_of)
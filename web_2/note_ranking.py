@@ -0,0 +1,142 @@
+import bisect
+import heapq
+import math
+import re
+
+
+# BM25 ranking used by the notebook to sort notes by relevance to a query.
+# Every note is a document with several fields (title, content, tags), the fields are scored together
+# (BM25F): the term frequency of each field is normalized by the field length against its average length,
+# weighted by the boost of the field and only then saturated with K1. The postings keep the per-field
+# frequencies, the field lengths and their totals are kept up to date on add/remove, so a query only
+# touches the notes that contain one of its terms.
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list:
+    return TOKEN.findall(str(text).casefold())
+
+
+class BM25Index:
+    K1 = 1.2
+    B = 0.75
+    # tags matter most, then the title (the order of the old priorities of the sort command)
+    FIELD_WEIGHTS = {'title': 2.0, 'content': 1.0, 'tags': 3.0}
+
+    def __init__(self, field_weights=None):
+        self.field_weights = dict(field_weights or self.FIELD_WEIGHTS)
+        self.fields = tuple(self.field_weights)
+        self.postings = {}
+        self.lengths = {}
+        self.terms = {}
+        self.order = {}
+        self.total_lengths = [0] * len(self.fields)
+        self.next_order = 0
+        # weight / length normalization of every field of every document, depends on the average lengths,
+        # so it is computed again by the first search after a change
+        self.field_factors = None
+        # sorted terms for the prefix lookups, sorted again after the set of terms changes
+        self.vocabulary = None
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __contains__(self, key):
+        return key in self.lengths
+
+    def add(self, key, **fields):
+        """Index the texts of the fields of a document, a text is a string or a list of strings (the tags).
+        A document that is added again keeps its place in the order."""
+        order = self.order.get(key)
+        self.remove(key)
+        frequencies = {}
+        lengths = []
+
+        for number, field in enumerate(self.fields):
+            text = fields.get(field, '')
+            tokens = [token for part in text for token in tokenize(part)] if isinstance(text, list) else tokenize(text)
+            lengths.append(len(tokens))
+            self.total_lengths[number] += len(tokens)
+            for token in tokens:
+                frequencies.setdefault(token, [0] * len(self.fields))[number] += 1
+
+        self.field_factors = None
+        self.lengths[key] = tuple(lengths)
+        self.terms[key] = tuple(frequencies)
+        if order is None:
+            order = self.next_order
+            self.next_order += 1
+        self.order[key] = order
+        for token, counts in frequencies.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                self.vocabulary = None
+            self.postings[token][key] = tuple(counts)
+
+    def remove(self, key):
+        lengths = self.lengths.pop(key, None)
+        if lengths is None:
+            return
+        del self.order[key]
+        self.field_factors = None
+        for number, length in enumerate(lengths):
+            self.total_lengths[number] -= length
+
+        for token in self.terms.pop(key):
+            documents = self.postings[token]
+            del documents[key]
+            if not documents:
+                del self.postings[token]
+                self.vocabulary = None
+
+    def field_number(self, field):
+        return self.fields.index(field)
+
+    def with_prefix(self, prefix):
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + '\U0010ffff')
+        return self.vocabulary[start:end]
+
+    def with_substring(self, text):
+        return [term for term in self.postings if text in term]
+
+    def idf(self, token):
+        count = len(self.postings.get(token, ()))
+        return math.log(1 + (len(self.lengths) - count + 0.5) / (count + 0.5))
+
+    def factors(self):
+        if self.field_factors is None:
+            documents = len(self.lengths) or 1
+            averages = [total / documents or 1 for total in self.total_lengths]
+            weights = [self.field_weights[field] for field in self.fields]
+            self.field_factors = {
+                key: tuple(weight / (1 - self.B + self.B * length / average)
+                           for weight, length, average in zip(weights, lengths, averages))
+                for key, lengths in self.lengths.items()
+            }
+        return self.field_factors
+
+    def search(self, query, top_k=10):
+        """Return up to top_k (score, key) pairs, best first. Only the documents with a query term score."""
+        terms = set(tokenize(query))
+        if not terms or top_k <= 0 or not self.lengths:
+            return []
+
+        factors = self.factors()
+        scores = {}
+
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for key, counts in postings.items():
+                frequency = sum(count * factor for count, factor in zip(counts, factors[key]))
+                scores[key] = scores.get(key, 0.0) + idf * frequency / (self.K1 + frequency)
+
+        # equal scores keep the order the documents were added in
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -self.order[item[0]]))
+        return [(score, key) for key, score in best]
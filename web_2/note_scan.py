@@ -0,0 +1,71 @@
+import os
+
+from note_storage import BodyStore
+from regex_search import compile_pattern
+
+
+# Full scan of the notes with a substring or a regular expression, for the searches the index can not
+# answer. The notes are split into chunks, every chunk is pickled once and checked in a process of a pool,
+# the numbers of the matching notes come back in order. A chunk of notes with out-of-core bodies carries
+# only the offsets, the worker reads and decompresses the bodies itself.
+
+# fewer notes than that are scanned in this process, starting the pool would cost more than the scan
+PARALLEL_MIN = 5000
+CHUNKS_PER_WORKER = 4
+
+
+def _matcher(pattern, regex):
+    if regex:
+        return compile_pattern(pattern).search
+    pattern = pattern.casefold()
+    return lambda text: pattern in text.casefold()
+
+
+def _scan_chunk(chunk):
+    start, rows, pattern, regex, bodies = chunk
+    matches = _matcher(pattern, regex)
+    store = BodyStore(*bodies) if bodies is not None else None
+    found = []
+
+    try:
+        for number, (title, content, tags, body) in enumerate(rows, start=start):
+            if content is None:
+                content = store.read(*body)
+            if matches(title) or matches(content) or any(matches(tag) for tag in tags):
+                found.append(number)
+    finally:
+        if store is not None:
+            store.close()
+
+    return found
+
+
+def note_row(note):
+    # the body stays on disk when it is there, the worker reads it
+    if note.body is not None:
+        return note.title, None, list(note.tags), (note.body.offset, note.body.length)
+    return note.title, note.content, list(note.tags), None
+
+
+def scan(notes, pattern, regex=False, workers=None):
+    """Numbers of the notes that contain pattern (or match the regular expression) in a field, in order."""
+    if regex:
+        compile_pattern(pattern)  # a bad pattern fails here and not in a worker
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    bodies = next(((note.body.store.filename, note.body.store.codec) for note in notes if note.body is not None),
+                  None)
+    rows = [note_row(note) for note in notes]
+
+    if workers < 2 or len(rows) < PARALLEL_MIN:
+        return _scan_chunk((0, rows, pattern, regex, bodies))
+
+    size = -(-len(rows) // (workers * CHUNKS_PER_WORKER))
+    chunks = [(start, rows[start:start + size], pattern, regex, bodies) for start in range(0, len(rows), size)]
+
+    # concurrent.futures pulls in multiprocessing, only the big notebooks need it
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as pool:
+        return [number for found in pool.map(_scan_chunk, chunks) for number in found]
@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import zlib
+
+from storage import atomic_write_stream
+
+
+# JSON Lines storage of the notebook (notes.jsonl). The first line is a header, every other line is a note
+# or a deletion ({"deleted": title}). A save appends the notes changed since the last one, the last line of
+# a title wins, so adding a note costs one line whatever the size of the notebook. The file is read line
+# by line and rewritten (compacted) once it holds more stale lines than notes.
+#
+# With a codec (zlib or lzma) the bodies are kept out of core: compressed one by one into a side file
+# (notes.<generation>.bodies) and addressed by offset, a line keeps the title, the tags and a preview.
+# A compaction writes the next generation of the side file before the lines that point into it, so a crash
+# leaves the old pair or the new one.
+
+FORMAT_VERSION = 1
+PREVIEW_LENGTH = 80
+
+
+def _lzma():
+    import lzma
+    return lzma
+
+
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lambda data: _lzma().compress(data), lambda data: _lzma().decompress(data)),
+}
+
+
+class NoteStorageError(Exception):
+    pass
+
+
+def preview_of(content):
+    return content if len(content) <= PREVIEW_LENGTH else content[:PREVIEW_LENGTH - 1] + '…'
+
+
+class BodyRef:
+
+    def __init__(self, store, offset, length):
+        self.store = store
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        return self.store.read(self.offset, self.length)
+
+
+class BodyStore:
+
+    def __init__(self, filename, codec):
+        if codec not in CODECS:
+            raise NoteStorageError(f'Unknown codec {codec}, use one of: {", ".join(CODECS)}')
+        self.filename = filename
+        self.codec = codec
+        self.compress, self.decompress = CODECS[codec]
+        self.reader = None
+        self.lock = threading.Lock()
+
+    def read_raw(self, offset, length):
+        with self.lock:
+            if self.reader is None:
+                self.reader = open(self.filename, 'rb')
+            self.reader.seek(offset)
+            return self.reader.read(length)
+
+    def read(self, offset, length):
+        return self.decompress(self.read_raw(offset, length)).decode('utf-8')
+
+    def write(self, blobs):
+        """Appends compressed blobs, returns a BodyRef for each of them."""
+        refs = []
+        with open(self.filename, 'ab') as writer:
+            offset = writer.tell()
+            for blob in blobs:
+                writer.write(blob)
+                refs.append(BodyRef(self, offset, len(blob)))
+                offset += len(blob)
+            writer.flush()
+            os.fsync(writer.fileno())
+        return refs
+
+    def blob_of(self, note):
+        # a body that is already in this file is copied as it is, without compressing it again
+        if note.body is not None and note.body.store.filename == self.filename:
+            return note.body.store.read_raw(note.body.offset, note.body.length)
+        return self.compress(note.content.encode('utf-8'))
+
+    def close(self):
+        with self.lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+
+class NoteLog:
+
+    def __init__(self, filename, codec=None):
+        self.filename = filename
+        self.codec = codec
+        self.folder = os.path.dirname(os.path.abspath(filename))
+        self.base = os.path.splitext(os.path.basename(filename))[0]
+        self.bodies = None
+        self.lines = 0
+        # the header does not match the codec asked for, the next save rewrites the file
+        self.needs_rewrite = False
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def load(self):
+        """Reads the file line by line, returns the latest record of every title in the order of the file."""
+        records = {}
+        self.lines = 0
+        truncated = False
+
+        with open(self.filename, encoding='utf-8') as reader:
+            header = self.read_header(reader.readline())
+
+            for number, line in enumerate(reader, start=2):
+                try:
+                    record = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    if not line.endswith('\n'):
+                        # the last append was cut short, the notes before it are fine
+                        print(f'The unfinished last line of {self.filename} was skipped.')
+                        truncated = True
+                        break
+                    raise NoteStorageError(f'{self.filename} is damaged at line {number}!')
+
+                self.lines += 1
+                if 'deleted' in record:
+                    records.pop(record['deleted'].casefold(), None)
+                    continue
+
+                title = record['title'].casefold()
+                # a title that comes again moves to the end like a note deleted and added again in memory
+                records.pop(title, None)
+                if 'body' in record:
+                    record['body'] = BodyRef(self.bodies, *record['body'])
+                records[title] = record
+
+        # an append after a cut line would glue to it, the file is written again first
+        self.needs_rewrite = truncated or header.get('codec') != self.codec
+        return list(records.values())
+
+    def read_header(self, line):
+        try:
+            header = json.loads(line)
+        except json.decoder.JSONDecodeError:
+            raise NoteStorageError(f'{self.filename} has no header!')
+        if header.get('version') != FORMAT_VERSION:
+            raise NoteStorageError(f'{self.filename} has an unknown format version {header.get("version")}!')
+
+        self.close()
+        if header.get('bodies'):
+            self.bodies = BodyStore(os.path.join(self.folder, header['bodies']), header['codec'])
+        return header
+
+    @staticmethod
+    def record_of(note, ref=None):
+        if ref is None:
+            return {'title': note.title, 'content': note.content, 'tags': list(note.tags)}
+        return {'title': note.title, 'tags': list(note.tags), 'preview': note.preview, 'body': [ref.offset, ref.length]}
+
+    def write_records(self, writer, deleted, notes, refs):
+        for title in deleted:
+            writer.write(json.dumps({'deleted': title}, ensure_ascii=False) + '\n')
+        for note, ref in zip(notes, refs):
+            writer.write(json.dumps(self.record_of(note, ref), ensure_ascii=False) + '\n')
+        self.lines += len(deleted) + len(notes)
+
+    def append(self, deleted, notes, attach):
+        """Appends the deleted titles and the changed notes, attach(note, ref) gets the new body of a note."""
+        refs = [None] * len(notes)
+        if self.bodies is not None:
+            refs = self.bodies.write([self.bodies.blob_of(note) for note in notes])
+
+        with open(self.filename, 'a', encoding='utf-8') as writer:
+            self.write_records(writer, deleted, notes, refs)
+            writer.flush()
+            os.fsync(writer.fileno())
+
+        for note, ref in zip(notes, refs):
+            attach(note, ref)
+
+    def should_compact(self, note_count, pending=0):
+        return self.needs_rewrite or self.lines + pending > 2 * max(note_count, 1)
+
+    def rewrite(self, notes, attach):
+        """Writes all the notes to a fresh file (and side file), attach(note, ref) gets the new body of a note."""
+        old_bodies = self.bodies
+        header = {'version': FORMAT_VERSION, 'codec': self.codec, 'bodies': None}
+        refs = [None] * len(notes)
+        bodies = None
+
+        if self.codec is not None:
+            generation = 1
+            while os.path.exists(os.path.join(self.folder, f'{self.base}.{generation}.bodies')):
+                generation += 1
+            header['bodies'] = f'{self.base}.{generation}.bodies'
+            bodies = BodyStore(os.path.join(self.folder, header['bodies']), self.codec)
+            same_codec = old_bodies is not None and old_bodies.codec == self.codec
+            refs = bodies.write([(old_bodies if same_codec else bodies).blob_of(note) for note in notes])
+
+        def write(writer):
+            writer.write(json.dumps(header) + '\n')
+            self.write_records(writer, [], notes, refs)
+
+        self.lines = 0
+        atomic_write_stream(self.filename, write, encoding='utf-8')
+        self.bodies = bodies
+        self.needs_rewrite = False
+
+        # the notes still read their bodies from the old side file until they get the new ones
+        for note, ref in zip(notes, refs):
+            attach(note, ref)
+
+        if old_bodies is not None:
+            old_bodies.close()
+            try:
+                os.remove(old_bodies.filename)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self.bodies is not None:
+            self.bodies.close()
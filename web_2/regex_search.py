@@ -0,0 +1,123 @@
+import re
+from functools import lru_cache
+
+
+# Regular expression search of the notes and the contacts. A pattern is compiled once and kept in an LRU
+# cache. Before the full regex runs, the literals every match must contain ("revenge" in r"rev(enge)?\s+revenge")
+# are taken out of the pattern and looked up in an index, so the regex only runs on the candidates.
+
+PATTERN_CACHE_SIZE = 64
+QUANTIFIERS = '*?+{'
+# hex digits after \x, \u and \U
+HEX_DIGITS = {'x': 2, 'u': 4, 'U': 8}
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern):
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _skip_class(pattern, i):
+    # i is at '[', returns the position after the closing ']'
+    i += 1
+    if i < len(pattern) and pattern[i] == '^':
+        i += 1
+    if i < len(pattern) and pattern[i] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 2 if pattern[i] == '\\' else 1
+    return i + 1
+
+
+def _skip_group(pattern, i):
+    # i is at '(', returns the position after the matching ')'
+    depth = 0
+    while i < len(pattern):
+        if pattern[i] == '\\':
+            i += 2
+            continue
+        if pattern[i] == '[':
+            i = _skip_class(pattern, i)
+            continue
+        if pattern[i] == '(':
+            depth += 1
+        elif pattern[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _skip_quantifier(pattern, i):
+    if i < len(pattern) and pattern[i] in QUANTIFIERS:
+        i = pattern.index('}', i) + 1 if pattern[i] == '{' and '}' in pattern[i:] else i + 1
+        if i < len(pattern) and pattern[i] in '?+':
+            i += 1
+    return i
+
+
+def _skip_escape(pattern, i):
+    # i is at '\\', returns the position after the whole escape: \x41, \u0410, \U0001f600, \N{...}, an octal
+    # escape (\0, \012, \141) or a group reference (\1, \12) take more than the next character
+    kind = pattern[i + 1:i + 2]
+    if kind in HEX_DIGITS:
+        return i + 2 + HEX_DIGITS[kind]
+    if kind == 'N' and pattern[i + 2:i + 3] == '{' and '}' in pattern[i:]:
+        return pattern.index('}', i) + 1
+    if kind.isdigit():
+        octal = re.match(r'0[0-7]{0,2}|[0-7]{3}', pattern[i + 1:])
+        return i + 1 + (octal.end() if octal else re.match(r'\d{1,2}', pattern[i + 1:]).end())
+    return i + 2
+
+
+def required_literals(pattern) -> list:
+    """Casefolded strings that every match of the pattern contains. The extraction is conservative: groups,
+    classes and escapes end a literal, an alternation outside of a group means there is none."""
+    if re.search(r'\(\?[a-zA-Z]*x', pattern):
+        # whitespace and comments do not count in the verbose mode
+        return []
+
+    literals = []
+    current = []
+
+    def end_run():
+        if current:
+            literals.append(''.join(current))
+            current.clear()
+
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if escaped and not escaped.isalnum():
+                current.append(escaped)
+                i += 2
+                continue
+            end_run()
+            i = _skip_quantifier(pattern, _skip_escape(pattern, i))
+        elif char in '.^$':
+            end_run()
+            i = _skip_quantifier(pattern, i + 1)
+        elif char == '[':
+            end_run()
+            i = _skip_quantifier(pattern, _skip_class(pattern, i))
+        elif char == '(':
+            end_run()
+            i = _skip_quantifier(pattern, _skip_group(pattern, i))
+        elif char == '|':
+            return []
+        elif char in QUANTIFIERS:
+            # an optional character is not required, a repeated one is but the run ends with it
+            if char != '+' and current and not (char == '{' and re.match(r'\{[1-9]', pattern[i:])):
+                current.pop()
+            end_run()
+            i = _skip_quantifier(pattern, i)
+        else:
+            current.append(char)
+            i += 1
+
+    end_run()
+    return [literal.casefold() for literal in literals]
@@ -0,0 +1,112 @@
+import bisect
+from datetime import date, datetime, timedelta, timezone
+
+
+# Birthday reminders of the address book. The calendar keeps the birthdays of the next HORIZON days sorted
+# by date, so a digest of any window is two bisections and the events in it. It is built again when the
+# day changes and updated in place when a birthday is set or a contact deleted.
+# A Feb 29 birthday is celebrated on Feb 28 in the years without Feb 29.
+
+HORIZON = 366
+
+
+def birthday_in(born: date, year: int) -> date:
+    try:
+        return born.replace(year=year)
+    except ValueError:
+        return date(year, 2, 28)
+
+
+def next_birthday(born: date, today: date) -> date:
+    birthday = birthday_in(born, today.year)
+    if birthday < today:
+        birthday = birthday_in(born, today.year + 1)
+    return birthday
+
+
+def days_to_birthday(born: date, today: date = None) -> int:
+    today = today or date.today()
+    return (next_birthday(born, today) - today).days
+
+
+class BirthdayCalendar:
+
+    def __init__(self, horizon=HORIZON):
+        self.horizon = horizon
+        self.today = None
+        # (date, name) of every birthday in the next horizon days, sorted, and the date of every name
+        self.events = []
+        self.dates = {}
+
+    def rebuild(self, birthdays, today=None):
+        """birthdays: (name, date of birth) pairs."""
+        self.today = today or date.today()
+        self.dates = {}
+        for name, born in birthdays:
+            birthday = next_birthday(born, self.today)
+            if (birthday - self.today).days < self.horizon:
+                self.dates[name] = birthday
+        self.events = sorted((birthday, name) for name, birthday in self.dates.items())
+
+    def is_stale(self, today=None):
+        return self.today != (today or date.today())
+
+    def update(self, name, born):
+        """Sets the date of birth of name, None removes it."""
+        old = self.dates.pop(name, None)
+        if old is not None:
+            del self.events[bisect.bisect_left(self.events, (old, name))]
+
+        if born is None:
+            return
+        birthday = next_birthday(born, self.today)
+        if (birthday - self.today).days < self.horizon:
+            self.dates[name] = birthday
+            bisect.insort(self.events, (birthday, name))
+
+    def upcoming(self, days):
+        """(date, name) of the birthdays from today to today + days, both included."""
+        # every birthday comes within a year, a longer window has the same ones
+        days = min(days, self.horizon - 1)
+        end = bisect.bisect_right(self.events, (self.today + timedelta(days=days), '\U0010ffff'))
+        return self.events[:end]
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def to_icalendar(events, ages=None) -> str:
+    """iCalendar (RFC 5545) text with an all-day event for every (date, name), ages maps a name to the age."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//jason//address book birthdays//EN', 'CALSCALE:GREGORIAN']
+
+    for day, name in events:
+        age = (ages or {}).get(name)
+        summary = f'{name}\'s birthday' + (f' ({age})' if age else '')
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:{day.strftime("%Y%m%d")}-{_escape(name).replace(" ", "-")}@jason',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART;VALUE=DATE:{day.strftime("%Y%m%d")}',
+            f'DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime("%Y%m%d")}',
+            f'SUMMARY:{_escape(summary)}',
+            'TRANSP:TRANSPARENT',
+            'END:VEVENT',
+        ]
+
+    lines.append('END:VCALENDAR')
+    return ''.join(_fold(line) for line in lines)
+
+
+def _fold(line):
+    # a line is at most 75 octets, the rest goes on the next lines after a space
+    parts = []
+    current = ''
+    for char in line:
+        if len((current + char).encode('utf-8')) > (75 if not parts else 74):
+            parts.append(current)
+            current = ''
+        current += char
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
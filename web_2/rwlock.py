@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Many readers or one writer. Writers have priority: new readers wait while a writer is waiting.
+    Both sides are reentrant for the same thread, and the writer may also take the read lock."""
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writers_waiting = 0
+        self.writer = None
+        self.writer_depth = 0
+        self.local = threading.local()
+
+    def _read_depth(self):
+        return getattr(self.local, 'depth', 0)
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        depth = self._read_depth()
+
+        with self.condition:
+            # a thread that already reads must not wait for a writer that waits for it
+            if self.writer != me and not depth:
+                self.condition.wait_for(lambda: self.writer is None and not self.writers_waiting)
+            self.readers += 1
+
+        self.local.depth = depth + 1
+
+    def release_read(self):
+        self.local.depth = self._read_depth() - 1
+
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+
+        with self.condition:
+            if self.writer == me:
+                self.writer_depth += 1
+                return
+
+            if self._read_depth():
+                raise RuntimeError('Cannot upgrade a read lock to a write lock')
+
+            self.writers_waiting += 1
+            try:
+                self.condition.wait_for(lambda: self.writer is None and not self.readers)
+            finally:
+                self.writers_waiting -= 1
+
+            self.writer = me
+            self.writer_depth = 1
+
+    def release_write(self):
+        with self.condition:
+            self.writer_depth -= 1
+            if not self.writer_depth:
+                self.writer = None
+                self.condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
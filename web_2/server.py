@@ -0,0 +1,189 @@
+"""Service mode: keeps the address book and the notebook in memory and serves them over a local socket.
+
+Protocol: one JSON object per line in both directions.
+    request:  {"book": "contacts" | "notes", "command": "add Bill 0501112233", "input": ["answer", ...]}
+    response: {"ok": true, "output": "...", "finished": false}
+              {"ok": false, "need_input": "Please set the address: "}  - send the request again with one
+                                                                           more answer in "input"
+              {"ok": false, "error": "..."}
+
+Start with `python server.py` (localhost:8765) or `python server.py --unix /tmp/jason.sock`,
+talk to it with client.py.
+"""
+import argparse
+import asyncio
+import builtins
+import contextlib
+import io
+import json
+import signal
+import sys
+import threading
+
+import address_book
+import note_book
+from storage import SNAPSHOT_WRITER
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# these would end the whole session of the server for everybody, or throw away the notes of the other clients
+REFUSED_COMMANDS = {'contacts': {'not save'}, 'notes': {'load', 'reset'}}
+
+
+class NeedInput(Exception):
+
+    def __init__(self, prompt):
+        super().__init__(prompt)
+        self.prompt = prompt
+
+
+# output and answers of the command that runs in the current worker thread
+command_io = threading.local()
+
+
+class CommandStdout:
+    """sys.stdout of the service. The commands run in several threads at once, every one of them prints to its
+    own buffer, the other threads print to the real stdout."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def target(self):
+        return getattr(command_io, 'output', None) or self.stream
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def command_input(prompt=''):
+    # input() of the handlers: the next answer of the request, or ask the client for one more
+    answers = getattr(command_io, 'answers', None)
+    if not answers:
+        raise NeedInput(prompt)
+    return answers.pop(0)
+
+
+class Service:
+
+    def __init__(self):
+        self.adr_book = address_book.AddressBook()
+        self.adr_book.autosave.start()
+        self.notebook = note_book.Notebook('notes.json')
+        # the address book has its own reader/writer lock, the notebook commands run one at a time
+        self.notes_lock = threading.Lock()
+
+    def execute(self, request: dict) -> dict:
+        book = request.get('book', 'contacts')
+        command = str(request.get('command', '')).strip()
+        answers = [str(answer) for answer in request.get('input', [])]
+
+        if book == 'contacts':
+            run, target = address_book.run_command, self.adr_book
+            name = ' '.join(address_book.deconstruct_command(command)[:1]).casefold()
+        elif book == 'notes':
+            run, target = note_book.run_command, self.notebook
+            name = command.casefold()
+        else:
+            return {'ok': False, 'error': f'Unknown book {book}!'}
+
+        if not command:
+            return {'ok': False, 'error': 'Empty command!'}
+        if name in REFUSED_COMMANDS[book]:
+            return {'ok': False, 'error': f'{name} is not available in the service mode!'}
+
+        # The handlers print their results and ask questions with input(). The commands run in the worker
+        # threads of the event loop, serve() has put in a stdout and an input() that use the ones of the thread.
+        output = io.StringIO()
+        command_io.output, command_io.answers = output, answers
+
+        try:
+            with self.notes_lock if book == 'notes' else contextlib.nullcontext():
+                finished = run(target, command)
+        except NeedInput as error:
+            return {'ok': False, 'need_input': error.prompt}
+        finally:
+            command_io.output = command_io.answers = None
+
+        if finished and book == 'contacts':
+            # close / good bye saved the book, but the service goes on
+            self.adr_book.autosave.start()
+
+        return {'ok': True, 'output': output.getvalue(), 'finished': finished}
+
+    def close(self):
+        self.adr_book.close_record_data()
+        self.notebook.save_notes()
+        SNAPSHOT_WRITER.flush()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('request must be a JSON object')
+                except ValueError as error:
+                    response = {'ok': False, 'error': f'Bad request: {error}'}
+                else:
+                    # a slow command (a big regex or a save) must not stop the other clients
+                    response = await asyncio.get_running_loop().run_in_executor(None, self.execute, request)
+
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle_client, path=unix_path)
+        print(f'Serving on {unix_path}')
+    else:
+        server = await asyncio.start_server(service.handle_client, host, port)
+        print(f'Serving on {host}:{port}')
+
+    # SIGTERM (docker stop) and SIGINT end the service with a save
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(signal_number, stop.set)
+
+    original_stdout, original_input = sys.stdout, builtins.input
+    sys.stdout, builtins.input = CommandStdout(sys.stdout), command_input
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        sys.stdout, builtins.input = original_stdout, original_input
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the address book and the notebook over a local socket.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    args = parser.parse_args()
+
+    service = Service()
+
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        print('Saved. Bye!')
+
+
+if __name__ == '__main__':
+    main()
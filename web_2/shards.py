@@ -0,0 +1,73 @@
+import json
+import os
+import zlib
+
+from compact_snapshot import CompactSnapshot, SnapshotFormatError
+
+
+# Storage layout helpers of the address book. A sharded book lives in a folder with one file per shard
+# (shard-000.json or shard-000.abk ...) and manifest.json, a record goes to the shard picked by the crc32
+# of its name, so the shard of a name does not depend on the Python hash seed.
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def shard_of(name: str, shard_count: int) -> int:
+    return zlib.crc32(name.encode('utf-8')) % shard_count
+
+
+def shard_file(folder, index, extension, autosave=False):
+    return os.path.join(folder, f'shard-{index:03d}{".autosave" if autosave else ""}{extension}')
+
+
+def read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST)) as reader:
+            manifest = json.load(reader)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def make_manifest(shard_count, snapshot_format, counts):
+    return {'version': MANIFEST_VERSION, 'shards': shard_count, 'format': snapshot_format, 'counts': counts}
+
+
+def read_snapshot_rows(filename):
+    # rows of a save file: dicts for JSON, (name, phones, birthday, email, address) tuples for .abk
+    if filename.endswith('.abk'):
+        with CompactSnapshot(filename) as snapshot:
+            return list(snapshot)
+
+    with open(filename) as reader:
+        is_empty = not reader.read(1)
+        reader.seek(0)
+        return [] if is_empty else json.load(reader)
+
+
+def _read_shard(filename):
+    try:
+        return read_snapshot_rows(filename), None
+    except FileNotFoundError:
+        return [], None
+    except (json.decoder.JSONDecodeError, SnapshotFormatError) as error:
+        return None, str(error)
+
+
+def read_shards(filenames, workers=None):
+    """Returns a (rows, error) pair for every file, the files are parsed in parallel in a process pool."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if len(filenames) < 2 or workers < 2:
+        return [_read_shard(filename) for filename in filenames]
+
+    # concurrent.futures pulls in multiprocessing, only the sharded books with several CPUs need it
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_read_shard, filenames))
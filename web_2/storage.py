@@ -0,0 +1,197 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+
+# Atomic file writes: the data goes to a temporary file next to the target, gets fsync'ed and then
+# replaces the target with os.replace, so a crash leaves either the old or the new file, never a half.
+def atomic_write_json(filename, data, **dump_kwargs):
+    _atomic_write(filename, 'w', lambda file: json.dump(data, file, **dump_kwargs))
+
+
+def atomic_write_bytes(filename, data: bytes):
+    _atomic_write(filename, 'wb', lambda file: file.write(data))
+
+
+def atomic_write_stream(filename, write, mode='w', encoding=None):
+    # write(file) fills the file piece by piece, for the files too big to build in memory first
+    _atomic_write(filename, mode, write, encoding)
+
+
+def _atomic_write(filename, mode, write, encoding=None):
+    # tempfile pulls in random and shutil, it is imported on the first save to keep the startup fast
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_name = tempfile.mkstemp(prefix=f'.{os.path.basename(filename)}.', suffix='.tmp', dir=directory)
+
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp makes the file private, the saved file keeps the mode of the one it replaces
+        os.chmod(tmp_name, _file_mode(filename))
+        os.replace(tmp_name, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+    _fsync_directory(directory)
+
+
+def _read_umask():
+    # umask can only be read by setting it, that is done once on import before the writer threads start
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# the mode open() gives a new file
+NEW_FILE_MODE = 0o666 & ~_read_umask()
+
+
+def _file_mode(filename):
+    try:
+        return os.stat(filename).st_mode & 0o7777
+    except FileNotFoundError:
+        return NEW_FILE_MODE
+
+
+def _fsync_directory(directory):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SnapshotWriter:
+    """Background writer for snapshots. submit() only stores the snapshot and returns; the writer thread
+    waits COALESCE_DELAY seconds for more edits and writes only the latest snapshot of every file."""
+
+    COALESCE_DELAY = 0.2
+
+    def __init__(self, coalesce_delay=None):
+        self.coalesce_delay = self.COALESCE_DELAY if coalesce_delay is None else coalesce_delay
+        self.pending = {}
+        self.in_progress = set()
+        self.waiters = 0
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def submit(self, filename, data, write=atomic_write_json, **write_kwargs):
+        # data must not be mutated after submit, pass a fresh snapshot (copy) of the in-memory state
+        with self.condition:
+            self.pending[filename] = (data, write, write_kwargs)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def flush(self, filename=None):
+        # Blocks until the pending snapshot of filename (or all of them) is on disk
+        with self.condition:
+            self.waiters += 1
+            self.condition.notify_all()
+            try:
+                self.condition.wait_for(lambda: not self._is_busy(filename))
+            finally:
+                self.waiters -= 1
+
+    def _is_busy(self, filename):
+        if filename is None:
+            return bool(self.pending or self.in_progress)
+        return filename in self.pending or filename in self.in_progress
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                # Give the edits that arrive right after the first one a chance to be merged in,
+                # unless somebody is already waiting for the file to be written
+                deadline = time.monotonic() + self.coalesce_delay
+                while not self.waiters:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.pending
+                self.pending = {}
+                self.in_progress.update(batch)
+
+            try:
+                for filename, (data, write, write_kwargs) in batch.items():
+                    try:
+                        write(filename, data, **write_kwargs)
+                    except Exception as error:
+                        # the thread has to live on, flush() waits for it
+                        print(f'Could not save {filename}: {error}')
+            finally:
+                with self.condition:
+                    self.in_progress.difference_update(batch)
+                    self.condition.notify_all()
+
+
+SNAPSHOT_WRITER = SnapshotWriter()
+atexit.register(SNAPSHOT_WRITER.flush)
+
+
+class AutosaveScheduler:
+    """Calls save_fn from a background thread every interval seconds, or as soon as max_changes changes
+    were noted, but only if something has changed since the last call."""
+
+    def __init__(self, save_fn, interval, max_changes):
+        self.save_fn = save_fn
+        self.interval = interval
+        self.max_changes = max_changes
+        self.changes = 0
+        self.stopped = True
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            self.stopped = False
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def note_change(self):
+        with self.condition:
+            self.changes += 1
+            if self.changes >= self.max_changes:
+                self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped or self.changes >= self.max_changes, self.interval)
+                if self.stopped:
+                    self.thread = None
+                    return
+                if not self.changes:
+                    continue
+                self.changes = 0
+
+            try:
+                self.save_fn()
+            except Exception as error:
+                print(f'Autosave failed: {error}')
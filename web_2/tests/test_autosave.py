@@ -0,0 +1,82 @@
+import os
+import threading
+
+import pytest
+
+import address_book
+from command_log import Journal
+from storage import SNAPSHOT_WRITER, AutosaveScheduler
+
+
+def test_scheduler_saves_on_the_interval_only_after_a_change():
+    saved = threading.Event()
+    scheduler = AutosaveScheduler(saved.set, interval=0.05, max_changes=100)
+    scheduler.start()
+    try:
+        assert not saved.wait(0.2)
+        scheduler.note_change()
+        assert saved.wait(5)
+    finally:
+        scheduler.stop()
+
+
+def test_stopped_scheduler_ends_its_thread():
+    scheduler = AutosaveScheduler(lambda: None, interval=60, max_changes=1)
+    scheduler.start()
+    thread = scheduler.thread
+    scheduler.stop()
+    thread.join(5)
+    assert not thread.is_alive() and scheduler.thread is None
+
+    scheduler.start()
+    assert scheduler.thread.is_alive()
+    scheduler.stop()
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    monkeypatch.setattr(address_book.AddressBook, 'AUTOSAVE_INTERVAL', 60)
+    yield address_book.AddressBook
+    SNAPSHOT_WRITER.flush()
+
+
+def test_save_serializes_the_changed_records_only(book):
+    adr_book = book()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    address_book.run_command(adr_book, 'add Ann 0671112233')
+    adr_book.close_record_data()
+
+    rows = dict(adr_book.serialized)
+    address_book.run_command(adr_book, 'add phone Bill 0931112233')
+    adr_book.close_record_data()
+    SNAPSHOT_WRITER.flush()
+
+    assert adr_book.serialized['Ann'] is rows['Ann']
+    assert adr_book.serialized['Bill'] is not rows['Bill']
+    reloaded = book()
+    assert sorted(reloaded) == ['Ann', 'Bill']
+    assert [str(phone) for phone in reloaded['Bill'].phones] == ['+380501112233', '+380931112233']
+
+
+def test_autosave_file_is_recovered_and_removed_on_save(book, monkeypatch, capsys):
+    monkeypatch.setattr(Journal, 'CHECKPOINT_BYTES', 0)
+    adr_book = book()
+    adr_book.autosave.start()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    adr_book.autosave_records()
+    adr_book.autosave.stop()
+    adr_book.journal.close()
+
+    assert os.path.exists(adr_book.autosave_file)
+
+    recovered = book()
+    assert 'recovered' in capsys.readouterr().out
+    assert sorted(recovered) == ['Bill']
+
+    recovered.close_record_data()
+    SNAPSHOT_WRITER.flush()
+    assert not os.path.exists(recovered.autosave_file)
+    assert sorted(book()) == ['Bill']
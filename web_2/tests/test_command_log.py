@@ -0,0 +1,162 @@
+import json
+import threading
+
+import pytest
+
+import address_book
+from command_log import CommandLog, Journal
+from storage import SNAPSHOT_WRITER
+
+
+def test_undo_and_redo_walk_the_log():
+    log = CommandLog()
+    log.push('add A', {'A': None}, {'A': {'name': 'A'}})
+    log.push('add B', {'B': None}, {'B': {'name': 'B'}})
+
+    assert log.undo()['command'] == 'add B'
+    assert log.undo()['command'] == 'add A'
+    assert log.undo() is None
+    assert log.redo()['command'] == 'add A'
+
+
+def test_new_command_drops_the_redo_entries():
+    log = CommandLog()
+    log.push('add A', {'A': None}, {'A': 1})
+    log.undo()
+    log.push('add B', {'B': None}, {'B': 2})
+
+    assert log.redo() is None
+    assert log.size == len(json.dumps([{'B': None}, {'B': 2}]))
+
+
+def test_oldest_entries_go_first():
+    log = CommandLog(max_entries=3)
+    for number in range(5):
+        log.push(f'command {number}', {}, {})
+
+    assert [entry['command'] for entry in log.undo_entries] == ['command 2', 'command 3', 'command 4']
+
+    log = CommandLog(max_bytes=100)
+    for number in range(5):
+        log.push(f'command {number}', {'name': 'x' * 20}, {'name': 'y' * 20})
+    assert len(log.undo_entries) == 1 and log.size <= 100
+
+
+def test_journal_replays_both_files_in_order(tmp_path):
+    journal = Journal(str(tmp_path / 'save.journal.jsonl'))
+    journal.append('add A', {'A': 1})
+    journal.rotate()
+    journal.append('add B', {'B': 2})
+    journal.close()
+
+    assert list(journal.replay()) == [('add A', {'A': 1}), ('add B', {'B': 2})]
+
+    journal.drop_rotated()
+    assert list(journal.replay()) == [('add B', {'B': 2})]
+
+
+def test_second_rotation_keeps_the_old_journal(tmp_path):
+    journal = Journal(str(tmp_path / 'save.journal.jsonl'))
+    journal.append('one', {})
+    journal.rotate()
+    journal.append('two', {})
+    # the snapshot of the first checkpoint did not get to the disk, drop_rotated was not called
+    journal.rotate()
+
+    assert [command for command, _ in journal.replay()] == ['one', 'two']
+
+
+def test_journal_stops_at_a_cut_line(tmp_path):
+    journal = Journal(str(tmp_path / 'save.journal.jsonl'))
+    journal.append('add A', {'A': 1})
+    journal.close()
+    with open(journal.filename, 'a', encoding='utf-8') as file:
+        file.write('{"command": "add B", "ro')
+
+    assert list(journal.replay()) == [('add A', {'A': 1})]
+
+
+def test_discard_removes_both_files(tmp_path):
+    journal = Journal(str(tmp_path / 'save.journal.jsonl'))
+    journal.append('one', {})
+    journal.rotate()
+    journal.append('two', {})
+    journal.discard()
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    yield address_book.AddressBook
+    SNAPSHOT_WRITER.flush()
+
+
+def phones(book, name):
+    return [str(phone) for phone in book[name].phones]
+
+
+def test_undo_and_redo_of_the_commands(book, capsys):
+    adr_book = book()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    address_book.run_command(adr_book, 'add phone Bill 0671112233')
+    address_book.run_command(adr_book, 'show all')
+
+    address_book.run_command(adr_book, 'undo')
+    assert phones(adr_book, 'Bill') == ['+380501112233']
+    address_book.run_command(adr_book, 'undo')
+    assert 'Bill' not in adr_book
+    address_book.run_command(adr_book, 'redo')
+    address_book.run_command(adr_book, 'redo')
+    assert phones(adr_book, 'Bill') == ['+380501112233', '+380671112233']
+
+    # show all changes nothing and is not logged
+    assert [entry['command'] for entry in adr_book.log.undo_entries] == ['add Bill 0501112233',
+                                                                         'add phone Bill 0671112233']
+
+
+def test_unsaved_changes_are_replayed_on_start(book, capsys):
+    adr_book = book()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    address_book.run_command(adr_book, 'add Ann 0671112233')
+    address_book.run_command(adr_book, 'delete contact Ann')
+    address_book.run_command(adr_book, 'undo')
+    # the session ends without a save
+    adr_book.journal.close()
+
+    recovered = book()
+    assert sorted(recovered) == ['Ann', 'Bill']
+    assert phones(recovered, 'Ann') == ['+380671112233']
+    assert '4 unsaved changes' in capsys.readouterr().out
+
+
+def test_save_empties_the_journal(book):
+    adr_book = book()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    adr_book.close_record_data()
+    SNAPSHOT_WRITER.flush()
+
+    assert list(adr_book.journal.replay()) == []
+    assert sorted(book()) == ['Bill']
+
+
+def test_record_edit_takes_the_row_under_the_write_lock(book, monkeypatch):
+    adr_book = book()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    holders = []
+    before_change = adr_book.before_change
+
+    def checked(contact_name):
+        holders.append(adr_book.lock.writer)
+        before_change(contact_name)
+
+    monkeypatch.setattr(adr_book, 'before_change', checked)
+    adr_book.begin_change('add phone Bill 0671112233')
+    adr_book['Bill'].add_phone('0671112233')
+    adr_book.end_change()
+
+    assert holders == [threading.get_ident()]
+    assert adr_book.log.undo_entries[-1]['command'] == 'add phone Bill 0671112233'
@@ -0,0 +1,115 @@
+from datetime import date
+
+import pytest
+
+import address_book
+import compact_snapshot
+from compact_snapshot import HEADER, CompactSnapshot, SnapshotFormatError
+from storage import SNAPSHOT_WRITER
+
+ROWS = [
+    ('Bill', ['+380501112233', '+380671112233'], date(1990, 2, 28), 'bill@example.com', 'Kyiv'),
+    ('Їжак', ['+380501112233'], None, '', ''),
+    ('Empty', [], date(2000, 2, 29), '', 'вул. Хрещатик, 1'),
+]
+
+
+def test_round_trip(tmp_path):
+    compact_snapshot.dump(tmp_path / 'save.abk', ROWS)
+
+    with CompactSnapshot(tmp_path / 'save.abk') as snapshot:
+        assert len(snapshot) == 3
+        assert list(snapshot) == ROWS
+        assert [snapshot[i] for i in range(3)] == ROWS
+        assert [snapshot.name(i) for i in range(3)] == ['Bill', 'Їжак', 'Empty']
+
+
+def test_shared_phones_are_stored_once():
+    phones = ['+380501112233'] * 3
+    shared = compact_snapshot.dumps([(str(number), phones, None, '', '') for number in range(10)])
+    single = compact_snapshot.dumps([(str(number), phones[:1], None, '', '') for number in range(10)])
+
+    assert shared.count(b'+380501112233') == 1
+    assert len(shared) == len(single) + 10 * 2 * 4
+
+
+def test_empty_book(tmp_path):
+    compact_snapshot.dump(tmp_path / 'save.abk', [])
+
+    with CompactSnapshot(tmp_path / 'save.abk') as snapshot:
+        assert len(snapshot) == 0
+        assert list(snapshot) == []
+        with pytest.raises(IndexError):
+            snapshot[0]
+
+
+def test_fields_longer_than_u16(tmp_path):
+    rows = [('Long', ['+380501112233'] * 70_000, None, 'e' * 70_000, 'a' * 100_000)]
+    compact_snapshot.dump(tmp_path / 'save.abk', rows)
+
+    with CompactSnapshot(tmp_path / 'save.abk') as snapshot:
+        assert snapshot[0] == rows[0]
+
+
+@pytest.mark.parametrize('content', [b'', b'ABKS', b'JSON' + bytes(HEADER.size),
+                                     HEADER.pack(b'ABKS', 99, 0, 0, 0, 0)])
+def test_not_a_snapshot(tmp_path, content):
+    (tmp_path / 'save.abk').write_bytes(content)
+
+    with pytest.raises(SnapshotFormatError):
+        CompactSnapshot(tmp_path / 'save.abk')
+
+
+@pytest.fixture
+def compact_book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'compact')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    compact_snapshot.dump('save.abk', ROWS)
+    yield address_book.AddressBook
+    SNAPSHOT_WRITER.flush()
+
+
+def test_book_builds_the_records_on_first_access(compact_book):
+    book = compact_book()
+
+    assert len(book) == 3 and 'Bill' in book
+    assert not any(isinstance(value, address_book.Record) for value in dict.values(book.data))
+
+    record = book['Bill']
+    assert [str(phone) for phone in record.phones] == ROWS[0][1]
+    assert record.birthday.value == date(1990, 2, 28)
+    assert record.book is book
+    assert sum(isinstance(value, address_book.Record) for value in dict.values(book.data)) == 1
+
+    assert sorted(record.name.value for record in book.data.values()) == ['Bill', 'Empty', 'Їжак']
+    assert book.data.snapshot is None
+
+
+def test_book_saves_the_records_it_did_not_touch(compact_book):
+    book = compact_book()
+    book.begin_change('delete Empty')
+    book.delete_record('Empty')
+    book.end_change()
+    book.close_record_data()
+    SNAPSHOT_WRITER.flush()
+
+    with CompactSnapshot('save.abk') as snapshot:
+        assert list(snapshot) == ROWS[:2]
+
+    book = compact_book()
+    assert sorted(book) == ['Bill', 'Їжак']
+    assert book['Їжак'].phones == ROWS[1][1]
+
+
+def test_memory_report_leaves_the_snapshot_records_unbuilt(compact_book):
+    import memory_report
+
+    book = compact_book()
+    book['Bill']
+    report = memory_report.address_book_report(book)
+
+    assert report.startswith('Address book: 3 records, 1 built')
+    assert 'Compact snapshot:' in report and '2 records not built yet' in report
+    assert book.data.built() == [book['Bill']]
+    assert book.data.snapshot is not None
@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+
+import pytest
+
+import address_book
+import contact_filters
+from contact_filters import (AddressContains, BirthdayMonth, BirthdayWithin, EmailDomain, FilterSyntaxError, NoEmail,
+                             PhonePrefix, parse, select)
+from reminders import birthday_in
+from storage import SNAPSHOT_WRITER
+
+TODAY = date.today()
+# name, phone, email, address, days to the next birthday
+CONTACTS = [
+    ('Bill', '0501112233', 'bill@gmail.com', 'Kyiv, Main street 1', 0),
+    ('Ann', '0671112233', 'ann@ukr.net', 'Lviv, Market square 2', 3),
+    ('Olena', '0931112233', 'olena@gmail.com', 'Kyiv, Khreshchatyk 5', 20),
+    ('Taras', '0501234567', '', 'Odesa', 100),
+    ('Marta', '0971112233', '', '', None),
+]
+
+
+def born(days):
+    # a date of birth of 1990 whose next birthday is in days days
+    day = TODAY + timedelta(days=days)
+    return birthday_in(day, 1990) if (day.month, day.day) != (2, 29) else date(1992, 2, 29)
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    adr_book = address_book.AddressBook()
+    for name, phone, email, address, days in CONTACTS:
+        address_book.run_command(adr_book, f'add {name} {phone}')
+        record = adr_book[name]
+        if email:
+            record.set_email(email)
+        if address:
+            record.set_address(address)
+            adr_book.reindex_record(record)
+        if days is not None:
+            record.set_birthday(born(days).strftime('%d %B %Y'))
+    yield adr_book
+    SNAPSHOT_WRITER.flush()
+
+
+def brute_force(book, filters):
+    return sorted(name for name, record in book.data.items() if all(item.matches(record) for item in filters))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('domain:gmail.com', ['Bill', 'Olena']),
+    ('email:@GMAIL.com address:kyiv', ['Bill', 'Olena']),
+    ('no-email', ['Marta', 'Taras']),
+    ('phone:050', ['Bill', 'Taras']),
+    ('phone:+38050123', ['Taras']),
+    ('operator:93', ['Olena']),
+    ('phone:3', ['Ann', 'Bill', 'Marta', 'Olena', 'Taras']),
+    ('bday:today', ['Bill']),
+    ('bday:week', ['Ann', 'Bill']),
+    ('bday:month domain:gmail.com', ['Bill', 'Olena']),
+    ('address:"Market square"', ['Ann']),
+    ('address:nowhere', []),
+    ('', ['Ann', 'Bill', 'Marta', 'Olena', 'Taras']),
+])
+def test_queries(book, query, expected):
+    filters = parse(query)
+    assert select(book, filters) == expected
+    assert brute_force(book, filters) == expected
+
+
+def test_birthday_month(book):
+    month = born(100).month
+    expected = sorted(name for name, *_, days in CONTACTS if days is not None and born(days).month == month)
+    assert select(book, [BirthdayMonth(str(month))]) == expected
+    assert BirthdayMonth('jan').value == BirthdayMonth('January').value == 1
+
+
+def test_few_candidates_are_checked_directly(book, monkeypatch):
+    looked_up = []
+    candidates = AddressContains.candidates
+    monkeypatch.setattr(AddressContains, 'candidates', lambda item, adr_book: looked_up.append(item.text)
+                        or candidates(item, adr_book))
+
+    assert select(book, [AddressContains('kyiv'), EmailDomain('ukr.net')]) == []
+    # the domain goes first, its only contact is checked on the record and the address index is not looked at
+    assert looked_up == []
+
+    monkeypatch.setattr(contact_filters, 'VERIFY_BELOW', 0)
+    assert select(book, [AddressContains('kyiv'), EmailDomain('gmail.com')]) == ['Bill', 'Olena']
+    assert looked_up == ['kyiv']
+
+
+def test_index_follows_the_changes(book):
+    assert select(book, [EmailDomain('gmail.com')]) == ['Bill', 'Olena']
+    book['Bill'].set_email('bill@ukr.net')
+    address_book.run_command(book, 'delete contact Olena')
+
+    assert select(book, [EmailDomain('gmail.com')]) == []
+    assert select(book, [EmailDomain('ukr.net')]) == ['Ann', 'Bill']
+    assert select(book, [NoEmail()]) == ['Marta', 'Taras']
+
+
+@pytest.mark.parametrize('query', ['color:red', 'bday:soon', 'phone:abc', 'month:13', 'domain:', 'address:"open'])
+def test_bad_queries(query):
+    with pytest.raises(FilterSyntaxError):
+        parse(query)
+
+
+def test_phone_prefix_forms():
+    assert PhonePrefix('+380501').prefix == PhonePrefix('80501').prefix == PhonePrefix('0501').prefix == '+380501'
+    assert PhonePrefix('50').prefix == '+38050'
+    assert PhonePrefix('38').prefix == '+38'
+    assert BirthdayWithin(6).days == 6
@@ -0,0 +1,60 @@
+import pytest
+
+import address_book
+from contact_stats import counts, report
+from storage import SNAPSHOT_WRITER
+
+
+def test_counts_most_common_first_then_by_value():
+    postings = {'ukr.net': {1}, 'gmail.com': {2, 3}, 'i.ua': {4}}
+    assert counts(postings) == [('gmail.com', 2), ('i.ua', 1), ('ukr.net', 1)]
+    assert counts(postings, top=1) == [('gmail.com', 2)]
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    adr_book = address_book.AddressBook()
+    address_book.run_command(adr_book, 'add Bill 0501112233')
+    address_book.run_command(adr_book, 'add Ann 0671112233')
+    address_book.run_command(adr_book, 'add phone Ann 0661112233')
+    address_book.run_command(adr_book, 'add Olena 0931112233')
+    adr_book['Bill'].set_email('bill@gmail.com')
+    adr_book['Ann'].set_email('ann@Gmail.com')
+    adr_book['Ann'].set_birthday('10 January 1990')
+    adr_book['Olena'].set_address('Kyiv')
+    yield adr_book
+    SNAPSHOT_WRITER.flush()
+
+
+def test_index_counts(book):
+    index = book.segment_index()
+    assert counts(index.domains) == [('gmail.com', 2), ('', 1)]
+    assert counts(index.operators) == [('050', 1), ('066', 1), ('067', 1), ('093', 1)]
+    assert {month: len(keys) for month, keys in index.months.items()} == {1: 1}
+    assert [index.filled[field] for field in ('phone', 'email', 'address', 'birthday')] == [3, 2, 1, 1]
+
+
+def test_counts_follow_the_changes(book):
+    index = book.segment_index()
+    book['Olena'].set_email('olena@ukr.net')
+    address_book.run_command(book, 'delete contact Bill')
+
+    assert counts(index.domains) == [('gmail.com', 1), ('ukr.net', 1)]
+    assert counts(index.operators) == [('066', 1), ('067', 1), ('093', 1)]
+    assert index.filled['email'] == 2 and index.filled['phone'] == 2
+    assert len(index) == 2
+
+
+def test_report(book, capsys):
+    text = report(book.segment_index(), top=1)
+    assert text.splitlines()[:3] == ['Contacts: 3', 'By email domain:', f'  {"gmail.com":30}      2  66.7%']
+    assert '050 Vodafone' in text and '067 Kyivstar' not in text
+    assert f'  {"January":30}      1  33.3%' in text
+    assert f'  {"address":30}      1  33.3%' in text
+
+    address_book.run_command(book, 'analytics fields')
+    output = capsys.readouterr().out
+    assert 'Field completeness:' in output and 'By email domain:' not in output
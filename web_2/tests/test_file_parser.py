@@ -0,0 +1,87 @@
+import file_parser
+from file_parser import FolderScan
+
+
+def make(root, *paths):
+    # a path that ends with / is an empty folder
+    for path in paths:
+        if path.endswith('/'):
+            (root / path).mkdir(parents=True, exist_ok=True)
+        else:
+            (root / path).parent.mkdir(parents=True, exist_ok=True)
+            (root / path).touch()
+
+
+def test_scan_groups_the_files(tmp_path):
+    make(tmp_path, 'a.jpg', 'b.JPG', 'docs/c.txt', 'docs/d', 'music/e.mp3', 'images/old.png')
+
+    scan = FolderScan(tmp_path)
+
+    assert sorted(path.name for path in scan.files['JPG']) == ['a.jpg', 'b.JPG']
+    assert [path.name for path in scan.files['MP3']] == ['e.mp3']
+    assert sorted(path.name for path in scan.other) == ['c.txt', 'd']
+    assert scan.unknown == {'TXT'} and scan.extensions == {'JPG', 'MP3'}
+    # the folders made by an earlier sort are not sorted again
+    assert scan.files['PNG'] == []
+
+
+def test_empty_folders_are_pruned_on_the_way_back(tmp_path):
+    make(tmp_path, 'empty/deeper/deepest/', 'mixed/empty/', 'mixed/keep.txt')
+    (tmp_path / 'alone').mkdir()
+
+    scan = FolderScan(tmp_path)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['mixed']
+    assert [path.name for path in (tmp_path / 'mixed').iterdir()] == ['keep.txt']
+    assert scan.remaining == {tmp_path: 1, tmp_path / 'mixed': 1}
+
+
+def test_empty_root_stays(tmp_path):
+    FolderScan(tmp_path)
+    assert tmp_path.is_dir()
+
+
+def test_folder_goes_with_its_last_entry(tmp_path):
+    make(tmp_path, 'a/b/one.txt', 'a/b/two.txt', 'a/other.txt')
+    scan = FolderScan(tmp_path)
+
+    (tmp_path / 'a/b/one.txt').unlink()
+    scan.entry_gone(tmp_path / 'a/b/one.txt')
+    assert (tmp_path / 'a/b').is_dir()
+
+    (tmp_path / 'a/b/two.txt').unlink()
+    scan.entry_gone(tmp_path / 'a/b/two.txt')
+    assert not (tmp_path / 'a/b').exists() and (tmp_path / 'a').is_dir()
+
+    (tmp_path / 'a/other.txt').unlink()
+    scan.entry_gone(tmp_path / 'a/other.txt')
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_folder_with_a_new_file_is_kept(tmp_path, capsys):
+    make(tmp_path, 'a/one.txt')
+    scan = FolderScan(tmp_path)
+
+    (tmp_path / 'a/one.txt').unlink()
+    (tmp_path / 'a/new.txt').touch()
+    scan.entry_gone(tmp_path / 'a/one.txt')
+
+    assert (tmp_path / 'a/new.txt').exists()
+    assert "Can't delete folder" in capsys.readouterr().out
+
+
+def test_module_lists_hold_the_last_scan(tmp_path):
+    make(tmp_path, 'first/a.mp4')
+    file_parser.scan(tmp_path / 'first')
+    make(tmp_path, 'second/b.zip', 'second/inner/c.svg')
+    file_parser.scan(tmp_path / 'second')
+
+    assert file_parser.MP4_VIDEO == []
+    assert [path.name for path in file_parser.ARCHIVES] == ['b.zip']
+    assert file_parser.FOLDERS == [tmp_path / 'second/inner']
+    assert file_parser.EXTENSION == {'ZIP', 'SVG'}
+
+    (tmp_path / 'second/inner/c.svg').unlink()
+    file_parser.entry_gone(tmp_path / 'second/inner/c.svg')
+    assert not (tmp_path / 'second/inner').exists()
+    file_parser.reset()
@@ -0,0 +1,127 @@
+import threading
+import time
+import zipfile
+
+import pytest
+
+import file_sort
+from file_sort import DeviceScheduler, TargetNames, normalize, sort_roots, usable_roots
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('Мама мила раму.txt', 'Mama_mila_ramu.txt'),
+    ('ЖУК.JPG', 'JUK.JPG'),
+    ('a b!@#.tar.gz', 'a_b___.tar.gz'),
+    ('file_1.mp3', 'file_1.mp3'),
+    ('photo (1).png', 'photo__1_.png'),
+    ('', ''),
+])
+def test_normalize(name, expected):
+    assert normalize(name) == expected
+
+
+def test_normalize_keeps_other_letters_and_digits():
+    assert normalize('Straße 2024.pdf') == 'Straße_2024.pdf'
+
+
+def test_same_names_get_a_number(tmp_path):
+    names = TargetNames()
+
+    claimed = [names.claim(tmp_path / 'images', name) for name in ('a.jpg', 'a.jpg', 'A.JPG', 'a_1.jpg')]
+
+    assert [path.name for path in claimed] == ['a.jpg', 'a_1.jpg', 'A_2.JPG', 'a_1_1.jpg']
+    assert (tmp_path / 'images').is_dir()
+
+
+def test_names_already_in_the_folder_are_taken(tmp_path):
+    (tmp_path / 'audio').mkdir()
+    (tmp_path / 'audio' / 'song.mp3').touch()
+    (tmp_path / 'audio' / 'song_1.mp3').touch()
+
+    assert TargetNames().claim(tmp_path / 'audio', 'Song.mp3').name == 'Song_2.mp3'
+
+
+@pytest.mark.parametrize('name, expected', [('README', 'README_1'), ('.hidden', '.hidden_1'), ('a.b.c', 'a.b_1.c')])
+def test_number_goes_before_the_last_suffix(tmp_path, name, expected):
+    names = TargetNames()
+    names.claim(tmp_path, name)
+
+    assert names.claim(tmp_path, name).name == expected
+
+
+def test_folders_are_separate(tmp_path):
+    names = TargetNames()
+
+    assert names.claim(tmp_path / 'one', 'a.zip').name == 'a.zip'
+    assert names.claim(tmp_path / 'two', 'a.zip').name == 'a.zip'
+
+
+def make(root, *paths):
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(path)
+
+
+def tree(root):
+    return sorted(str(path.relative_to(root)) for path in root.rglob('*') if path.is_file())
+
+
+def test_sort_roots_sorts_every_folder(tmp_path):
+    make(tmp_path, 'one/a.jpg', 'one/sub/a.jpg', 'one/sub/deep/song.mp3', 'one/notes.txt', 'two/Фото.png', 'two/x/y')
+    archive = tmp_path / 'two' / 'pack.zip'
+    with zipfile.ZipFile(archive, 'w') as writer:
+        writer.writestr('inside.txt', 'zipped')
+
+    assert sort_roots([tmp_path / 'one', tmp_path / 'two', tmp_path / 'one']) == 0
+
+    assert tree(tmp_path / 'one') == ['MY_OTHER/notes.txt', 'audio/song.mp3', 'images/JPG/a.jpg', 'images/JPG/a_1.jpg']
+    assert tree(tmp_path / 'two') == ['ARCHIVES/pack/inside.txt', 'MY_OTHER/y', 'images/PNG/Foto.png']
+    # the folders emptied by the sort are gone
+    assert sorted(path.name for path in (tmp_path / 'one').iterdir()) == ['MY_OTHER', 'audio', 'images']
+    assert not (tmp_path / 'two' / 'x').exists()
+
+
+def test_nested_and_missing_roots(tmp_path, capsys):
+    (tmp_path / 'outer' / 'inner').mkdir(parents=True)
+
+    assert usable_roots([tmp_path / 'outer' / 'inner', tmp_path / 'outer', tmp_path / 'missing']) == \
+        [(tmp_path / 'outer').resolve()]
+    assert 'missing is not a folder' in capsys.readouterr().out
+
+
+def test_failed_moves_are_counted(tmp_path, monkeypatch, capsys):
+    make(tmp_path, 'root/a.mp3', 'root/b.mp3')
+
+    def failing(filename, *_):
+        raise PermissionError(13, 'Permission denied', str(filename))
+
+    monkeypatch.setitem(file_sort.TARGETS, 'MP3', (failing, ('audio',)))
+
+    assert sort_roots([tmp_path / 'root']) == 2
+    assert 'Could not sort' in capsys.readouterr().out
+    assert tree(tmp_path / 'root') == ['a.mp3', 'b.mp3']
+
+
+def test_scheduler_keeps_a_device_within_its_limit():
+    scheduler = DeviceScheduler(per_device=2)
+    lock = threading.Lock()
+    running = {1: 0, 2: 0}
+    most = {1: 0, 2: 0}
+
+    def operation(device):
+        with lock:
+            running[device] += 1
+            most[device] = max(most[device], running[device])
+        time.sleep(0.02)
+        with lock:
+            running[device] -= 1
+
+    try:
+        futures = [scheduler.submit(device, operation, device) for device in (1, 1, 1, 1, 1, 1, 2, 2, 2)]
+        for future in futures:
+            future.result(5)
+    finally:
+        scheduler.shutdown()
+
+    assert most == {1: 2, 2: 2}
+    assert set(scheduler.pools) == {1, 2}
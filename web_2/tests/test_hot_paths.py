@@ -0,0 +1,46 @@
+import json
+import random
+import sys
+
+import pytest
+
+from benchmarks import hot_paths
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize('bench, count, expected', [
+    (hot_paths.bench_address_book, 50, {'load', 'save', 'find', 'fuzzy', 'bday_in'}),
+    (hot_paths.bench_notebook, 50, {'load', 'search_notes', 'sort_notes_by_tags', 'sort_command', 'save'}),
+    (hot_paths.bench_file_sort, 30, {'scan', 'sort'}),
+])
+def test_benchmarks_run_on_small_data(workdir, bench, count, expected):
+    timings = bench(count, 1, random.Random(1))
+    assert set(timings) == expected
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_generated_data_is_repeatable(workdir):
+    assert hot_paths.make_contacts(20, random.Random(5)) == hot_paths.make_contacts(20, random.Random(5))
+    contacts = hot_paths.make_contacts(20, random.Random(5))
+    assert len({contact['name'] for contact in contacts}) == 20
+
+
+def test_results_file_and_compare(workdir, monkeypatch, capsys):
+    monkeypatch.setitem(hot_paths.TIERS, 'tiny', {'contacts': 20, 'notes': 20, 'files': 10})
+    (workdir / 'before.json').write_text(json.dumps({'results': {'notes.load[20]': 1.0, 'gone[1]': 1.0}}))
+    monkeypatch.setattr(sys, 'argv', ['hot_paths.py', '--tiers', 'tiny', '--repeat', '1', '--only', 'notes',
+                                      '--output', 'after.json', '--compare', 'before.json'])
+
+    hot_paths.main()
+
+    saved = json.loads((workdir / 'after.json').read_text())
+    assert set(saved['results']) == {f'notes.{name}[20]' for name in
+                                     ('load', 'search_notes', 'sort_notes_by_tags', 'sort_command', 'save')}
+    assert saved['repeat'] == 1 and saved['seed'] == 2023
+    output = capsys.readouterr().out
+    assert 'notes.load[20]' in output.split('before s')[1] and 'gone[1]' not in output
@@ -0,0 +1,72 @@
+import pytest
+
+import address_book
+import instrumentation
+from instrumentation import BUCKETS, CommandStats, Instrumentation
+from storage import SNAPSHOT_WRITER
+
+
+def test_percentiles_are_bucket_bounds():
+    stats = CommandStats()
+    for elapsed_ms in [0.05] * 90 + [7] * 9 + [300]:
+        stats.add(elapsed_ms)
+
+    assert stats.calls == 100 and stats.max == 300
+    assert stats.percentile(0.5) == 0.1
+    assert stats.percentile(0.95) == 10
+    assert stats.percentile(1) == 300
+    assert len(stats.histogram) == len(BUCKETS)
+
+
+def test_nested_commands_are_measured_once():
+    tool = Instrumentation()
+    with tool.measure('outer'):
+        with tool.measure('inner'):
+            tool.note_error(KeyError('x'))
+
+    assert list(tool.stats) == ['outer']
+    assert tool.stats['outer'].calls == 1
+    assert tool.stats['outer'].errors == {'KeyError': 1}
+
+
+def test_profile_is_off_without_the_profiler():
+    assert 'Profiling is off' in Instrumentation().dump_profile('unused.prof')
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    yield address_book.AddressBook()
+    instrumentation.disable()
+    SNAPSHOT_WRITER.flush()
+
+
+def test_commands_are_counted_when_the_stats_are_on(book, capsys):
+    address_book.run_command(book, 'add Bill 0501112233')
+    assert instrumentation.INSTRUMENTATION is None
+
+    address_book.run_command(book, 'stats on')
+    address_book.run_command(book, 'add Ann 0671112233')
+    address_book.run_command(book, 'show all')
+    address_book.run_command(book, 'no such command')
+    address_book.run_command(book, 'stats')
+
+    stats = instrumentation.INSTRUMENTATION.stats
+    assert stats['add'].calls == stats['show all'].calls == 1
+    assert sum(stats['<unknown>'].errors.values()) == 1
+    assert 'stats' not in stats
+    assert 'show all' in capsys.readouterr().out
+
+    address_book.run_command(book, 'stats off')
+    assert instrumentation.INSTRUMENTATION is None
+
+
+def test_profile_dump(book, tmp_path, capsys):
+    address_book.run_command(book, 'stats profile')
+    address_book.run_command(book, 'add Bill 0501112233')
+    address_book.run_command(book, f'stats dump {tmp_path / "run.prof"}')
+
+    assert (tmp_path / 'run.prof').stat().st_size > 0
+    assert 'cumulative' in capsys.readouterr().out
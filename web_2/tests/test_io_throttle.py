@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import file_sort
+import io_throttle
+from io_throttle import Throttle, TokenBucket, lower_priority, parse_rate
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('10M', 10 * 1024 * 1024),
+    ('1.5k', 1536),
+    ('20MB/s', 20 * 1024 * 1024),
+    ('500', 500),
+    (' 2G ', 2 * 1024 ** 3),
+    ('', None),
+    (None, None),
+])
+def test_parse_rate(text, expected):
+    assert parse_rate(text) == expected
+
+
+@pytest.mark.parametrize('text', ['fast', '0', '-5M', 'M'])
+def test_bad_rates(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_bucket_holds_one_second_of_its_rate(monkeypatch):
+    clock = [100.0]
+    slept = []
+    monkeypatch.setattr(io_throttle.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(io_throttle.time, 'sleep', slept.append)
+
+    bucket = TokenBucket(100)
+    bucket.take(100)
+    assert slept == []
+
+    # a take bigger than what is left waits for the debt, the next one for its own share too
+    bucket.take(50)
+    bucket.take(50)
+    assert slept == [0.5, 1.0]
+
+    # an idle bucket fills up to its rate only
+    clock[0] += 60
+    bucket.take(100)
+    assert slept == [0.5, 1.0]
+
+
+def test_throttle_limits_the_rate():
+    throttle = Throttle(ops_per_sec=100)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [throttle.spend(ops=1) for _ in range(50)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    # 200 operations, the first 100 are in the bucket already, the rest take a second
+    assert time.monotonic() - start >= 0.9
+
+
+def test_throttle_without_limits_is_off():
+    assert not Throttle()
+    assert Throttle(bytes_per_sec=1)
+    Throttle(ops_per_sec=1).spend(size=10 ** 9)
+
+
+def test_lower_priority_changes_the_calling_thread_only():
+    if not io_throttle.PER_THREAD_PRIORITY:
+        assert lower_priority() == []
+        return
+
+    import os
+
+    before = os.getpriority(os.PRIO_PROCESS, 0)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(done=lower_priority(),
+                                                           nice=os.getpriority(os.PRIO_PROCESS, 0)))
+    thread.start()
+    thread.join(5)
+
+    assert os.getpriority(os.PRIO_PROCESS, 0) == before
+    if result['done'] and result['done'][0].startswith('nice'):
+        assert result['nice'] == min(before + io_throttle.NICE_INCREMENT, 19)
+
+
+def test_archives_are_charged_for_their_members(tmp_path):
+    import zipfile
+
+    archive = tmp_path / 'pack.zip'
+    with zipfile.ZipFile(archive, 'w') as writer:
+        writer.writestr('a.txt', 'x' * 100)
+        writer.writestr('b.txt', 'y' * 50)
+
+    assert file_sort.archive_cost(archive) == (3, archive.stat().st_size + 150)
+    (tmp_path / 'broken.zip').write_text('not a zip')
+    assert file_sort.archive_cost(tmp_path / 'broken.zip') == (1, 0)
+
+
+def test_command_line_rates():
+    arguments = file_sort.parse_arguments(['a', 'b', '--bytes-per-sec', '1M', '--ops-per-sec', '50', '--low-priority'])
+    assert arguments.folders == ['a', 'b']
+    assert (arguments.bytes_per_sec, arguments.ops_per_sec, arguments.low_priority) == (1 << 20, 50, True)
+
+    with pytest.raises(SystemExit):
+        file_sort.parse_arguments(['--ops-per-sec', 'fast'])
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from minhash import EMPTY, SIGNATURE_SIZE, MinHashLSH, shingles, signature, similarity
+from note_book import Note, Notebook
+
+WORDS = ('milk cow farm sail boat sea river field harvest grain bread mill wind storm rain sun moon star '
+         'road bridge town market cheese apple pear plum cherry garden fence barn horse sheep goat').split()
+
+
+def test_shingles_are_word_pairs_and_tags():
+    assert shingles('Milk the cow', ['Farm']) == {'milk the', 'the cow', '#farm'}
+    assert shingles('milk') == {'milk'}
+    assert shingles('') == set()
+
+
+def test_signature_is_stable_and_full():
+    sig = signature(shingles('milk the cow then sail the boat'))
+    assert sig == signature(shingles('milk the cow then sail the boat'))
+    assert len(sig) == SIGNATURE_SIZE and all(value != EMPTY for value in sig)
+    assert signature(set()) is None
+
+
+def test_similarity_estimates_jaccard():
+    rng = random.Random(3)
+    base = {f'{rng.choice(WORDS)} {rng.choice(WORDS)} {number}' for number in range(400)}
+    for kept in (400, 300, 200, 100):
+        other = set(sorted(base)[:kept]) | {f'other {number}' for number in range(400 - kept)}
+        jaccard = len(base & other) / len(base | other)
+        assert similarity(signature(base), signature(other)) == pytest.approx(jaccard, abs=0.2)
+
+
+def test_lsh_finds_near_duplicates_only():
+    lsh = MinHashLSH()
+    text = ' '.join(WORDS)
+    lsh.add('original', signature(shingles(text)))
+    lsh.add('copy', signature(shingles(text + ' again')))
+    lsh.add('unrelated', signature(shingles('completely different words about nothing at all')))
+    lsh.add('empty', None)
+
+    found = lsh.query(signature(shingles(text)), min_similarity=0.5, exclude='original')
+    assert [key for _, key in found] == ['copy']
+    assert len(lsh) == 3
+
+    lsh.remove('copy')
+    assert lsh.query(signature(shingles(text)), exclude='original') == []
+    assert not any('copy' in keys for keys in lsh.buckets.values())
+
+
+@pytest.fixture
+def notebook(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Notebook, 'STORAGE_FORMAT', 'json')
+    return Notebook(str(tmp_path / 'notes.json'))
+
+
+def test_notebook_warns_about_a_near_duplicate(notebook, capsys):
+    text = ' '.join(WORDS)
+    notebook.add_note(Note('Farm plan', text, ['farm']))
+    notebook.add_note(Note('Boat trip', 'sail the boat along the river to the sea', []))
+    assert 'nearly the same' not in capsys.readouterr().out
+
+    notebook.add_note(Note('Farm plan 2', text, ['farm']))
+    assert 'nearly the same as Farm plan (' in capsys.readouterr().out
+
+    similar = notebook.similar_notes(notebook.find_note('Farm plan 2'))
+    assert [other.title for _, other in similar] == ['Farm plan']
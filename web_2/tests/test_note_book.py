@@ -0,0 +1,66 @@
+import pytest
+
+import note_book
+from note_book import Note, Notebook
+from storage import SNAPSHOT_WRITER
+
+
+@pytest.fixture
+def notebook(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Notebook, 'STORAGE_FORMAT', 'json')
+    notebook = Notebook(str(tmp_path / 'notes.json'))
+    for title in ('First', 'Second', 'Third'):
+        notebook.add_note(Note(title, f'{title} shared words about the sea', []))
+    yield notebook
+    SNAPSHOT_WRITER.flush()
+
+
+def titles(notes):
+    return [note.title for note in notes]
+
+
+def test_search_keeps_the_notebook_order_after_an_edit(notebook):
+    notebook.search_notes('shared')
+    notebook.set_content(notebook.find_note('First'), 'First shared words, edited')
+
+    assert titles(notebook.search_notes('shared')) == ['First', 'Second', 'Third']
+
+
+def test_search_keeps_the_notebook_order_after_tagging(notebook, monkeypatch):
+    notebook.search_notes('shared')
+    answers = iter(['Second', 'ocean'])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    note_book.handle_tag(notebook)
+
+    assert titles(notebook.search_notes('shared')) == ['First', 'Second', 'Third']
+    assert titles(notebook.search_notes('tag:ocean')) == ['Second']
+
+
+def test_regex_keeps_the_notebook_order_after_an_edit(notebook):
+    notebook.regex_notes(r'shar.d')
+    notebook.set_content(notebook.find_note('First'), 'First shared words, edited')
+
+    assert titles(notebook.regex_notes(r'shar.d')) == ['First', 'Second', 'Third']
+    assert titles(notebook.regex_notes(r'edit(ed)?\b')) == ['First']
+
+
+def test_new_notes_come_last(notebook):
+    notebook.search_notes('shared')
+    notebook.add_note(Note('Fourth', 'Fourth shared words about the sea', []))
+
+    assert titles(notebook.search_notes('shared')) == ['First', 'Second', 'Third', 'Fourth']
+
+
+def test_delete_does_not_load_a_missing_history(notebook):
+    assert notebook.delete_note('first')
+    assert notebook.history is None
+
+
+def test_delete_drops_the_saved_history(notebook):
+    notebook.set_content(notebook.find_note('Second'), 'Second, edited')
+    notebook.save_notes()
+    notebook.history = None
+
+    assert notebook.delete_note('second')
+    assert notebook.history is not None and notebook.history.get('Second') is None
@@ -0,0 +1,95 @@
+import json
+import random
+
+import pytest
+
+from note_history import History, HistoryStore, apply_delta, make_delta
+
+
+@pytest.mark.parametrize('old, new', [
+    ('', ''),
+    ('', 'new text'),
+    ('old text', ''),
+    ('milk the cow', 'milk the cow'),
+    ('milk the cow', 'milk the big cow'),
+    ('milk the cow then sail', 'feed the cow then sleep'),
+    ('слово за словом', 'слово і ще слово за словом'),
+    ('a  b\n\tc', 'a b\nc  '),
+])
+def test_delta_round_trip(old, new):
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_delta_round_trip_on_random_edits():
+    generator = random.Random(7)
+    words = ['milk', 'cow', 'sea', ' ', '\n', 'ї', 'plan']
+    text = ''
+    for _ in range(200):
+        new = list(text)
+        for _ in range(generator.randint(0, 3)):
+            position = generator.randint(0, len(new))
+            if new and generator.random() < 0.4:
+                del new[position:position + generator.randint(1, 5)]
+            else:
+                new[position:position] = generator.choice(words)
+        new = ''.join(new)
+        assert apply_delta(text, make_delta(text, new)) == new
+        text = new
+
+
+def test_small_edit_gives_a_small_delta():
+    old = 'word ' * 1000
+    new = old[:2500] + 'inserted ' + old[2500:]
+
+    assert make_delta(old, new) == [2500, 'inserted ']
+
+
+def test_history_rebuilds_every_revision():
+    history = History()
+    texts = ['first version of the note']
+    for number in range(30):
+        texts.append(texts[-1] + f' edit {number}')
+        history.record(texts[-2], texts[-1])
+
+    assert len(history) == len(texts)
+    assert [history.text(number) for number in range(len(texts))] == texts
+    with pytest.raises(IndexError):
+        history.text(len(texts))
+
+
+def test_keyframe_after_max_chain(monkeypatch):
+    monkeypatch.setattr(History, 'MAX_CHAIN', 5)
+    history = History()
+    text = 'a long enough text for the deltas to stay small ' * 10
+    for number in range(12):
+        history.record(text, text + str(number))
+        text += str(number)
+
+    keyframes = [number for number, revision in enumerate(history.revisions) if 'text' in revision]
+    assert keyframes == [0, 5, 10]
+    assert history.text(12) == text
+
+
+def test_keyframe_when_the_deltas_outgrow_the_text():
+    history = History()
+    history.record('short', 'completely different')
+
+    assert 'text' in history.revisions[1]
+    assert history.text(0) == 'short'
+
+
+def test_store_round_trip(tmp_path):
+    store = HistoryStore(str(tmp_path / 'notes.history.json'))
+    store.record('Plan', 'milk the cow', 'milk the big cow')
+    store.record('PLAN', 'milk the big cow', 'milk the big cow twice')
+    store.record('Other', 'a', 'b')
+    store.drop('other')
+    store.drop('missing')
+
+    (tmp_path / 'notes.history.json').write_text(json.dumps(store.snapshot()), encoding='utf-8')
+    assert not store.changed
+
+    loaded = HistoryStore(str(tmp_path / 'notes.history.json'))
+    assert loaded.get('Other') is None
+    assert [loaded.get('plan').text(number) for number in range(3)] == \
+        ['milk the cow', 'milk the big cow', 'milk the big cow twice']
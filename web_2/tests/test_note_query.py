@@ -0,0 +1,101 @@
+import pytest
+
+import note_query
+from note_query import QuerySyntaxError
+from note_ranking import BM25Index, tokenize
+
+NOTES = {
+    'milk': {'title': 'Shopping', 'content': 'buy milk and bread', 'tags': ['home']},
+    'cow': {'title': 'Sea cow', 'content': 'the sea cow is a marine animal', 'tags': ['animals']},
+    'plan': {'title': 'Revenge plan', 'content': 'milk the cow, then sail the sea', 'tags': ['plans', 'secret']},
+    'sitter': {'title': 'Baby sitter', 'content': 'call the milk-fed baby sitter', 'tags': ['home']},
+}
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    for key, fields in NOTES.items():
+        index.add(key, **fields)
+    return index
+
+
+def words_of(key, field):
+    text = NOTES[key][field]
+    return ' '.join(tokenize(' '.join(text) if isinstance(text, list) else text))
+
+
+def search(index, query):
+    return note_query.search(index, query, words_of)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('milk', {'milk', 'plan', 'sitter'}),
+    ('MILK', {'milk', 'plan', 'sitter'}),
+    ('milk cow', {'plan'}),
+    ('milk AND cow', {'plan'}),
+    ('bread OR marine', {'milk', 'cow'}),
+    ('milk AND NOT cow', {'milk', 'sitter'}),
+    ('milk NOT cow', {'milk', 'sitter'}),
+    ('NOT NOT bread', {'milk'}),
+    ('(bread OR marine) sea', {'cow'}),
+    ('sea (cow OR sail)', {'cow', 'plan'}),
+    ('train', set()),
+])
+def test_boolean_operators(index, query, expected):
+    assert search(index, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('"sea cow"', {'cow'}),
+    ('"cow sea"', set()),
+    ('"milk the cow"', {'plan'}),
+    ('milk-fed', {'sitter'}),
+    ('"sea"', {'cow', 'plan'}),
+])
+def test_phrases_need_the_words_next_to_each_other(index, query, expected):
+    assert search(index, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('tag:home', {'milk', 'sitter'}),
+    ('tags:secret', {'plan'}),
+    ('title:cow', {'cow'}),
+    ('content:cow', {'cow', 'plan'}),
+    ('title:"sea cow"', {'cow'}),
+    ('content:"sea cow"', {'cow'}),
+    ('title:"revenge plan" tag:plans', {'plan'}),
+    ('tag:home NOT title:baby', {'milk'}),
+])
+def test_fields(index, query, expected):
+    assert search(index, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('mar*', {'cow'}),
+    ('s*', {'milk', 'cow', 'plan', 'sitter'}),
+    ('tag:pl*', {'plan'}),
+    ('sea sa*', {'plan'}),
+    ('zzz*', set()),
+])
+def test_prefixes(index, query, expected):
+    assert search(index, query) == expected
+
+
+def test_unknown_field_is_a_word(index):
+    assert search(index, 'colour:milk') == set()
+    assert search(index, 'tag:') == set()
+
+
+@pytest.mark.parametrize('query', ['', '   ', 'milk OR', 'AND milk', '(milk cow', 'milk )', '""', '***', 'NOT'])
+def test_syntax_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        note_query.parse(query)
+
+
+def test_query_sees_changes_of_the_index(index):
+    index.add('milk', title='Shopping', content='buy coffee', tags=['home'])
+    index.remove('plan')
+
+    assert search(index, 'milk') == {'sitter'}
+    assert search(index, 'coffee') == {'milk'}
@@ -0,0 +1,103 @@
+import pytest
+
+from note_ranking import BM25Index, tokenize
+
+
+def make_index(*documents):
+    index = BM25Index()
+    for key, fields in documents:
+        index.add(key, **fields)
+    return index
+
+
+def keys(results):
+    return [key for _, key in results]
+
+
+def test_tokenize_casefolds_and_splits_on_non_words():
+    assert tokenize('Milk-fed COW, 2 times') == ['milk', 'fed', 'cow', '2', 'times']
+
+
+def test_only_documents_with_a_query_term_score():
+    index = make_index(('a', {'content': 'milk and cow'}), ('b', {'content': 'sea and sand'}))
+
+    assert keys(index.search('cow')) == ['a']
+    assert index.search('train') == []
+    assert index.search('') == []
+
+
+def test_more_frequent_term_ranks_higher():
+    index = make_index(('once', {'content': 'coffee tea water juice'}),
+                       ('twice', {'content': 'coffee coffee tea water'}))
+
+    assert keys(index.search('coffee')) == ['twice', 'once']
+
+
+def test_rare_terms_weigh_more():
+    index = make_index(('common', {'content': 'plan plan'}), ('rare', {'content': 'revenge'}),
+                       ('other', {'content': 'plan'}))
+
+    scores = dict((key, score) for score, key in index.search('plan revenge'))
+    assert scores['rare'] > scores['common']
+
+
+def test_field_weights_put_tags_before_title_before_content():
+    index = make_index(('content', {'content': 'kyiv'}), ('title', {'title': 'kyiv'}), ('tags', {'tags': ['kyiv']}))
+
+    assert keys(index.search('kyiv')) == ['tags', 'title', 'content']
+
+
+def test_equal_scores_keep_the_order_of_adding():
+    index = make_index(*((key, {'content': 'same words'}) for key in 'cab'))
+
+    assert keys(index.search('same')) == ['c', 'a', 'b']
+
+
+def test_re_added_document_keeps_its_order():
+    index = make_index(*((key, {'content': 'same words'}) for key in ('first', 'second', 'third')))
+    index.add('first', content='same words again')
+    index.add('fourth', content='same words')
+
+    assert index.order['first'] < index.order['second'] < index.order['third'] < index.order['fourth']
+
+
+def test_re_added_document_is_indexed_with_its_new_text():
+    index = make_index(('note', {'content': 'milk'}))
+    index.add('note', content='coffee')
+
+    assert index.search('milk') == []
+    assert keys(index.search('coffee')) == ['note']
+    assert 'milk' not in index.postings
+
+
+def test_remove_drops_the_postings_and_the_lengths():
+    index = make_index(('a', {'title': 'plan', 'content': 'sea cow'}), ('b', {'content': 'sea'}))
+    index.remove('a')
+    index.remove('missing')
+
+    assert len(index) == 1
+    assert 'a' not in index and 'b' in index
+    assert sorted(index.postings) == ['sea']
+    assert index.total_lengths == [0, 1, 0]
+
+
+def test_top_k_limits_the_results():
+    index = make_index(*((str(number), {'content': 'word ' * (number + 1)}) for number in range(5)))
+
+    assert len(index.search('word', top_k=2)) == 2
+    assert index.search('word', top_k=0) == []
+
+
+@pytest.mark.parametrize('prefix, expected', [('ma', ['marine', 'maze']), ('mi', ['milk']), ('x', [])])
+def test_with_prefix(prefix, expected):
+    index = make_index(('a', {'content': 'milk marine maze sea'}))
+
+    assert index.with_prefix(prefix) == expected
+
+
+def test_vocabulary_follows_new_terms():
+    index = make_index(('a', {'content': 'milk'}))
+    assert index.with_prefix('m') == ['milk']
+
+    index.add('b', content='marine')
+    assert index.with_prefix('m') == ['marine', 'milk']
@@ -0,0 +1,145 @@
+import json
+
+import pytest
+
+from note_book import Note
+from note_storage import NoteLog, NoteStorageError, preview_of
+
+
+def notes_of(records):
+    return [Note(record['title'], record.get('content'), record['tags'], record.get('body'), record.get('preview'))
+            for record in records]
+
+
+def contents(notes):
+    return [(note.title, note.content, note.tags) for note in notes]
+
+
+def reload(filename, codec=None):
+    log = NoteLog(str(filename), codec)
+    return log, notes_of(log.load())
+
+
+NOTES = [
+    ('Plan', 'milk the cow, then sail the sea ' * 10, ['plans']),
+    ('Їжа', 'хліб і молоко', []),
+    ('Empty', '', ['a', 'b']),
+]
+
+
+@pytest.fixture(params=[None, 'zlib', 'lzma'])
+def codec(request):
+    return request.param
+
+
+@pytest.fixture
+def notes():
+    return [Note(title, content, list(tags)) for title, content, tags in NOTES]
+
+
+def test_rewrite_and_load_round_trip(tmp_path, codec, notes):
+    log = NoteLog(str(tmp_path / 'notes.jsonl'), codec)
+    log.rewrite(notes, Note.store_body)
+
+    _, loaded = reload(tmp_path / 'notes.jsonl', codec)
+    assert contents(loaded) == NOTES
+    assert [note.preview for note in loaded] == [preview_of(content) for _, content, _ in NOTES]
+
+
+def test_bodies_stay_out_of_core(tmp_path, notes):
+    log = NoteLog(str(tmp_path / 'notes.jsonl'), 'zlib')
+    log.rewrite(notes, Note.store_body)
+
+    assert all(note.text is None and note.body is not None for note in notes)
+    assert contents(notes) == NOTES
+    assert '"content"' not in (tmp_path / 'notes.jsonl').read_text(encoding='utf-8')
+
+
+def test_append_the_last_line_of_a_title_wins(tmp_path, codec, notes):
+    log = NoteLog(str(tmp_path / 'notes.jsonl'), codec)
+    log.rewrite(notes, Note.store_body)
+
+    notes[0].content = 'a new plan'
+    log.append(['Empty'], [notes[0], Note('New', 'new note', [])], Note.store_body)
+
+    _, loaded = reload(tmp_path / 'notes.jsonl', codec)
+    # a title written again moves to the end, as a note deleted and added again
+    assert contents(loaded) == [NOTES[1], ('Plan', 'a new plan', ['plans']), ('New', 'new note', [])]
+
+
+def test_deleted_and_added_again(tmp_path, notes):
+    log = NoteLog(str(tmp_path / 'notes.jsonl'))
+    log.rewrite(notes, Note.store_body)
+    log.append(['plan'], [], Note.store_body)
+    log.append([], [Note('PLAN', 'back again', [])], Note.store_body)
+
+    _, loaded = reload(tmp_path / 'notes.jsonl')
+    assert contents(loaded) == [NOTES[1], NOTES[2], ('PLAN', 'back again', [])]
+
+
+def test_cut_last_line_is_skipped_and_the_file_rewritten(tmp_path, notes, capsys):
+    filename = tmp_path / 'notes.jsonl'
+    log = NoteLog(str(filename))
+    log.rewrite(notes, Note.store_body)
+    with open(filename, 'a', encoding='utf-8') as file:
+        file.write('{"title": "Cut", "cont')
+
+    log, loaded = reload(filename)
+
+    assert contents(loaded) == NOTES
+    assert 'unfinished last line' in capsys.readouterr().out
+    assert log.should_compact(len(loaded))
+
+
+def test_damaged_line_in_the_middle(tmp_path, notes):
+    filename = tmp_path / 'notes.jsonl'
+    NoteLog(str(filename)).rewrite(notes, Note.store_body)
+    lines = filename.read_text(encoding='utf-8').splitlines(keepends=True)
+    lines[2] = '{broken\n'
+    filename.write_text(''.join(lines), encoding='utf-8')
+
+    with pytest.raises(NoteStorageError, match='line 3'):
+        NoteLog(str(filename)).load()
+
+
+@pytest.mark.parametrize('header', ['not json\n', json.dumps({'version': 99}) + '\n'])
+def test_bad_header(tmp_path, header):
+    (tmp_path / 'notes.jsonl').write_text(header, encoding='utf-8')
+
+    with pytest.raises(NoteStorageError):
+        NoteLog(str(tmp_path / 'notes.jsonl')).load()
+
+
+def test_unknown_codec(tmp_path, notes):
+    with pytest.raises(NoteStorageError, match='Unknown codec'):
+        NoteLog(str(tmp_path / 'notes.jsonl'), 'rot13').rewrite(notes, Note.store_body)
+
+
+def test_compaction_moves_to_the_next_side_file(tmp_path, notes):
+    log = NoteLog(str(tmp_path / 'notes.jsonl'), 'zlib')
+    log.rewrite(notes, Note.store_body)
+    log.append([], notes[:1], Note.store_body)
+    log.rewrite(notes, Note.store_body)
+
+    assert sorted(path.name for path in tmp_path.glob('*.bodies')) == ['notes.2.bodies']
+    assert contents(notes) == NOTES
+    assert contents(reload(tmp_path / 'notes.jsonl', 'zlib')[1]) == NOTES
+
+
+def test_changing_the_codec_asks_for_a_rewrite(tmp_path, notes):
+    NoteLog(str(tmp_path / 'notes.jsonl')).rewrite(notes, Note.store_body)
+
+    log, loaded = reload(tmp_path / 'notes.jsonl', 'zlib')
+    assert log.should_compact(len(loaded))
+
+    log.rewrite(loaded, Note.store_body)
+    assert contents(reload(tmp_path / 'notes.jsonl', 'zlib')[1]) == NOTES
+
+
+def test_should_compact_counts_the_stale_lines(tmp_path, notes):
+    log = NoteLog(str(tmp_path / 'notes.jsonl'))
+    log.rewrite(notes, Note.store_body)
+
+    assert not log.should_compact(3)
+    assert not log.should_compact(3, pending=3)
+    assert log.should_compact(3, pending=4)
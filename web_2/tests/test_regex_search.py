@@ -0,0 +1,95 @@
+import re
+
+import pytest
+
+import address_book
+from note_book import Note, Notebook
+from regex_search import required_literals
+from storage import SNAPSHOT_WRITER
+
+
+@pytest.mark.parametrize('pattern, expected', [
+    ('revenge', ['revenge']),
+    (r'rev(enge)?\s+revenge', ['rev', 'revenge']),
+    ('Milk', ['milk']),
+    (r'a\.b', ['a.b']),
+    ('colou?r', ['colo', 'r']),
+    ('ab+c', ['ab', 'c']),
+    ('ab{2}c', ['ab', 'c']),
+    ('ab{0,2}c', ['a', 'c']),
+    ('milk|cow', []),
+    ('(milk|cow) plan', [' plan']),
+    ('[abc]de', ['de']),
+    (r'(?x) milk', []),
+])
+def test_required_literals(pattern, expected):
+    assert required_literals(pattern) == expected
+
+
+@pytest.mark.parametrize('pattern, expected', [
+    (r'\x41bcde', ['bcde']),
+    (r'\u0410bcde', ['bcde']),
+    (r'\U00000041bcde', ['bcde']),
+    (r'\N{LATIN CAPITAL LETTER A}bcde', ['bcde']),
+    (r'\101bcde', ['bcde']),
+    (r'\0bcde', ['bcde']),
+    (r'\012bcde', ['bcde']),
+    (r'(a)\1bcde', ['bcde']),
+    (r'(a)(b)(c)(d)(e)(f)(g)(h)(i)(j)(k)(l)\12bcde', ['bcde']),
+    (r'\x41?bcde', ['bcde']),
+    (r'\d\w+bcde', ['bcde']),
+])
+def test_escapes_are_consumed_whole(pattern, expected):
+    assert required_literals(pattern) == expected
+
+
+@pytest.mark.parametrize('pattern, text', [
+    (r'\x41bcde', 'Abcde'),
+    (r'\u0410bcde', 'Аbcde'),
+    (r'\U00000041bcde', 'Abcde'),
+    (r'\N{LATIN CAPITAL LETTER A}bcde', 'Abcde'),
+    (r'\101bcde', 'Abcde'),
+    (r'(a)\1bcde', 'aabcde'),
+])
+def test_every_literal_is_in_the_match(pattern, text):
+    assert re.search(pattern, text, re.IGNORECASE)
+    for literal in required_literals(pattern):
+        assert literal in text.casefold()
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    adr_book = address_book.AddressBook()
+    for line in ('add Zed 0501112233', 'add Abcde 0671112233', 'add Mabcdef 0931112233'):
+        address_book.run_command(adr_book, line)
+    yield adr_book
+    SNAPSHOT_WRITER.flush()
+
+
+def names(records):
+    return [record.name.value for record in records]
+
+
+@pytest.mark.parametrize('pattern', [r'\x41bcde', r'\101bcde', r'\N{LATIN CAPITAL LETTER A}bcde'])
+def test_regex_find_with_escapes(book, pattern):
+    assert names(book.regex_find(pattern)) == ['Abcde', 'Mabcdef']
+
+
+def test_regex_find_sorts_by_name_with_and_without_the_index(book):
+    # 'abc' goes through the trigram index, '.' has no literal and checks every record
+    assert names(book.regex_find('abc')) == ['Abcde', 'Mabcdef']
+    assert names(book.regex_find('^.')) == ['Abcde', 'Mabcdef', 'Zed']
+
+
+def test_regex_notes_with_escapes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Notebook, 'STORAGE_FORMAT', 'json')
+    notebook = Notebook(str(tmp_path / 'notes.json'))
+    notebook.add_note(Note('Abcdef', 'a note about the sea', []))
+
+    assert [note.title for note in notebook.regex_notes(r'\x41bcdef')] == ['Abcdef']
+    assert [note.title for note in notebook.regex_notes(r'\101bcdef')] == ['Abcdef']
+    SNAPSHOT_WRITER.flush()
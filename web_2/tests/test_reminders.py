@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+from reminders import BirthdayCalendar, birthday_in, days_to_birthday, next_birthday, to_icalendar
+
+LEAP_DAY = date(2000, 2, 29)
+
+
+@pytest.mark.parametrize('year, expected', [(2023, date(2023, 2, 28)), (2024, date(2024, 2, 29))])
+def test_leap_day_birthday(year, expected):
+    assert birthday_in(LEAP_DAY, year) == expected
+
+
+def test_next_birthday_crosses_the_year_end():
+    assert next_birthday(date(1990, 1, 5), date(2023, 12, 30)) == date(2024, 1, 5)
+    assert next_birthday(date(1990, 12, 30), date(2023, 12, 30)) == date(2023, 12, 30)
+    assert next_birthday(LEAP_DAY, date(2023, 3, 1)) == date(2024, 2, 29)
+    assert next_birthday(LEAP_DAY, date(2024, 3, 1)) == date(2025, 2, 28)
+    assert days_to_birthday(date(1990, 1, 1), date(2023, 12, 31)) == 1
+
+
+@pytest.fixture
+def calendar():
+    calendar = BirthdayCalendar()
+    calendar.rebuild([('Bill', date(1990, 1, 2)), ('Ann', date(1985, 12, 31)), ('Leap', LEAP_DAY),
+                      ('Jan', date(1970, 6, 1))], today=date(2023, 12, 28))
+    return calendar
+
+
+def test_window_across_the_year_end(calendar):
+    assert calendar.upcoming(7) == [(date(2023, 12, 31), 'Ann'), (date(2024, 1, 2), 'Bill')]
+    assert calendar.upcoming(365)[-1] == (date(2024, 6, 1), 'Jan')
+
+
+def test_leap_day_in_the_calendar():
+    calendar = BirthdayCalendar()
+    calendar.rebuild([('Leap', LEAP_DAY)], today=date(2023, 2, 1))
+    assert calendar.upcoming(30) == [(date(2023, 2, 28), 'Leap')]
+
+
+def test_empty_window(calendar):
+    assert calendar.upcoming(0) == []
+    assert calendar.upcoming(2) == []
+
+    empty = BirthdayCalendar()
+    empty.rebuild([], today=date(2023, 12, 28))
+    assert empty.upcoming(365) == []
+
+
+def test_update_and_remove(calendar):
+    calendar.update('Bill', date(1990, 12, 28))
+    assert calendar.upcoming(0) == [(date(2023, 12, 28), 'Bill')]
+
+    calendar.update('Ann', None)
+    assert 'Ann' not in calendar.dates
+    assert [name for _, name in calendar.upcoming(365)] == ['Bill', 'Leap', 'Jan']
+
+
+def test_horizon_limits_the_events():
+    calendar = BirthdayCalendar(horizon=10)
+    calendar.rebuild([('Near', date(1990, 1, 5)), ('Far', date(1990, 3, 1))], today=date(2024, 1, 1))
+    assert calendar.upcoming(365) == [(date(2024, 1, 5), 'Near')]
+    assert calendar.is_stale(date(2024, 1, 2)) and not calendar.is_stale(date(2024, 1, 1))
+
+
+def test_icalendar_events():
+    text = to_icalendar([(date(2024, 2, 29), 'Leap, Day')], ages={'Leap, Day': 24})
+    assert 'DTSTART;VALUE=DATE:20240229\r\n' in text
+    assert 'DTEND;VALUE=DATE:20240301\r\n' in text
+    assert "SUMMARY:Leap\\, Day's birthday (24)\r\n" in text
+    assert all(len(line.encode('utf-8')) <= 75 for line in text.split('\r\n'))
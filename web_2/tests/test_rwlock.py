@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from rwlock import ReadWriteLock
+
+
+def start(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.read():
+            inside.wait()
+
+    threads = [start(read) for _ in range(2)]
+    inside.wait()
+    for thread in threads:
+        thread.join(5)
+    assert lock.readers == 0
+
+
+def test_writer_waits_for_the_readers():
+    lock = ReadWriteLock()
+    events = []
+    reading = threading.Event()
+    release = threading.Event()
+
+    def read():
+        with lock.read():
+            reading.set()
+            release.wait(5)
+            events.append('read done')
+
+    def write():
+        with lock.write():
+            events.append('write')
+
+    reader = start(read)
+    reading.wait(5)
+    writer = start(write)
+    time.sleep(0.05)
+    assert events == []
+
+    release.set()
+    reader.join(5)
+    writer.join(5)
+    assert events == ['read done', 'write']
+
+
+def test_waiting_writer_goes_before_new_readers():
+    lock = ReadWriteLock()
+    events = []
+    lock.acquire_read()
+
+    writer = start(lambda: (lock.acquire_write(), events.append('write'), lock.release_write()))
+    while not lock.writers_waiting:
+        time.sleep(0.001)
+    reader = start(lambda: (lock.acquire_read(), events.append('read'), lock.release_read()))
+    time.sleep(0.05)
+
+    lock.release_read()
+    writer.join(5)
+    reader.join(5)
+    assert events == ['write', 'read']
+
+
+def test_reentrant_for_the_same_thread():
+    lock = ReadWriteLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+        assert lock.writer is not None
+    assert lock.writer is None
+
+    with lock.read():
+        with lock.read():
+            assert lock.readers == 2
+    assert lock.readers == 0
+
+
+def test_reader_nested_while_a_writer_waits():
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    writer = start(lambda: (lock.acquire_write(), lock.release_write()))
+    while not lock.writers_waiting:
+        time.sleep(0.001)
+
+    # the writer waits for this thread, a second read must not wait for the writer
+    with lock.read():
+        pass
+    lock.release_read()
+    writer.join(5)
+    assert not writer.is_alive()
+
+
+def test_no_upgrade_from_read_to_write():
+    lock = ReadWriteLock()
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    with lock.write():
+        pass
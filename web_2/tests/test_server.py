@@ -0,0 +1,104 @@
+import asyncio
+import builtins
+import io
+import json
+import sys
+import threading
+
+import pytest
+
+import address_book
+import server
+from storage import SNAPSHOT_WRITER
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    # the input() of serve(), its stdout is put in by the tests (pytest sets its own after the fixtures)
+    monkeypatch.setattr(builtins, 'input', server.command_input)
+    service = server.Service()
+    yield service
+    service.adr_book.autosave.stop()
+    SNAPSHOT_WRITER.flush()
+
+
+def contacts(service, command, *answers):
+    return service.execute({'book': 'contacts', 'command': command, 'input': list(answers)})
+
+
+def test_missing_answer_releases_the_lock(service):
+    assert contacts(service, 'add Bill 0501112233')['ok']
+
+    response = contacts(service, 'set email Bill')
+    assert response == {'ok': False, 'need_input': 'Please set the email like "myemail@google.com": '}
+    assert service.adr_book.lock.writer is None
+    assert service.adr_book.pending_change is None
+
+    assert contacts(service, 'set email Bill', 'bill@example.com')['ok']
+    assert service.adr_book['Bill'].email.value == 'bill@example.com'
+    assert [entry['command'] for entry in service.adr_book.log.undo_entries] == ['add Bill 0501112233',
+                                                                                  'set email Bill']
+
+
+def test_refused_and_malformed_requests(service):
+    assert service.execute({'book': 'calendar', 'command': 'show'}) == {'ok': False, 'error': 'Unknown book calendar!'}
+    assert contacts(service, '  ') == {'ok': False, 'error': 'Empty command!'}
+    assert contacts(service, 'not save')['error'] == 'not save is not available in the service mode!'
+    assert service.execute({'book': 'notes', 'command': 'Load'})['error'] == 'load is not available in the service mode!'
+
+
+def test_output_goes_to_the_response(service, monkeypatch):
+    monkeypatch.setattr(sys, 'stdout', server.CommandStdout(sys.stdout))
+    response = contacts(service, 'add Bill 0501112233')
+    assert 'Added record for Bill' in response['output'] and response['finished'] is False
+
+    response = service.execute({'book': 'notes', 'command': 'add', 'input': ['Plans', 'milk the cow', 'farm']})
+    assert response['ok']
+    assert service.notebook.find_note('Plans').content == 'milk the cow'
+
+
+def test_threads_print_to_their_own_buffers():
+    stream = io.StringIO()
+    stdout = server.CommandStdout(stream)
+    barrier = threading.Barrier(2)
+    outputs = {}
+
+    def command(name):
+        server.command_io.output = outputs[name] = io.StringIO()
+        barrier.wait()
+        stdout.write(name)
+        server.command_io.output = None
+
+    threads = [threading.Thread(target=command, args=(name,)) for name in ('first', 'second')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    stdout.write('main')
+
+    assert {name: output.getvalue() for name, output in outputs.items()} == {'first': 'first', 'second': 'second'}
+    assert stream.getvalue() == 'main'
+
+
+def test_protocol_over_a_socket(service):
+    async def session():
+        listener = await asyncio.start_server(service.handle_client, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            responses = []
+            for line in (b'not json\n', b'[1]\n', json.dumps({'command': 'add Bill 0501112233'}).encode() + b'\n'):
+                writer.write(line)
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+        return responses
+
+    bad_json, not_an_object, added = asyncio.run(session())
+    assert bad_json['error'].startswith('Bad request:')
+    assert not_an_object == {'ok': False, 'error': 'Bad request: request must be a JSON object'}
+    assert added['ok'] and 'Bill' in service.adr_book
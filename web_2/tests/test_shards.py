@@ -0,0 +1,115 @@
+import json
+import os
+import zlib
+
+import pytest
+
+import address_book
+from shards import MANIFEST, make_manifest, read_manifest, read_shards, shard_file, shard_of
+from storage import SNAPSHOT_WRITER
+
+NAMES = ['Bill', 'Ann', 'Їжак', 'Olena', 'Taras', 'Marta']
+
+
+def test_shard_of_does_not_depend_on_the_hash_seed():
+    assert shard_of('Bill', 8) == zlib.crc32('Bill'.encode('utf-8')) % 8
+    assert {shard_of(name, 1) for name in NAMES} == {0}
+
+
+def test_shard_file_names():
+    assert shard_file('dir', 3, '.json') == os.path.join('dir', 'shard-003.json')
+    assert shard_file('dir', 12, '.abk', autosave=True) == os.path.join('dir', 'shard-012.autosave.abk')
+
+
+def test_manifest_of_another_version_is_ignored(tmp_path):
+    assert read_manifest(tmp_path) is None
+
+    (tmp_path / MANIFEST).write_text(json.dumps(make_manifest(4, 'json', [1, 0, 2, 0])))
+    assert read_manifest(tmp_path)['counts'] == [1, 0, 2, 0]
+
+    (tmp_path / MANIFEST).write_text(json.dumps({'version': 99, 'shards': 4}))
+    assert read_manifest(tmp_path) is None
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_read_shards(tmp_path, workers):
+    (tmp_path / 'good.json').write_text(json.dumps([{'name': 'Bill'}]))
+    (tmp_path / 'empty.json').write_text('')
+    (tmp_path / 'bad.json').write_text('[{')
+    filenames = [str(tmp_path / name) for name in ('good.json', 'empty.json', 'missing.json', 'bad.json')]
+
+    good, empty, missing, bad = read_shards(filenames, workers)
+    assert good == ([{'name': 'Bill'}], None)
+    assert empty == missing == ([], None)
+    assert bad[0] is None and bad[1]
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(address_book.AddressBook, 'SNAPSHOT_FORMAT', 'json')
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 4)
+    monkeypatch.setattr(address_book.AddressBook, 'LOAD_WORKERS', 1)
+    yield address_book.AddressBook
+    SNAPSHOT_WRITER.flush()
+
+
+def add_and_save(adr_book, names):
+    for number, name in enumerate(names):
+        address_book.run_command(adr_book, f'add {name} 050111{number:04d}')
+    adr_book.close_record_data()
+    SNAPSHOT_WRITER.flush()
+
+
+def test_records_go_to_their_shards(book):
+    add_and_save(book(), NAMES)
+
+    manifest = read_manifest('save_shards')
+    assert manifest['shards'] == 4 and sum(manifest['counts']) == len(NAMES)
+    filenames = [shard_file('save_shards', index, '.json') for index in range(4)]
+    for index, (rows, error) in enumerate(read_shards(filenames, 1)):
+        assert error is None and len(rows) == manifest['counts'][index]
+        assert all(shard_of(row['name'], 4) == index for row in rows)
+
+    assert sorted(book()) == sorted(NAMES)
+
+
+def test_save_writes_the_changed_shards_only(book):
+    add_and_save(book(), NAMES)
+    adr_book = book()
+    address_book.run_command(adr_book, 'add phone Bill 0671112233')
+    adr_book.snapshot_shards()
+
+    assert adr_book.unsaved_shards == {shard_of('Bill', 4)}
+    adr_book.close_record_data()
+
+
+def test_single_file_book_is_split_and_resharded(book, monkeypatch, capsys):
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 0)
+    add_and_save(book(), NAMES)
+
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 4)
+    split = book()
+    assert 'split into 4 shards' in capsys.readouterr().out
+    split.close_record_data()
+    SNAPSHOT_WRITER.flush()
+    assert read_manifest('save_shards')['shards'] == 4
+
+    monkeypatch.setattr(address_book.AddressBook, 'SHARDS', 2)
+    resharded = book()
+    assert 'saved again as 2 json shards' in capsys.readouterr().out
+    resharded.close_record_data()
+    SNAPSHOT_WRITER.flush()
+    assert read_manifest('save_shards')['shards'] == 2
+    assert sorted(book()) == sorted(NAMES)
+
+
+def test_damaged_shard_is_set_aside(book, capsys):
+    add_and_save(book(), NAMES)
+    damaged = shard_file('save_shards', shard_of('Bill', 4), '.json')
+    with open(damaged, 'w') as writer:
+        writer.write('[{')
+
+    adr_book = book()
+    assert 'Bill' not in adr_book and 'is damaged' in capsys.readouterr().out
+    assert os.path.exists(damaged + '.damaged')
@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.startup import BUDGETS, DEFERRED, import_times
+
+
+@pytest.mark.parametrize('module', sorted(BUDGETS))
+def test_startup_imports(module):
+    # the fastest of a few runs counts, like in the benchmark itself
+    runs = [import_times(module) for _ in range(3)]
+    best = min(runs, key=lambda times: times[module])
+
+    assert best[module] <= BUDGETS[module]
+    assert not DEFERRED & {name.split('.')[0] for name in best}
+
+
+def test_import_times_reads_importtime_output():
+    times = import_times('json')
+    assert {'json', 'json.decoder'} <= set(times)
+    assert times['json'] >= times['json.decoder'] > 0
@@ -0,0 +1,105 @@
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+import storage
+from storage import AutosaveScheduler, SnapshotWriter, atomic_write_bytes, atomic_write_json, atomic_write_stream
+
+
+def mode_of(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def leftovers(folder):
+    return [name for name in os.listdir(folder) if name.endswith('.tmp')]
+
+
+def test_atomic_writes_round_trip(tmp_path):
+    atomic_write_json(tmp_path / 'a.json', {'name': 'Bill', 'phones': ['+380501112233']}, indent=4)
+    atomic_write_bytes(tmp_path / 'b.bin', b'\x00\x01')
+    atomic_write_stream(tmp_path / 'c.txt', lambda file: file.write('ї\n'), encoding='utf-8')
+
+    assert json.loads((tmp_path / 'a.json').read_text()) == {'name': 'Bill', 'phones': ['+380501112233']}
+    assert (tmp_path / 'b.bin').read_bytes() == b'\x00\x01'
+    assert (tmp_path / 'c.txt').read_text(encoding='utf-8') == 'ї\n'
+    assert leftovers(tmp_path) == []
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    target = tmp_path / 'save.json'
+    atomic_write_json(target, [1])
+
+    def fail(file):
+        file.write('[2, ')
+        raise ValueError('cut')
+
+    with pytest.raises(ValueError):
+        atomic_write_stream(target, fail)
+
+    assert json.loads(target.read_text()) == [1]
+    assert leftovers(tmp_path) == []
+
+
+def test_new_file_gets_the_mode_of_open(tmp_path):
+    atomic_write_json(tmp_path / 'save.json', [])
+
+    assert mode_of(tmp_path / 'save.json') == storage.NEW_FILE_MODE
+
+
+def test_replaced_file_keeps_its_mode(tmp_path):
+    target = tmp_path / 'save.json'
+    target.write_text('[]')
+    os.chmod(target, 0o640)
+
+    atomic_write_json(target, [1])
+
+    assert mode_of(target) == 0o640
+
+
+def test_writer_writes_the_latest_snapshot_only(tmp_path):
+    writes = []
+    writer = SnapshotWriter(coalesce_delay=0.05)
+
+    def write(filename, data):
+        writes.append(data)
+        atomic_write_json(filename, data)
+
+    for number in range(5):
+        writer.submit(tmp_path / 'save.json', [number], write=write)
+    writer.flush()
+
+    assert writes == [[4]]
+    assert json.loads((tmp_path / 'save.json').read_text()) == [4]
+
+
+def test_writer_survives_a_failing_write(tmp_path, capsys):
+    writer = SnapshotWriter(coalesce_delay=0)
+
+    def fail(filename, data):
+        raise RuntimeError('boom')
+
+    writer.submit(tmp_path / 'bad.json', [], write=fail)
+    writer.flush()
+    writer.submit(tmp_path / 'good.json', [1])
+    writer.flush()
+
+    assert 'Could not save' in capsys.readouterr().out
+    assert json.loads((tmp_path / 'good.json').read_text()) == [1]
+    assert not writer.in_progress and writer.thread.is_alive()
+
+
+def test_autosave_runs_after_enough_changes():
+    saved = threading.Event()
+    scheduler = AutosaveScheduler(saved.set, interval=60, max_changes=3)
+    scheduler.start()
+    try:
+        scheduler.note_change()
+        scheduler.note_change()
+        assert not saved.wait(0.1)
+        scheduler.note_change()
+        assert saved.wait(5)
+    finally:
+        scheduler.stop()
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from trigram_index import TrigramIndex, trigrams
+
+
+def brute_force(index, query, top_k, min_similarity):
+    query_grams = trigrams(query)
+    scored = []
+    for key, grams in index.grams.items():
+        overlap = len(query_grams & grams)
+        similarity = overlap / len(query_grams | grams)
+        if similarity >= min_similarity:
+            scored.append((similarity, key))
+    return sorted(scored, reverse=True)[:top_k]
+
+
+@pytest.fixture
+def index():
+    index = TrigramIndex()
+    for key, name in enumerate(['Olena Shevchenko', 'Olena Shevchuk', 'Ivan Kovalenko', 'Ivanna Koval', 'Taras']):
+        index.add(key, name)
+    return index
+
+
+def test_trigrams_are_padded_and_casefolded():
+    assert trigrams('Ab') == {'  a', ' ab', 'ab '}
+    assert trigrams('  AB  ') == trigrams('ab')
+    assert trigrams('') == frozenset()
+
+
+def test_exact_match_ranks_first(index):
+    results = index.search('olena shevchenko')
+    assert results[0] == (1.0, 0)
+    assert [key for _, key in results] == [0, 1]
+
+
+def test_typo_still_finds_the_contact(index):
+    assert index.search('Ivn Kovalenk', top_k=1)[0][1] == 2
+
+
+def test_min_similarity_drops_weak_matches(index):
+    assert index.search('Ivan', min_similarity=0.9) == []
+    assert all(similarity >= 0.2 for similarity, _ in index.search('Ivan', min_similarity=0.2))
+
+
+def test_top_k(index):
+    assert len(index.search('Olena', top_k=1, min_similarity=0.01)) == 1
+    assert index.search('Olena', top_k=0) == []
+    assert index.search('') == []
+
+
+def test_updates_are_searchable(index):
+    index.add(4, 'Bohdan')
+    assert index.search('Taras') == []
+    assert index.search('Bohdan')[0] == (1.0, 4)
+
+    index.remove(4)
+    assert 4 not in index
+    assert index.search('Bohdan') == []
+    assert not any(4 in keys for keys in index.postings.values())
+
+    index.add(4, 'Taras')
+    assert index.search('Taras')[0] == (1.0, 4)
+
+
+def test_containing_and_rarest(index):
+    assert index.containing('shevch') == {0, 1}
+    assert index.containing('zzz') == set()
+    assert index.containing('ab') is None
+    assert index.rarest('shevchenko') == 1
+    assert index.rarest('ab') is None
+
+
+@pytest.mark.parametrize('top_k, min_similarity', [(1, 0.3), (5, 0.1), (20, 0.5), (500, 0.3)])
+def test_search_matches_brute_force(top_k, min_similarity):
+    rng = random.Random(7)
+    first = ['Olena', 'Ivan', 'Petro', 'Oksana', 'Taras', 'Marta']
+    last = ['Shevchenko', 'Kovalenko', 'Bondar', 'Tkachuk', 'Boiko', 'Melnyk']
+    index = TrigramIndex()
+    for key in range(2000):
+        index.add(key, f'{rng.choice(first)} {rng.choice(last)}{rng.choice(["", "", str(rng.randint(1, 99))])}')
+
+    for query in ('Olena Shevchenko', 'Ivn Kovalenk', 'Taras', 'Tkach', 'Oksna Boikoo', 'Marta Bondar7', 'xyz'):
+        assert index.search(query, top_k, min_similarity) == brute_force(index, query, top_k, min_similarity)
@@ -0,0 +1,125 @@
+import heapq
+import math
+
+
+# Trigram index used by the address book for typo-tolerant (fuzzy) lookups.
+# Every indexed text is split into padded trigrams ("  vi", " vix", "vix ") and each trigram keeps a
+# posting set of keys. Queries use prefix filtering: only the rarest trigrams are needed to generate
+# candidates, the rest of the query is verified against the stored trigram set of each candidate. A length
+# filter drops the candidates whose set size alone rules them out, and once top_k results are found the
+# threshold goes up to the worst of them, which shortens the prefix of the trigrams still to read.
+
+def trigrams(text: str) -> frozenset:
+    text = ' '.join(str(text).casefold().split())
+    if not text:
+        return frozenset()
+    padded = f'  {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+# the bounds are compared with a margin, 1/3 * 9 is a bit more than 3 in floats
+EPSILON = 1e-9
+EMPTY = frozenset()
+
+
+class TrigramIndex:
+    MIN_SIMILARITY = 0.3
+
+    def __init__(self):
+        self.postings = {}
+        self.grams = {}
+
+    def __len__(self):
+        return len(self.grams)
+
+    def __contains__(self, key):
+        return key in self.grams
+
+    def add(self, key, text):
+        self.remove(key)
+        grams = trigrams(text)
+        if not grams:
+            return
+        self.grams[key] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        grams = self.grams.pop(key, None)
+        if grams is None:
+            return
+        for gram in grams:
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def containing(self, text):
+        """Keys whose text has every trigram of the substring text, a superset of the keys that contain it.
+        None when text is too short to have a trigram."""
+        grams = set()
+        for piece in str(text).casefold().split():
+            grams.update(piece[i:i + 3] for i in range(len(piece) - 2))
+        if not grams:
+            return None
+
+        keys = None
+        for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ()))):
+            found = self.postings.get(gram, ())
+            keys = set(found) if keys is None else keys & found
+            if not keys:
+                break
+        return keys
+
+    def rarest(self, text):
+        """Size of the smallest posting set of the trigrams of the substring text, an upper bound of
+        containing(text). None when text is too short to have a trigram."""
+        grams = {piece[i:i + 3] for piece in str(text).casefold().split() for i in range(len(piece) - 2)}
+        if not grams:
+            return None
+        return min(len(self.postings.get(gram, ())) for gram in grams)
+
+    def search(self, query, top_k=5, min_similarity=None):
+        """Return up to top_k (similarity, key) pairs, best first. Similarity is the Jaccard index of trigram sets."""
+        if min_similarity is None:
+            min_similarity = self.MIN_SIMILARITY
+        query_grams = trigrams(query)
+        if not query_grams or top_k <= 0:
+            return []
+
+        size = len(query_grams)
+        by_rarity = sorted(query_grams, key=lambda gram: len(self.postings.get(gram, ())))
+        threshold = min_similarity
+        heap = []
+        seen = set()
+        all_grams = self.grams
+
+        for position, gram in enumerate(by_rarity):
+            # Any key with similarity >= threshold shares at least threshold * size trigrams with the query, so
+            # it must contain one of the (size - that + 1) rarest ones. The threshold goes up to the k-th best
+            # similarity found so far, the common trigrams are mostly never looked at.
+            if position > size - max(1, math.ceil(threshold * size - EPSILON)):
+                break
+
+            keys = self.postings.get(gram, EMPTY) - seen
+            seen |= keys
+            for key in keys:
+                grams = all_grams[key]
+                # length filter: the similarity is at most the smaller set size over the bigger one
+                length = len(grams)
+                if length < threshold * size - EPSILON or threshold * length > size + EPSILON:
+                    continue
+
+                overlap = len(query_grams & grams)
+                similarity = overlap / (size + length - overlap)
+                if similarity < threshold:
+                    continue
+                item = (similarity, key)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+                if len(heap) == top_k:
+                    threshold = max(threshold, heap[0][0])
+
+        return sorted(heap, reverse=True)